@@ -0,0 +1,87 @@
+import sqlite3
+import hashlib
+import pickle
+
+# The result cache keeps the SOResult of every document scored so far in an
+# SQLite file, keyed by a hash of the document text and a fingerprint of the
+# config and of the dictionaries it was scored with, so that an incremental
+# run only scores the documents that are new or changed. Results for other
+# configs or dictionaries stay in the cache, and are used again if the run
+# goes back to them.
+
+CACHE_VERSION = 2  # increase whenever a change to the calculator changes its results
+
+
+def get_document_hash(lines):
+    '''
+    Hash the text of a preprocessed document.
+    The line ends are ignored, so a file and a stream record with the same lines have the same hash.
+    :param lines: the lines of the document
+    :return: the hash of the document
+    '''
+    document_hash = hashlib.sha1()
+    for line in lines:
+        document_hash.update(line.rstrip("\n").encode("utf-8"))
+        document_hash.update(b"\n")
+    return document_hash.hexdigest()
+
+
+class ResultCache():
+    '''
+    A persistent cache of SOResults, for one config and one set of dictionaries.
+    '''
+
+    def __init__(self, cache_path, config_fingerprint, lexicon_fingerprint, commit_every=1000):
+        '''
+        Open (or create) a result cache.
+        :param cache_path: the cache file path
+        :param config_fingerprint: the fingerprint of the config, see SentimentCalculator.get_config_fingerprint
+        :param lexicon_fingerprint: the fingerprint of the dictionaries, see SentimentCalculator.get_lexicon_fingerprint
+        :param commit_every: the number of new results after which they are written to disk
+        '''
+        self.connection = sqlite3.connect(cache_path)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS results (document_hash TEXT, fingerprint TEXT, result BLOB, "
+                                "PRIMARY KEY (document_hash, fingerprint))")
+        self.fingerprint = hashlib.sha1((str(CACHE_VERSION) + "\n" + config_fingerprint + "\n" + lexicon_fingerprint).encode("utf-8")).hexdigest()
+        self.commit_every = commit_every
+        self.uncommitted = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, document_hash, with_lookups=False):
+        '''
+        Look up the result of a document.
+        :param document_hash: the hash of the document, see get_document_hash
+        :param with_lookups: whether only a result with its dictionary lookups (see SOResult.lookups) will do
+        :return: the cached SOResult, or None if the document has not been scored with this config and dictionaries
+        '''
+        row = self.connection.execute("SELECT result FROM results WHERE document_hash = ? AND fingerprint = ?",
+                                      (document_hash, self.fingerprint)).fetchone()
+        if row is not None:
+            result = pickle.loads(row[0])
+            if result.lookups is not None or not with_lookups:
+                self.hits += 1
+                return result
+        self.misses += 1
+        return None
+
+    def put(self, document_hash, result):
+        '''
+        Keep the result of a document.
+        :param document_hash: the hash of the document, see get_document_hash
+        :param result: the SOResult of the document
+        :return: None
+        '''
+        self.connection.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?)",
+                                (document_hash, self.fingerprint, pickle.dumps(result, pickle.HIGHEST_PROTOCOL)))
+        self.uncommitted += 1
+        if self.uncommitted >= self.commit_every:
+            self.connection.commit()
+            self.uncommitted = 0
+
+    def close(self):
+        '''
+        Write the new results to disk and close the cache.
+        '''
+        self.connection.commit()
+        self.connection.close()
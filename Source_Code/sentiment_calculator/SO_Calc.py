@@ -50,6 +50,34 @@
 import operator
 import argparse
 import os
+import pickle
+import array
+import hashlib
+import json
+from collections import OrderedDict
+
+### Compiled lexicon ###
+### The fully built dictionaries can be saved to a single binary file, which is
+### much faster to load than the dictionary files. The file starts with a header
+### (version and fingerprint) so that a stale file can be detected without
+### reading the dictionaries themselves
+
+LEXICON_VERSION = 1 # increase whenever the layout of the compiled lexicon changes
+LEXICON_SETTINGS = ["language", "dic_dir", "adj_dict", "adv_dict", "noun_dict", "verb_dict", "int_dict", "use_extra_dict", "extra_dict", "use_multiword_dictionaries", "simple_SO"]
+STEM_CACHE_SIZE = 100000 # the most stems kept by a calculator, the cache is emptied when full
+NULLIFYING_MODIFIERS = ["QUESTION", "IMPERATIVE", "QUOTES", "IRREALIS"] # see get_other_modifiers
+
+### Features ###
+### With record_features on, one feature row is kept for each SO carrying word
+### of a text, with everything its SO is calculated from that does not depend
+### on the numeric modifiers (multipliers, negation shifts, capital and
+### exclamation modifiers and blocker cutoff), so that its SO can be calculated
+### again for other values of them without scoring the text again (see SO_Grid)
+
+FEATURE_COLUMNS = ["POS", "lemma", "SO", "int_modifier", "negated", "int_modifier_negex", "capitalized",
+                   "exclamation", "highlighter", "nullified", "blocker_strength", "weight"]
+
+LEXICON_DICTIONARIES = ["adj_dict", "adv_dict", "noun_dict", "verb_dict", "int_dict", "c_adj_dict", "c_adv_dict", "c_noun_dict", "c_verb_dict", "c_int_dict"]
 
 
 def get_command_arguments():
@@ -70,25 +98,25 @@ def get_command_arguments():
                         default='',
                         help="The basic output")
 
+    parser.add_argument('--rich_json_path', '-jo', type=str, dest='rich_json_path', action='store',
+                        default='',
+                        help="The JSON lines rich output (optional)")
+
     parser.add_argument('--config', '-c', type=str, dest='config', action='store',
                         default='../Resources/config_files/en_SO_Calc.ini',
                         help="The configuration file for SO-CAL")
 
+    parser.add_argument('--compile_lexicon', '-cl', dest='compile_lexicon', action='store_true',
+                        help="Only rebuild the compiled lexicon (compiled_lexicon in the config file) and exit")
+
 
     args = parser.parse_args()
     return args
 
-args = get_command_arguments()
-infile = open(args.input, "r")
-configfile = open(args.config, "r")
-
-basicout = open(args.basicout_path, "a")
-richout = open(args.richout_path, "a")
-
-config = {}
-
-def get_configuration_from_file():
+def get_configuration_from_file(config_path):
 # gets the configuration settings from the supplied .ini file
+    config = {}
+    configfile = open(config_path, "r")
     for line in configfile.readlines():
         if line:
             line = line.split("#")[0].strip()
@@ -119,161 +147,12 @@ def get_configuration_from_file():
                                  svalues[skey] = svalue
                              config[key] = svalues
                          else:
-                             config[key] = map(str.strip, elements)
+                             config[key] = list(map(str.strip, elements))
     configfile.close()
+    return config
 
-get_configuration_from_file()
-
-language = config["language"]
-use_adjectives = config["use_adjectives"]
-use_nouns = config["use_nouns"]
-use_verbs = config["use_verbs"]
-use_adverbs = config["use_adverbs"]
-use_intensifiers = config["use_intensifiers"]
-use_negation = config["use_negation"]
-use_comparatives = config["use_comparatives"]
-use_superlatives = config["use_superlatives"]
-use_multiword_dictionaries = config["use_multiword_dictionaries"]
-use_extra_dict = config["use_extra_dict"]
-use_XML_weighing = config["use_XML_weighing"]
-use_weight_by_location = config["use_weight_by_location"]
-use_irrealis = config["use_irrealis"]
-use_subjunctive = config["use_subjunctive"]
-use_imperative = config["use_imperative"]
-use_conditional = config["use_conditional"]
-use_highlighters = config["use_highlighters"]
-use_cap_int = config["use_cap_int"]
-fix_cap_tags = config["fix_cap_tags"]
-use_exclam_int = config["use_exclam_int"]
-use_quest_mod = config["use_quest_mod"]
-use_quote_mod = config["use_quote_mod"]
-use_definite_assertion = config["use_definite_assertion"]
-use_clause_final_int = config["use_clause_final_int"]
-use_heavy_negation = config["use_heavy_negation"]
-use_word_counts_lower = config["use_word_counts_lower"]
-use_word_counts_block = config["use_word_counts_block"]
-use_blocking = config["use_blocking"]
-adv_learning = config["adv_learning"]
-limit_shift = config["limit_shift"]
-neg_negation_nullification = config["neg_negation_nullification"]
-polarity_switch_neg = config["polarity_switch_neg"]
-restricted_neg = config["restricted_neg"]
-simple_SO = config["simple_SO"]
-use_boundary_words = config["use_boundary_words"]
-use_boundary_punct = config["use_boundary_punctuation"]
-
-### Modifiers ###
-
-adj_multiplier = config["adj_multiplier"]
-adv_multiplier = config["adv_multiplier"]
-verb_multiplier = config["verb_multiplier"]
-noun_multiplier = config["noun_multiplier"]
-int_multiplier = config["int_multiplier"]
-neg_multiplier = config["neg_multiplier"]
-capital_modifier = config["capital_modifier"]
-exclam_modifier = config["exclam_modifier"]
-verb_neg_shift = config["verb_neg_shift"]
-noun_neg_shift = config["noun_neg_shift"]
-adj_neg_shift = config["adj_neg_shift"]
-adv_neg_shift = config["adv_neg_shift"]
-blocker_cutoff = config["blocker_cutoff"]
-
-### Dictionaries ###
-
-dic_dir = config["dic_dir"]
-adj_dict_path = dic_dir + config["adj_dict"]
-adv_dict_path = dic_dir + config["adv_dict"]
-noun_dict_path = dic_dir + config["noun_dict"]
-verb_dict_path = dic_dir + config["verb_dict"]
-int_dict_path = dic_dir + config["int_dict"]
-if use_extra_dict and config["extra_dict"]:
-    extra_dict_path = dic_dir + config["extra_dict"]
-else:
-    extra_dict_path = False
-adj_dict = {} # simple (single-word) dictionaries
-adv_dict = {}
-noun_dict = {}
-verb_dict = {}
-int_dict = {}
-c_adj_dict = {} # complex (multi-word) dictionaries
-c_adv_dict = {}
-c_noun_dict = {}
-c_verb_dict = {}
-c_int_dict = {}
-new_adv_dict = {}
-
-### Text ###
-
-text = [] # the text is a list of word, tag lists
-weights = [] # weights should be the same length as the text, one for each token
-word_counts = [{},{},{},{}] # keeps track of number of times each word lemma appears in the text
-text_SO = 0 # a sum of the SO value of all the words in the text
-SO_counter = 0 # a count of the number of SO carrying terms
-boundaries = [] # the location of newline boundaries from the input
-
-### Internal Word lists ###
-if language == "English":
-    not_wanted_adj = ["other", "same", "such", "first", "next", "last", "few", "many", "less", "more", "least", "most"]
-    not_wanted_adv = [ "really", "especially", "apparently", "actually", "evidently", "suddenly", "completely","honestly", "basically", "probably", "seemingly", "nearly", "highly", "exactly", "equally", "literally", "definitely", "practically", "obviously", "immediately", "intentionally", "usually", "particularly", "shortly", "clearly", "mildly", "sincerely", "accidentally", "eventually", "finally", "personally", "importantly", "specifically", "likely", "absolutely", "necessarily", "strongly", "relatively", "comparatively", "entirely", "possibly", "generally", "expressly", "ultimately", "originally", "initially", "virtually", "technically", "frankly", "seriously", "fairly",  "approximately", "critically", "continually", "certainly",  "regularly", "essentially", "lately", "explicitly", "right", "subtly",  "lastly", "vocally", "technologically", "firstly", "tally", "ideally", "specially", "humanly", "socially", "sexually", "preferably", "immediately", "legally", "hopefully", "largely", "frequently", "factually", "typically"]
-    not_wanted_verb = []
-    negators = ["not", "no", "n't", "neither", "nor", "nothing", "never", "none", "lack", "lacked", "lacking", "lacks", "missing", "without", "absence", "devoid"];
-    punct = [".", ",", ";", "!", "?", ":", ")", "(", "\"", "'", "-"]
-    sent_punct = [".", ";", "!", "?", ":", "\n", "\r"]
-    skipped = {"JJ": ["even", "to", "being", "be", "been", "is", "was", "'ve", "have", "had", "do", "did", "done", "of", "as", "DT", "PSP$"], "RB": ["VB", "VBZ", "VBP", "VBG"], "VB":["TO", "being", "been", "be"], "NN":["DT", "JJ", "NN", "of", "have", "has", "come", "with", "include"]}
-    comparatives = ["less", "more", "as"]
-    superlatives = ["most", "least"]
-    definites = ["the","this", "POS", "PRP$"]
-    noun_tag = "NN"
-    verb_tag = "VB"
-    adj_tag = "JJ"
-    adv_tag = "RB"
-    macro_replace = {"#NP?#": "[PDT]?_[DET|PRP|PRP$|NN|NNP]?_[POS]?_[NN|NNP|JJ]?_[NN|NNP|NNS|NNPS]?","#PER?#": "[me|us|her|him]?","#give#": "give|gave|given","#fall#": "fall|fell|fallen","#get#": "get|got|gotten","#come#": "come|came","#go#": "go|went|gone", "#show#": "show|shown","#make#": "make|made","#hang#": "hang|hung","#break#": "break|broke|broken", "#see#": "see|saw|seen", "#be#": "be|am|are|was|were|been", "#bring#": "bring|brought", "#think#" : "think|thought", "#have#": "has|have|had", "#blow#": "blow|blew", "#build#": "build|built", "#do#": "do|did|done", "#can#": "can|could", "#grow#":"grow|grew|grown", "#hang#": "hang|hung", "#run#": "run|ran", "#stand#": "stand|stood", "#string#": "string|strung", "#hold#" : "hold|held", "#take#" : "take|took|taken"}
-elif language == "Spanish":
-    not_wanted_adj = ["otro","mio","tuyo","suyo","nuestro","vuestro","mismo","primero","segundo","último"]
-    additional = []
-    for adj in not_wanted_adj:
-       additional += [adj[:-1] + "a",adj[:-2] + "os", adj[:-2] + "as"]
-    not_wanted_adj += additional
-    not_wanted_adv = ["básicamente", "claramente","ampliamente", "atentamente", "completamente"]
-    not_wanted_verb = ["haber", "estar"]
-    negators = ["no", "ni", "nunca", "jam"+ chr(225) + "s", "nada", "nadie", "ninguno", "ningunos", "ninguna", "ningunas", "faltar", "falta", "sin"];
-    punct = [".", ",", ";", "!", "?", ":", ")", "(", "\"", "'", "-", chr(161), chr(191)]
-    sent_punct = [".", ";", "!", "?", ":", "\n", "\r", chr(161), chr(191)]
-    skipped = {"AQ": [ "a", "estar", "haber", "hacer", "de", "como", "NC", "PP", "DP", "DD", "DI", "DA", "RG"], "RG": ["VM", "VA", "VS"], "VM":["haber", "estar", "PP"], "NC":["DP", "DD", "DI", "DA", "AQ", "AO", "de", "tener", "hacer", "estar", "con", "incluso"]}
-    comparatives = ["m" + chr(225) + "s", "menos", "como"]
-    definites = ["el", "la", "los", "las", "este", "esta","estos", "estas", "de", "DP"]
-    accents = {chr(237):"i", chr(243):"o", chr(250):"u", chr(233):"e", chr(225):"a",chr(241):"n"}
-    noun_tag = "NC"
-    verb_tag = "VM"
-    adj_tag = "AQ"
-    adv_tag = "RG"
-    macro_replace = {"#NP?#": "[DI|DP|DA]?_[AQ|AC]?_[NC|NP]?_[AQ]?"}
-
-weight_tags= config["weight_tags"]
-weights_by_location = config["weights_by_location"]
-highlighters = config["highlighters"]
-irrealis = config["irrealis"]
-boundary_words = config["boundary_words"]
-
-
-### Multi-word dictionary macros:
-### These macros allow for relatively simple and uncluttered multiword
-### dictionary definitions. The dictionary keys will be replaced by the
-### their corresponding values when they appear in definitions (in the
-### dictionary files). In particular, allows the forms of irregular verbs
-### to be listed only once (here, rather than in the dictionary)
-
-### Output ###
-
-output_calculations = config["output_calculations"]
-output_sentences = config["output_sentences"]
-output_unknown = config["output_unknown"]
-output_used = config["output_used"]
-output_used_lemma = config["output_used_lemma"]
-search = config["search"]
-contain_all_words = config["contain_all_words"]
-
-### Loading functions ###
+
+### General functions ###
 
 def same_lists (list1, list2):
     '''
@@ -284,174 +163,6 @@ def same_lists (list1, list2):
     '''
     return list1 == list2
 
-def get_multiword_entries (string):
-### Coverts the multiword dictionary entry in a file to something that can
-### be accessed by the calculator
-### In the dictionary, each word of a multi-word definition is separated by
-### an underscore. The primary word (the one whose part of speech is the same
-### as the phrase as a whole, except for intensifiers) should be in parentheses;
-### it becomes the key (if there are multiple keys, multiple entries are created)
-### The value of an c_dict is a list of all multi-word phrases a key word
-### appears in (as a key) and each of these contains a 2-ple: the list all the
-### words in the phrase, with the key word removed and replaced with a #,
-### and the SO value for the phrase. If a word or words is modified by an
-### operator (such as ?,*,+,|, or a number), the operator should be placed in
-### []--all operators but | appear outside the right bracket
-### ? = optional, + = one or more, * = zero or more, 2 (3, etc.) = two of these
-### | = or. INT refers to a word or words in the intensifier dictionary.
-### with that key (minus the last word), together with the modifier value
-### ex.: c_int_dict["little"] = [[["a", "#"], -0.5]]
-    if "#" in string:  #if there is a macro, replace
-        for item in macro_replace:
-            string = string.replace(item, macro_replace[item])
-    words = string.split("_")
-    entry = []
-    keyindex = len(words) - 1 # if no parens, default to last word
-    for index in range(len(words)):
-        word = words[index]
-        slot = []
-        if word[0] == "(":
-            slot.append(1)
-            slot.append(word[1:-1].split("|"))
-            keyindex = index # found the key
-        elif word[0] == "[":
-            ordinality = False
-            if word[-1] != "]":
-                ordinality = True
-            if ordinality:
-                slot.append(word[-1])
-                word = word[:-1]
-            else:
-                slot.append(1)
-            slot.append(word[1:-1].split("|"))
-        else:
-            slot = word
-        entry.append(slot)
-    final_entries = []
-    if not isinstance(entry[keyindex], list):
-        key = entry[keyindex]
-        entry[keyindex] = "#"
-        final_entries = [[key,entry]]
-    else:
-        for key in entry[keyindex][1]:
-            final_entry = []
-            for index in range(len(entry)):
-                if index == keyindex:
-                    final_entry.append("#")
-                else:
-                    final_entry.append(entry[index])
-            final_entries.append([key, final_entry])
-    return final_entries
-
-def has_accent(word):
-    for accent in accents:
-        if accent in word:
-            return True
-    return False
-
-def remove_accents(word):
-    for accent in accents:
-        word = word.replace(accent, accents[accent])
-    return word
-
-def load_dictionary (filepointer, s_dict, c_dict):
-### General function for loading dictionaries from files and putting them
-### either in the simple or complex dictionary, as appropriate
-    for line in filepointer.readlines():
-        pair = line.strip().split()
-        if len(pair) == 2:
-            if "_" not in pair[0]:  #if single word
-                if language == "Spanish" and has_accent(pair[0]):
-                    s_dict[remove_accents(pair[0])] = float(pair[1])
-                s_dict[pair[0]] = float(pair[1]) #put in simple dictionary
-            elif use_multiword_dictionaries:
-                entries = get_multiword_entries(pair[0])
-                for entry in entries:
-                    if entry[0] not in c_dict:
-                        c_dict[entry[0]] = [[entry[1], float(pair[1])]]
-                    else:
-                        c_dict[entry[0]].append([entry[1], float(pair[1])])
-    filepointer.close()
-
-def load_extra_dict (filepointer):
-### loads the optional dictionary, which contains entries from all the
-### various types of words
-    s_dict = False
-    c_dict = False
-    for line in filepointer.readlines():
-        line = line.strip()
-        if line:
-            if line == "adjectives":
-                s_dict = adj_dict
-                c_dict = c_adj_dict
-            elif line == "nouns":
-                s_dict = noun_dict
-                c_dict = c_noun_dict
-            elif line == "verbs":
-                s_dict = verb_dict
-                c_dict = c_verb_dict
-            elif line == "adverbs":
-                s_dict = adv_dict
-                c_dict = c_adv_dict
-            elif line == "intensifiers":
-                s_dict = int_dict
-                c_dict = c_adv_dict
-            elif s_dict:
-                pair = line.split()
-                if "_" not in pair[0]:  #if single word
-                    s_dict[pair[0]] = float(pair[1]) #put in simple dictionary
-                elif use_multiword_dictionaries:
-                    entries = get_multiword_entries(pair[0])
-                    for entry in entries:
-                        if entry[0] not in c_dict:
-                            c_dict[entry[0]] = [[entry[1], float(pair[1])]]
-                        else:
-                             for old_entry in c_dict[entry[0]]: # duplicate entry
-                                if same_lists(old_entry[0], entry[1]):
-                                    c_dict[entry[0]].remove(old_entry)
-                             c_dict[entry[0]].append([entry[1], float(pair[1])])
-    filepointer.close()
-
-def load_dictionaries ():
-### load the five kinds of dictionaries
-    load_dictionary (open (adj_dict_path, encoding = "ISO-8859-1"), adj_dict, c_adj_dict)
-    load_dictionary (open (adv_dict_path, encoding = "ISO-8859-1"), adv_dict, c_adv_dict)
-    load_dictionary (open (verb_dict_path, encoding = "ISO-8859-1"), verb_dict, c_verb_dict)
-    load_dictionary (open (noun_dict_path, encoding = "ISO-8859-1"), noun_dict, c_noun_dict)
-    load_dictionary (open (int_dict_path, encoding = "ISO-8859-1"), int_dict, c_int_dict)
-    if extra_dict_path:
-        load_extra_dict(open (extra_dict_path, encoding = "ISO-8859-1"))
-    if simple_SO:
-        for s_dict in [adj_dict,adv_dict,verb_dict, noun_dict]:
-            for entry in s_dict:
-                if s_dict[entry] > 0:
-                    s_dict[entry] = 2
-                elif s_dict[entry] < 0:
-                    s_dict[entry] = -2
-        for entry in int_dict:
-            if int_dict[entry] > 0:
-                int_dict[entry] = .5
-            elif int_dict[entry] < 0 and int_dict[entry] > -1:
-                int_dict[entry] = -.5
-            elif int_dict[entry] < -1:
-                int_dict[entry] = -2
-        for c_dict in [c_adj_dict,c_adv_dict,c_verb_dict, c_noun_dict]:
-            for entry in c_dict:
-                for i in range(len(c_dict[entry])):
-                    if c_dict[entry][i][1] > 0:
-                        c_dict[entry][i] = [c_dict[entry][i][0], 2]
-                    elif c_dict[entry][i][1] < 0:
-                        c_dict[entry][i] = [c_dict[entry][i][0], -2]
-        for entry in c_int_dict:
-             for i in range(len(c_int_dict[entry])):
-                 if c_int_dict[entry][i][1] > 0:
-                     c_int_dict[entry][i] = [c_int_dict[entry][i][0], .5]
-                 elif c_int_dict[entry][i][1] < 0 and c_int_dict[entry][i][1] > -1:
-                     c_int_dict[entry][i] = [c_int_dict[entry][i][0], -.5]
-                 elif c_int_dict[entry][i][1] < -1:
-                     c_int_dict[entry][i] = [c_int_dict[entry][i][0], -2]
-
-
 def convert_fraction(fraction):
 ### coverts a fraction string into a float
     if "/" not in fraction:
@@ -478,219 +189,13 @@ def is_decimal(string):
                 decimal_yet = True
     return True
 
-def convert_ranges():
-### converts a list of string ranges in faction form (e.g. ["1/4-1/2", 2]) into a
-### a list of numerical ranges plus weight (e.g. [0.25, .5, 2]
-    new_ranges = []
-    for range in weights_by_location:
-        pair = range.split("-")
-        if len(pair) == 2:
-            start = convert_fraction(pair[0].strip())
-            end = convert_fraction(pair[1].strip())
-            if start >= 0 and start <= 1 and end >= 0 and end <= 1 and start < end:
-                new_ranges.append([start,end, weights_by_location[range]])
-    return new_ranges
-
-
-def fill_text_and_weights(infile):
-### Read in the textfile. The file is assumed to be properly spaced and tagged,
-### i.e. there should be a space between every word/tag pair or XML tag
-### if there are XML tags and those tags have been assigned weight, the weight
-### will be applied after the opening tag and will be removed at the closing
-### tag. All XML tags are removed for the SO calculation
-    weight = 1.0 # start with weight 1
-    temp_weight = 1.0 # keep track of weight before a zero
-    for line in infile.readlines():
-        line = line.replace("<", " <").replace(">", "> ")
-        for word in line.strip().split(" "):
-            if word:
-                if word[0] == "<" and word[-1] == ">": #XML tag
-                    XML_tag = word.strip("<>/")
-                    if use_XML_weighing:
-                        if XML_tag in weight_tags:
-                            weight_modifier = weight_tags[XML_tag]
-                        elif is_decimal(XML_tag):
-                            weight_modifier = float(XML_tag)
-                        else:
-                            weight_modifier = 1
-                        if word[1] == "/":
-                            if weight_modifier != 0:
-                                weight /= weight_modifier # remove weight
-                            else:
-                                weight = temp_weight # use pre-zero weight
-                        else:
-                            if weight_modifier != 0:
-                                weight *= weight_modifier # add weight
-                            else:
-                                temp_weight = weight # save weight
-                                weight = 0
-                elif "/" in word:
-                    text.append(word.split("/"))
-                    weights.append(weight)
-        boundaries.append(len(text))
-    if use_weight_by_location:  # add location weights
-        range_dict = convert_ranges()
-        for i in range(len(weights)):
-            for interval in range_dict:  #if the current index in range
-                if interval[0] <= float(i)/len(weights) and interval[1] > float(i)/len(weights):
-                    weights[i] *= interval[2]  #add the weight
-    infile.close()
-
-### English steming functions ###
-
-def stem_NN(NN):
-    if NN not in noun_dict and NN not in c_noun_dict and  len(NN) > 2 and NN[-1] == "s":   # boys -> boy
-        NN = NN[:-1]
-        if NN not in noun_dict and NN not in c_noun_dict and NN[-1] == "e": # watches -> watch
-            NN = NN[:-1]
-            if NN not in noun_dict and NN not in c_noun_dict and NN[-1] == "i": # flies -> fly
-                NN = NN[:-1] + "y"
-    return NN
-
-def stem_VB(VB, type):
-    if type == "" or type == "P" or len(VB) < 4 or VB in verb_dict or VB in c_verb_dict:
-        return VB
-    elif type == "D" or type == "N":
-        if VB[-1] == "d":
-            VB = VB[:-1]   #  loved -> love
-            if not VB in verb_dict and not VB in c_verb_dict:
-                if VB[-1] == "e":
-                    VB = VB[:-1]   # enjoyed -> enjoy
-                if not VB in verb_dict and not VB in c_verb_dict:
-                    if VB[-1] == "i":
-                        VB = VB[:-1] + "y" # tried -> try
-                    elif len(VB) > 1 and VB[-1] == VB[-2]:
-                        VB = VB[:-1]   # compelled -> compel
-        return VB
-    elif type == "G":
-        VB = VB[:-3] # obeying -> obey
-        if not VB in verb_dict and not VB in c_verb_dict:
-            if len(VB) > 1 and VB[-1] == VB[-2]:
-                VB = VB[:-1] # stopping -> stop
-            else:
-                VB = VB + "e" # amusing -> amuse
-        return VB
-    elif type == "Z" and len(VB) > 3:
-        if VB[-1] == "s":
-            VB = VB[:-1]  # likes -> like
-            if VB not in verb_dict and not VB in c_verb_dict and VB[-1] == "e":
-                VB = VB[:-1]  # watches -> watch
-                if VB not in verb_dict and not VB in c_verb_dict and VB[-1] == "i":
-                    VB = VB[:-1] + "y"  # flies -> fly
-        return VB
-
-def stem_RB_to_JJ(RB):
-### used to find the adjective that is the stem of an adverb so that the adverb
-### can be added automatically to the dictionary
-    JJ = RB
-    if len(JJ) > 3 and JJ[-2:] == "ly":
-        JJ = JJ[:-2]  # sharply -> sharp
-        if not JJ in adj_dict:
-            if JJ + "l" in adj_dict:
-                JJ += "l" # full -> fully
-            elif JJ + "le" in adj_dict:
-                JJ += "le" # simply -> simple
-            elif JJ[-1] == "i" and JJ[:-1] + "y" in adj_dict:
-                JJ = JJ[:-1] + "y" # merrily -> merry
-            elif len(JJ) > 5 and JJ[-2:] == "al" and JJ[:-2] in adj_dict:
-                JJ = JJ[:-2] # angelic -> angelically
-    return JJ
-
-def stem_ative_adj(JJ):
-# this function does stemming for both comparative and superlative adjectives
-# after the suffix "er" or "est" has been removed
-    if JJ not in adj_dict:
-        if JJ + "e" in adj_dict:
-            JJ += "e" # abler/ablest -> able
-        elif JJ[:-1] in adj_dict:
-            JJ = JJ[:-1] # bigger/biggest -> big
-        elif JJ[-1] == "i" and JJ[:-1] + "y" in adj_dict:
-            JJ = JJ[:-1] + "y" # easier/easiest -> easy
-    return JJ
-
-
-def stem_comp_JJ(JJ):
-    if JJ[-2:] == "er":
-        JJ = stem_ative_adj(JJ[:-2]) # fairer -> fair
-    return JJ
-
-def stem_super_JJ(JJ):
-    if JJ[-3:] == "est":
-        JJ = stem_ative_adj(JJ[:-3]) # fairest -> fair
-    return JJ
-
-### Spanish Stemming Fuctions
-
-def stem_NC(NC):
-    if NC not in noun_dict and len(NC) > 2 and NC[-1] == "s":   # diplomas -> diploma
-        NC = NC[:-1]
-    if NC not in noun_dict and NC not in c_noun_dict and len(NC) > 1:
-        if NC[-1] == "a":
-            NC = NC[:-1] + "o" #hermanas -> hermano
-        elif NC[-1] == "e": # actor -> actores
-            NC = NC[:-1]
-    return NC
-
-def stem_AQ(AQ):
-    if AQ not in adj_dict and len(AQ) > 2 and AQ[-1] == "s":   # buenos -> bueno
-        AQ = AQ[:-1]
-    if AQ not in adj_dict and AQ not in c_adj_dict and len(AQ) > 1:
-        if AQ[-1] == "a":    # buena -> bueno
-            AQ = AQ[:-1] +  "o"
-        elif AQ[-1] == "e": #  -> watch
-            AQ = AQ[:-1]
-    return AQ
-
-def stem_RG_to_AQ(RG):
-### used to find the adjective that is the stem of an adverb so that the adverb
-### can be added automatically to the dictionary
-    AQ = RG
-    if len(AQ) > 6 and AQ[-5:] == "mente" :
-        AQ = AQ[:-5]  # felizmente -> feliz
-        if not AQ in adj_dict:
-            if AQ[-1] == "a":
-                AQ = AQ[:-1] + "o" # nuevamente -> nuevo
-    return AQ
-
-
-def stem_super_AQ(AQ):
-# this function removes "isima" or "isimo" from the word
-    if AQ not in adj_dict:
-        if len(AQ) > 6 and AQ[-5:] in [chr(237) + "sima", chr(237) + "simo", "isima", "isimo"]:
-            AQ = AQ[:-5]
-            if AQ not in adj_dict:
-                if AQ[-2:] == "qu":
-                    AQ = AQ[:-2] + "co"
-                elif AQ[-2] == "gu":
-                    AQ = AQ[:-1] = "o"
-                else:
-                    AQ += "o"
-    return AQ
-
-### Language general stemming functions ###
-
-def stem_noun(noun):
-    if language == "English":
-        return stem_NN(noun)
-    elif language == "Spanish":
-        return stem_NC(noun)
-
-def stem_adv_to_adj(adverb):
-    if language == "English":
-        return stem_RB_to_JJ(adverb)
-    elif language == "Spanish":
-        return stem_RG_to_AQ(adverb)
-
-def stem_super_adj(adj):
-    if language == "English":
-        return stem_super_JJ(adj)
-    elif language == "Spanish":
-        return stem_super_AQ(adj)
-
-
-### General functions ###
+def split_line(line):
+### splits a line of a preprocessed text into its word/tag pairs and XML tags
+    line = line.replace("<", " <").replace(">", "> ")
+    return [word for word in line.strip().split(" ") if word]
 
 def get_word (pair): return pair[0] # get word from (word, tag) pair
+
 def get_tag (pair) : return pair[1] # get tag from (word, tag) pair
 
 def sum_word_counts (word_count_dict):
@@ -700,1099 +205,2313 @@ def sum_word_counts (word_count_dict):
         count+= word_count_dict[word]
     return count
 
-def find_intensifier(index):
-### this function determines whether the given index is the last word (or,
-### trivially, the only word) in an intensifier. If so, it returns a list
-### containing, as its first element, the length of the intensifier and,
-### as its second element, the modifier from the relevant intensifier dictionary
-    if index < 0 or index >= len(text) or get_tag(text[index]) == "MOD": # already modifying something
-        return False
-    if get_word(text[index]).lower() in c_int_dict: # might be complex
-        for word_mod_pair in c_int_dict[get_word(text[index]).lower()]:
-            if same_lists(word_mod_pair[0][:-1],map(str.lower, map(get_word,text[index - len(word_mod_pair[0]) + 1:index]))):
-                return [len(word_mod_pair[0]), word_mod_pair[1]]
-    if get_word(text[index]).lower() in int_dict: # simple intensifier
-        modifier = int_dict[get_word(text[index]).lower()]
-        if get_word(text[index]).isupper() and use_cap_int: # if capitalized
-             modifier *= capital_modifier   # increase intensification
-        return [1, modifier]
-    return False
-
-def match_multiword_f(index, words):
-### this function recursively matches the (partial) multi-word dictionary entry
-### (words) with the corresponding part of the text (from index)
-### the function returns a list containing the number of words matched (or -1
-### if the match failed) and the value of any intensifier found
-    if len (words) == 0:
-        return [0, 0] #done
+def save_new_adverbs(adv_dict_path, adverbs):
+### appends adverbs learned from the adjective dictionary to the adverb
+### dictionary file, so that later runs load them directly
+    f = open(adv_dict_path, "a")
+    for adverb in adverbs:
+        f.write(adverb + "\t" + str(int(adverbs[adverb])) + "\n")
+    f.close()
+
+def format_modifier(modifier):
+### gives the rich output text of a (name, operator, value) modifier. The
+### operator is "X" for a multiplication, "-" or "+" for a shift, "/" for a
+### division by the value and "" for a marker that does not change the SO
+    (name, operator, value) = modifier
+    if operator == "/":
+        return "X 1/" + str(value) + " (" + name + ")"
+    elif operator:
+        return operator + " " + str(value) + " (" + name + ")"
     else:
-        current = words[0]
-        if not isinstance(current,list):
-            current = [1, [current]] # unmodified words should be appear once
-        if current[0] == "0":
-            return match_multiword_f(index, words[1:]) #this word done
-        if current[0] == "*" or current[0] == "?": # word optional - try
-            temp = match_multiword_f(index, words[1:]) # without first
-            if temp[0] != -1:
-                return temp
-        if index == len(text):
-            return [-1, 0] # reached the end of the text
-        match = False
-        for word_or_tag in current[1]:
-            if word_or_tag.islower(): #match by word
-                match = match or get_word(text[index]).lower() == word_or_tag
-            elif word_or_tag.isupper(): #match by tag
-                if word_or_tag == "INT": # if looking for a intensifiers
-                    i = 1
-                    while index + i < len(text) and text[index + i][0] not in sent_punct:
-                        intensifier = find_intensifier(index + i - 1)
-                        if intensifier and intensifier[0] == i:
-                                result = match_multiword_f(index + i, words[1:])
-                                if result[0] != -1:
-                                    return [result[0] + i, intensifier[1]]
-                        i += 1
-                else:
-                    match = match or get_tag(text[index]) == word_or_tag
-        if not match:
-            return [-1, 0]
+        return "(" + name + ")"
+
+class SOContribution():
+### The calculation of one SO carrying word (or multiword expression): the
+### token spans it is printed with, in order, its dictionary SO, the
+### modifiers applied by the part of speech calculators and the weights
+### applied after them, and its final SO (None if the modifiers brought it to
+### 0, in which case the weights are never applied). Only the positions and
+### numbers are kept; the text is made by render, when it is asked for
+    def __init__(self, start, end):
+        self.spans = [(start, end)]
+        self.SO = 0
+        self.modifiers = []
+        self.weight_modifiers = []
+        self.final_SO = None
+
+    def render(self, words):
+    ### gives the line of the rich output for this word, using the words of the
+    ### text it was found in
+        output = []
+        for (start, end) in self.spans:
+            output += words[start:end]
+        output.append(str(self.SO))
+        for modifier in self.modifiers:
+            output.append(format_modifier(modifier))
+        line = " ".join(output) + " "
+        if self.final_SO is None:
+            return line + "= 0\n"
+        for modifier in self.weight_modifiers:
+            line += " " + format_modifier(modifier)
+        return line + " = " + str(self.final_SO) + "\n"
+
+class SOResult():
+### The outcome of scoring one text: its final SO, the number of SO carrying
+### words it was averaged over, the SO of each sentence (if output_sentences
+### is on) and the adverbs learned while scoring it. If output_calculations is
+### on, sections holds a (title, contributions, average SO) triple for each
+### part of speech; if output_sentences is on, sentence_spans holds the token
+### range of each sentence. The rich output is only made from them by
+### render_text or render_dict, for the texts whose explanation is wanted. If
+### the calculator records its lookups, lookups holds the sorted (dictionary
+### name, key) pairs that were looked up while scoring the text
+    def __init__(self, name, text_SO, SO_counter, sentence_SO, new_adverbs, words, sections=None, sentence_spans=None, lookups=None):
+        self.name = name
+        self.text_SO = text_SO
+        self.SO_counter = SO_counter
+        self.sentence_SO = sentence_SO
+        self.new_adverbs = new_adverbs
+        self.words = words
+        self.sections = sections
+        self.sentence_spans = sentence_spans
+        self.lookups = lookups
+
+    def get_sentences(self):
+    ### gives a (sentence, SO) pair for each sentence of the text
+        sentences = []
+        for i in range(len(self.sentence_spans)):
+            (sent_start, sent_end) = self.sentence_spans[i]
+            sentences.append((" ".join(self.words[sent_start : sent_end]), self.sentence_SO.get(i, 0)))
+        return sentences
+
+    def render_text(self):
+    ### gives the rich output of the text, in the richout.txt format
+        richout = []
+        if self.sections is not None:
+            richout.append("######\n---------\n" + self.name + "\n---------\nText Length: " + str(len(self.words)) + "\n---------\n")
+            for (title, contributions, average_SO) in self.sections:
+                richout.append(title + ":\n-----\n")
+                for contribution in contributions:
+                    richout.append(contribution.render(self.words))
+                richout.append("-----\nAverage SO: " + str(average_SO) + "\n-----\n")
+        if self.sentence_spans is not None:
+            richout.append("-----\nSO by Sentence\n-----\n")
+            for (sentence, sentence_SO) in self.get_sentences():
+                richout.append(sentence + " " + str(sentence_SO) + "\n")
+        if self.sections is not None:
+            richout.append("---------\nTotal SO: " + str(self.text_SO) + "\n---------\n")
+        return "".join(richout)
+
+    def render_dict(self):
+    ### gives the rich output of the text as a dictionary, the object written
+    ### for it to rich_output.jsonl
+        rich_dict = OrderedDict([("File Name", self.name), ("Text Length", float(len(self.words)))])
+        for title in ["Nouns", "Verbs", "Adjectives", "Adverbs"]:
+            rich_dict[title] = {"List":[], "Average SO":0}
+        if self.sections is not None:
+            for (title, contributions, average_SO) in self.sections:
+                rich_dict[title]["List"] = [contribution.render(self.words).strip() for contribution in contributions]
+                rich_dict[title]["Average SO"] = float(average_SO)
+        rich_dict["SO by Sentence"] = []
+        if self.sentence_spans is not None:
+            for (sentence, sentence_SO) in self.get_sentences():
+                rich_dict["SO by Sentence"].append({sentence: str(sentence_SO)})
+        rich_dict["Total SO"] = float(self.text_SO)
+        return rich_dict
+
+class RecordingDictionary(dict):
+### A dictionary that remembers every key looked up in it, whether it is in the
+### dictionary or not, since adding a missing key can change the SO as much as
+### changing a value. Used by SentimentCalculator.record_lookups
+    def __init__(self, entries):
+        dict.__init__(self, entries)
+        self.looked_up = set()
+
+    def __contains__(self, key):
+        self.looked_up.add(key)
+        return dict.__contains__(self, key)
+
+    def __getitem__(self, key):
+        self.looked_up.add(key)
+        return dict.__getitem__(self, key)
+
+
+class SentimentCalculator():
+### Calculates the SO of texts. The configuration and the dictionaries are
+### loaded once, when the calculator is created, and are kept for every text
+### that is scored; only the per-text state is reset between texts
+
+    def __init__(self, config):
+    ### config is either the path of an .ini file or the settings already read
+    ### by get_configuration_from_file
+        if not isinstance(config, dict):
+            config = get_configuration_from_file(config)
+        self.set_configuration(config)
+
+        ### Dictionaries ###
+
+        self.adj_dict = {} # simple (single-word) dictionaries
+        self.adv_dict = {}
+        self.noun_dict = {}
+        self.verb_dict = {}
+        self.int_dict = {}
+        self.c_adj_dict = {} # complex (multi-word) dictionaries
+        self.c_adv_dict = {}
+        self.c_noun_dict = {}
+        self.c_verb_dict = {}
+        self.c_int_dict = {}
+        self.recorded_dictionaries = None # the (name, RecordingDictionary) pairs, see record_lookups
+        self.features = None # the feature rows of the current text, see record_features
+        self.load_dictionaries()
+
+        ### Text ###
+
+        self.tag_names = [] # the tags seen so far; tokens store their position here
+        self.tag_numbers = {} # tag -> position in tag_names
+        self.packed_corpus = None # the packed corpus last read by fill_packed_text
+        self.packed_tag_numbers = [] # and the tag number of each of its tags
+
+        self.reset_text()
+
+    def set_configuration(self, config):
+    ### sets the flags, modifiers, dictionary paths and word lists used by the
+    ### calculator from the parsed .ini settings
+        self.config = config
+
+        self.language = config["language"]
+        self.use_adjectives = config["use_adjectives"]
+        self.use_nouns = config["use_nouns"]
+        self.use_verbs = config["use_verbs"]
+        self.use_adverbs = config["use_adverbs"]
+        self.use_intensifiers = config["use_intensifiers"]
+        self.use_negation = config["use_negation"]
+        self.use_comparatives = config["use_comparatives"]
+        self.use_superlatives = config["use_superlatives"]
+        self.use_multiword_dictionaries = config["use_multiword_dictionaries"]
+        self.use_extra_dict = config["use_extra_dict"]
+        self.use_XML_weighing = config["use_XML_weighing"]
+        self.use_weight_by_location = config["use_weight_by_location"]
+        self.use_irrealis = config["use_irrealis"]
+        self.use_subjunctive = config["use_subjunctive"]
+        self.use_imperative = config["use_imperative"]
+        self.use_conditional = config["use_conditional"]
+        self.use_highlighters = config["use_highlighters"]
+        self.use_cap_int = config["use_cap_int"]
+        self.fix_cap_tags = config["fix_cap_tags"]
+        self.use_exclam_int = config["use_exclam_int"]
+        self.use_quest_mod = config["use_quest_mod"]
+        self.use_quote_mod = config["use_quote_mod"]
+        self.use_definite_assertion = config["use_definite_assertion"]
+        self.use_clause_final_int = config["use_clause_final_int"]
+        self.use_heavy_negation = config["use_heavy_negation"]
+        self.use_word_counts_lower = config["use_word_counts_lower"]
+        self.use_word_counts_block = config["use_word_counts_block"]
+        self.use_blocking = config["use_blocking"]
+        self.adv_learning = config["adv_learning"]
+        self.limit_shift = config["limit_shift"]
+        self.neg_negation_nullification = config["neg_negation_nullification"]
+        self.polarity_switch_neg = config["polarity_switch_neg"]
+        self.restricted_neg = config["restricted_neg"]
+        self.simple_SO = config["simple_SO"]
+        self.use_boundary_words = config["use_boundary_words"]
+        self.use_boundary_punct = config["use_boundary_punctuation"]
+
+        ### Modifiers ###
+
+        self.adj_multiplier = config["adj_multiplier"]
+        self.adv_multiplier = config["adv_multiplier"]
+        self.verb_multiplier = config["verb_multiplier"]
+        self.noun_multiplier = config["noun_multiplier"]
+        self.int_multiplier = config["int_multiplier"]
+        self.neg_multiplier = config["neg_multiplier"]
+        self.capital_modifier = config["capital_modifier"]
+        self.exclam_modifier = config["exclam_modifier"]
+        self.verb_neg_shift = config["verb_neg_shift"]
+        self.noun_neg_shift = config["noun_neg_shift"]
+        self.adj_neg_shift = config["adj_neg_shift"]
+        self.adv_neg_shift = config["adv_neg_shift"]
+        self.blocker_cutoff = config["blocker_cutoff"]
+
+        ### Dictionaries ###
+
+        self.dic_dir = config["dic_dir"]
+        self.adj_dict_path = self.dic_dir + config["adj_dict"]
+        self.adv_dict_path = self.dic_dir + config["adv_dict"]
+        self.noun_dict_path = self.dic_dir + config["noun_dict"]
+        self.verb_dict_path = self.dic_dir + config["verb_dict"]
+        self.int_dict_path = self.dic_dir + config["int_dict"]
+        if self.use_extra_dict and config["extra_dict"]:
+            self.extra_dict_path = self.dic_dir + config["extra_dict"]
         else:
-            if current[0] == "*":
-                temp = match_multiword_f(index + 1, words)
-            elif current[0] == "+":
-                temp = match_multiword_f(index + 1, [["*", current[1]]] + words[1:])
-            elif current[0] == "?":
-                temp = match_multiword_f(index + 1, words[1:])
-            else:
-                temp = match_multiword_f(index + 1, [[str(int(current[0]) - 1), current[1]]] + words[1:])
-            if temp[0] == -1:
-                return temp #failed
+            self.extra_dict_path = False
+        if config.get("compiled_lexicon"):
+            self.compiled_lexicon_path = self.dic_dir + config["compiled_lexicon"]
+        else:
+            self.compiled_lexicon_path = False
+
+        ### Internal Word lists ###
+        if self.language == "English":
+            self.not_wanted_adj = ["other", "same", "such", "first", "next", "last", "few", "many", "less", "more", "least", "most"]
+            self.not_wanted_adv = [ "really", "especially", "apparently", "actually", "evidently", "suddenly", "completely","honestly", "basically", "probably", "seemingly", "nearly", "highly", "exactly", "equally", "literally", "definitely", "practically", "obviously", "immediately", "intentionally", "usually", "particularly", "shortly", "clearly", "mildly", "sincerely", "accidentally", "eventually", "finally", "personally", "importantly", "specifically", "likely", "absolutely", "necessarily", "strongly", "relatively", "comparatively", "entirely", "possibly", "generally", "expressly", "ultimately", "originally", "initially", "virtually", "technically", "frankly", "seriously", "fairly",  "approximately", "critically", "continually", "certainly",  "regularly", "essentially", "lately", "explicitly", "right", "subtly",  "lastly", "vocally", "technologically", "firstly", "tally", "ideally", "specially", "humanly", "socially", "sexually", "preferably", "immediately", "legally", "hopefully", "largely", "frequently", "factually", "typically"]
+            self.not_wanted_verb = []
+            self.negators = ["not", "no", "n't", "neither", "nor", "nothing", "never", "none", "lack", "lacked", "lacking", "lacks", "missing", "without", "absence", "devoid"];
+            self.punct = [".", ",", ";", "!", "?", ":", ")", "(", "\"", "'", "-"]
+            self.sent_punct = [".", ";", "!", "?", ":", "\n", "\r"]
+            self.skipped = {"JJ": ["even", "to", "being", "be", "been", "is", "was", "'ve", "have", "had", "do", "did", "done", "of", "as", "DT", "PSP$"], "RB": ["VB", "VBZ", "VBP", "VBG"], "VB":["TO", "being", "been", "be"], "NN":["DT", "JJ", "NN", "of", "have", "has", "come", "with", "include"]}
+            self.comparatives = ["less", "more", "as"]
+            self.superlatives = ["most", "least"]
+            self.definites = ["the","this", "POS", "PRP$"]
+            self.noun_tag = "NN"
+            self.verb_tag = "VB"
+            self.adj_tag = "JJ"
+            self.adv_tag = "RB"
+            self.macro_replace = {"#NP?#": "[PDT]?_[DET|PRP|PRP$|NN|NNP]?_[POS]?_[NN|NNP|JJ]?_[NN|NNP|NNS|NNPS]?","#PER?#": "[me|us|her|him]?","#give#": "give|gave|given","#fall#": "fall|fell|fallen","#get#": "get|got|gotten","#come#": "come|came","#go#": "go|went|gone", "#show#": "show|shown","#make#": "make|made","#hang#": "hang|hung","#break#": "break|broke|broken", "#see#": "see|saw|seen", "#be#": "be|am|are|was|were|been", "#bring#": "bring|brought", "#think#" : "think|thought", "#have#": "has|have|had", "#blow#": "blow|blew", "#build#": "build|built", "#do#": "do|did|done", "#can#": "can|could", "#grow#":"grow|grew|grown", "#hang#": "hang|hung", "#run#": "run|ran", "#stand#": "stand|stood", "#string#": "string|strung", "#hold#" : "hold|held", "#take#" : "take|took|taken"}
+        elif self.language == "Spanish":
+            self.not_wanted_adj = ["otro","mio","tuyo","suyo","nuestro","vuestro","mismo","primero","segundo","último"]
+            additional = []
+            for adj in self.not_wanted_adj:
+               additional += [adj[:-1] + "a",adj[:-2] + "os", adj[:-2] + "as"]
+            self.not_wanted_adj += additional
+            self.not_wanted_adv = ["básicamente", "claramente","ampliamente", "atentamente", "completamente"]
+            self.not_wanted_verb = ["haber", "estar"]
+            self.negators = ["no", "ni", "nunca", "jam"+ chr(225) + "s", "nada", "nadie", "ninguno", "ningunos", "ninguna", "ningunas", "faltar", "falta", "sin"];
+            self.punct = [".", ",", ";", "!", "?", ":", ")", "(", "\"", "'", "-", chr(161), chr(191)]
+            self.sent_punct = [".", ";", "!", "?", ":", "\n", "\r", chr(161), chr(191)]
+            self.skipped = {"AQ": [ "a", "estar", "haber", "hacer", "de", "como", "NC", "PP", "DP", "DD", "DI", "DA", "RG"], "RG": ["VM", "VA", "VS"], "VM":["haber", "estar", "PP"], "NC":["DP", "DD", "DI", "DA", "AQ", "AO", "de", "tener", "hacer", "estar", "con", "incluso"]}
+            self.comparatives = ["m" + chr(225) + "s", "menos", "como"]
+            self.definites = ["el", "la", "los", "las", "este", "esta","estos", "estas", "de", "DP"]
+            self.accents = {chr(237):"i", chr(243):"o", chr(250):"u", chr(233):"e", chr(225):"a",chr(241):"n"}
+            self.noun_tag = "NC"
+            self.verb_tag = "VM"
+            self.adj_tag = "AQ"
+            self.adv_tag = "RG"
+            self.macro_replace = {"#NP?#": "[DI|DP|DA]?_[AQ|AC]?_[NC|NP]?_[AQ]?"}
+
+        self.weight_tags= config["weight_tags"]
+        self.weights_by_location = config["weights_by_location"]
+        self.highlighters = config["highlighters"]
+        self.irrealis = config["irrealis"]
+        self.boundary_words = config["boundary_words"]
+
+        ### Output ###
+
+        self.output_calculations = config["output_calculations"]
+        self.output_sentences = config["output_sentences"]
+        self.output_unknown = config["output_unknown"]
+        self.output_used = config["output_used"]
+        self.output_used_lemma = config["output_used_lemma"]
+        self.search = config["search"]
+        self.contain_all_words = config["contain_all_words"]
+
+    def reset_text(self):
+    ### clears everything that was collected for the previous text, so that the
+    ### loaded dictionaries can be reused for the next one
+        ### the text is kept in columns, one entry per token
+        self.vocabulary = [] # the distinct words of the text
+        self.word_numbers = {} # word -> position in vocabulary
+        self.vocabulary_lower = [] # the lowercased form of each vocabulary word
+        self.vocabulary_caps = [] # whether each vocabulary word is in all caps
+        self.word_ids = array.array("I") # the vocabulary position of each word
+        self.words = [] # the words, shared with the vocabulary
+        self.lower_words = [] # the lowercased words
+        self.caps = bytearray() # 1 if the word is in all caps
+        self.tag_ids = array.array("H") # the position of each tag in tag_names
+        self.simple = bytearray() # 1 if the token was a plain word/tag pair
+        self.consumed = bytearray() # 1 if the token is used as a modifier ("MOD")
+        self.weights = array.array("d") # weights should be the same length as the text, one for each token
+        self.word_counts = [{},{},{},{}] # keeps track of number of times each word lemma appears in the text
+        self.boundaries = [] # the location of newline boundaries from the input
+        self.boundary_set = set() # the boundaries, for fast membership tests
+        self.sentence_numbers = [] # the sentence number of each token
+        self.sentence_spans = [] # the (start, end) token range printed for each boundary
+        self.boundary_flags = [] # at_boundary() for each token
+        self.clause_starts = [] # the first token after the last boundary at or before each token
+        self.clause_ends = [] # the first boundary at or after each token
+        self.last_negators = [] # the last negator at or before each token (-1 if none)
+        self.last_irrealis = [] # the last irrealis marker at or before each token
+        self.last_highlighters = [] # the last highlighter at or before each token
+        self.last_sent_puncts = [] # the last sentence punctuation at or before each token
+        self.next_sent_puncts = [] # the next sentence punctuation at or after each token
+        self.new_adv_dict = {} # adverbs learned from the adjective dictionary in this text
+        self.contributions = [[],[],[],[]] # the calculation of each SO carrying word, by part of speech
+        self.contribution = None # the last of them, to which the weights are added
+        if self.recorded_dictionaries is not None:
+            for (name, dictionary) in self.recorded_dictionaries:
+                dictionary.looked_up = set()
+        if self.features is not None:
+            self.features = []
+
+
+    ### Multi-word dictionary macros:
+    ### These macros allow for relatively simple and uncluttered multiword
+    ### dictionary definitions. The dictionary keys will be replaced by the
+    ### their corresponding values when they appear in definitions (in the
+    ### dictionary files). In particular, allows the forms of irregular verbs
+    ### to be listed only once (here, rather than in the dictionary)
+
+    ### Loading functions ###
+
+
+    def get_multiword_entries(self, string):
+    ### Coverts the multiword dictionary entry in a file to something that can
+    ### be accessed by the calculator
+    ### In the dictionary, each word of a multi-word definition is separated by
+    ### an underscore. The primary word (the one whose part of speech is the same
+    ### as the phrase as a whole, except for intensifiers) should be in parentheses;
+    ### it becomes the key (if there are multiple keys, multiple entries are created)
+    ### The value of an c_dict is a list of all multi-word phrases a key word
+    ### appears in (as a key) and each of these contains a 2-ple: the list all the
+    ### words in the phrase, with the key word removed and replaced with a #,
+    ### and the SO value for the phrase. If a word or words is modified by an
+    ### operator (such as ?,*,+,|, or a number), the operator should be placed in
+    ### []--all operators but | appear outside the right bracket
+    ### ? = optional, + = one or more, * = zero or more, 2 (3, etc.) = two of these
+    ### | = or. INT refers to a word or words in the intensifier dictionary.
+    ### with that key (minus the last word), together with the modifier value
+    ### ex.: c_int_dict["little"] = [[["a", "#"], -0.5]]
+        if "#" in string:  #if there is a macro, replace
+            for item in self.macro_replace:
+                string = string.replace(item, self.macro_replace[item])
+        words = string.split("_")
+        entry = []
+        keyindex = len(words) - 1 # if no parens, default to last word
+        for index in range(len(words)):
+            word = words[index]
+            slot = []
+            if word[0] == "(":
+                slot.append(1)
+                slot.append(word[1:-1].split("|"))
+                keyindex = index # found the key
+            elif word[0] == "[":
+                ordinality = False
+                if word[-1] != "]":
+                    ordinality = True
+                if ordinality:
+                    slot.append(word[-1])
+                    word = word[:-1]
+                else:
+                    slot.append(1)
+                slot.append(word[1:-1].split("|"))
             else:
-                return [temp[0] + 1, temp[1]] #success
+                slot = word
+            entry.append(slot)
+        final_entries = []
+        if not isinstance(entry[keyindex], list):
+            key = entry[keyindex]
+            entry[keyindex] = "#"
+            final_entries = [[key,entry]]
+        else:
+            for key in entry[keyindex][1]:
+                final_entry = []
+                for index in range(len(entry)):
+                    if index == keyindex:
+                        final_entry.append("#")
+                    else:
+                        final_entry.append(entry[index])
+                final_entries.append([key, final_entry])
+        return final_entries
 
+    def has_accent(self, word):
+        for accent in self.accents:
+            if accent in word:
+                return True
+        return False
 
-def match_multiword_b(index, words):
-### same as match_multiword_f, except it looks in the other direction
-    if len (words) == 0:
-        return [0, 0]
-    else:
-        current = words[-1]
-        if not isinstance(current,list):
-            current = [1, [current]]
-        if current[0] == "0":
-            return match_multiword_b(index, words[:-1])
-        if current[0] == "*" or current[0] == "?":
-            temp = match_multiword_b(index, words[:-1])
-            if temp[0] != -1:
-                return temp
-        if index == -1:
-            return [-1,0]
-        match = False
-        for word_or_tag in current[1]:
-            if word_or_tag.islower():
-                match = match or get_word(text[index]).lower() == word_or_tag
-            elif word_or_tag.isupper():
-                if word_or_tag == "INT":
-                    intensifier = find_intensifier(index)
-                    if intensifier:
-                        i = intensifier[0]
-                        result = match_multiword_b(index  - i, words[:-1])
-                        if result[0] != -1:
-                            return [result[0] + i, intensifier[1]]
-                else:
-                    match = match or get_tag(text[index]) == word_or_tag
-        if not match:
-            return [-1, 0]
-        else:
-            if current[0] == "*":
-                temp = match_multiword_b(index - 1, words)
-            elif current[0] == "+":
-                temp = match_multiword_b(index - 1, words[:-1] + [["*", current[1]]])
-            elif current[0] == "?":
-                temp = match_multiword_b(index - 1, words[:-1])
+    def remove_accents(self, word):
+        for accent in self.accents:
+            word = word.replace(accent, self.accents[accent])
+        return word
+
+    def load_dictionary(self, filepointer, s_dict, c_dict):
+    ### General function for loading dictionaries from files and putting them
+    ### either in the simple or complex dictionary, as appropriate
+        for line in filepointer.readlines():
+            pair = line.strip().split()
+            if len(pair) == 2:
+                if "_" not in pair[0]:  #if single word
+                    if self.language == "Spanish" and self.has_accent(pair[0]):
+                        s_dict[self.remove_accents(pair[0])] = float(pair[1])
+                    s_dict[pair[0]] = float(pair[1]) #put in simple dictionary
+                elif self.use_multiword_dictionaries:
+                    entries = self.get_multiword_entries(pair[0])
+                    for entry in entries:
+                        if entry[0] not in c_dict:
+                            c_dict[entry[0]] = [[entry[1], float(pair[1])]]
+                        else:
+                            c_dict[entry[0]].append([entry[1], float(pair[1])])
+        filepointer.close()
+
+    def load_extra_dict(self, filepointer):
+    ### loads the optional dictionary, which contains entries from all the
+    ### various types of words
+        s_dict = False
+        c_dict = False
+        for line in filepointer.readlines():
+            line = line.strip()
+            if line:
+                if line == "adjectives":
+                    s_dict = self.adj_dict
+                    c_dict = self.c_adj_dict
+                elif line == "nouns":
+                    s_dict = self.noun_dict
+                    c_dict = self.c_noun_dict
+                elif line == "verbs":
+                    s_dict = self.verb_dict
+                    c_dict = self.c_verb_dict
+                elif line == "adverbs":
+                    s_dict = self.adv_dict
+                    c_dict = self.c_adv_dict
+                elif line == "intensifiers":
+                    s_dict = self.int_dict
+                    c_dict = self.c_adv_dict
+                elif s_dict:
+                    pair = line.split()
+                    if "_" not in pair[0]:  #if single word
+                        s_dict[pair[0]] = float(pair[1]) #put in simple dictionary
+                    elif self.use_multiword_dictionaries:
+                        entries = self.get_multiword_entries(pair[0])
+                        for entry in entries:
+                            if entry[0] not in c_dict:
+                                c_dict[entry[0]] = [[entry[1], float(pair[1])]]
+                            else:
+                                 for old_entry in c_dict[entry[0]]: # duplicate entry
+                                    if same_lists(old_entry[0], entry[1]):
+                                        c_dict[entry[0]].remove(old_entry)
+                                 c_dict[entry[0]].append([entry[1], float(pair[1])])
+        filepointer.close()
+
+    def load_dictionaries(self):
+    ### load the five kinds of dictionaries, from the compiled lexicon if there
+    ### is one and it is up to date, otherwise from the dictionary files (and
+    ### then compile the lexicon for the next time)
+        if self.compiled_lexicon_path:
+            fingerprint = self.get_lexicon_fingerprint()
+        if not self.compiled_lexicon_path or not self.load_compiled_lexicon(fingerprint):
+            self.load_dictionary_files()
+            if self.compiled_lexicon_path:
+                self.save_compiled_lexicon(fingerprint)
+        self.compile_multiwords()
+        self.clear_stem_cache()
+        self.recorded_dictionaries = None
+
+    def get_config_fingerprint(self):
+    ### a hash of all the settings of the calculator
+        return hashlib.sha1(repr(sorted(self.config.items())).encode("utf-8")).hexdigest()
+
+    def get_lexicon_entries(self):
+    ### the entries of every loaded dictionary, as dictionary name -> key ->
+    ### value (for the c_dicts, the (words, value) pairs of the multi-word
+    ### entries of the key), to find the keys that differ between two versions
+    ### of the dictionaries
+        entries = {}
+        for name in LEXICON_DICTIONARIES:
+            if name.startswith("c_"):
+                entries[name] = dict((key, [dict_entry[:2] for dict_entry in value]) for (key, value) in getattr(self, name).items())
             else:
-                temp = match_multiword_b(index - 1, words[:-1] + [[str(int(current[0]) - 1), current[1]]])
-            if temp[0] == -1:
-                return temp
+                entries[name] = dict(getattr(self, name).items())
+        return entries
+
+    def record_lookups(self):
+    ### from now on, keeps the dictionary keys looked up while scoring each
+    ### text, and gives them in its SOResult (see get_lookups). The multi-word
+    ### intensifiers are looked up in c_int_trie, which is recorded as
+    ### c_int_dict. The stem cache is not used while recording, since a cached
+    ### stem skips the lookups that made it. Loading the dictionaries again
+    ### stops the recording
+        self.recorded_dictionaries = []
+        for name in LEXICON_DICTIONARIES:
+            dictionary = RecordingDictionary(getattr(self, name))
+            setattr(self, name, dictionary)
+            self.recorded_dictionaries.append((name, dictionary))
+        self.c_int_trie = RecordingDictionary(self.c_int_trie)
+        self.recorded_dictionaries.append(("c_int_dict", self.c_int_trie))
+
+    def record_features(self):
+    ### from now on, keeps a feature row (with the columns in FEATURE_COLUMNS)
+    ### for each SO carrying word of the current text in self.features
+        self.features = []
+
+    def add_feature(self, POS, lemma, index, leftedge, SO, int_modifier, negation, int_modifier_negex):
+    ### adds the feature row of the word at index, given the part of speech
+    ### number (0 to 3 for nouns, verbs, adjectives and adverbs) and what its
+    ### calculator found: its lemma, dictionary SO, intensification, negation
+    ### (-1 if none) and negation-external intensification. An intensifier in all
+    ### caps is kept multiplied by the current capital_modifier
+        capitalized = False
+        exclamation = False
+        highlighter = 1
+        nullified = False
+        for (name, operator, value) in self.get_other_modifiers(index, leftedge):
+            if name == "CAPITALIZED":
+                capitalized = True
+            elif name == "EXCLAMATION":
+                exclamation = True
+            elif name == "HIGHLIGHTED":
+                highlighter *= value
             else:
-                return [temp[0] + 1, temp[1]]
-
-
-def find_multiword(index, dict_entry_list):
-### this function determines whether the words surrounding the key word at
-### index match one of the dictionary definitions in dict_entry_list. If so,
-### it returns a list containing the SO value, the number of words in the phrase,
-### that are to the left of index, the number of words to the right, and the
-### value of any intensifier. Any word specifically designated in the defintion
-### will have its tag changed to "MOD" so that it will not be counted twice
-    for dict_entry in dict_entry_list:
-        words = dict_entry[0]
-        SO = dict_entry[1]
-        start = words.index("#")
-        intensifier = 0
-        if start < len(words) - 1:
-            (countforward, int_temp) = match_multiword_f(index + 1, words[start +1:])
-            if int_temp != 0:
-                intensifier = int_temp
+                nullified = True
+        if self.use_blocking and int_modifier == 0:
+            blocker_strength = self.get_blocker_strength(SO, index, [self.noun_tag, self.verb_tag, self.adj_tag, self.adv_tag][POS])
         else:
-            countforward = 0
-        if start > 0:
-            (countback, int_temp) = match_multiword_b(index - 1, words[:start])
-            if int_temp != 0:
-                intensifier = int_temp
-        else:
-            countback = 0
-        if countforward != -1 and countback != -1:
-            for i in range(index - countback, index + countforward + 1):
-                if get_word(text[i]) in dict_entry[0]:
-                    text[i][1] = "MOD"
-            return [SO, countback, countforward, intensifier]
-    return False
-
-def words_within_num(index, words_tags, num):
-### check to see if something in words_tags is within num of index (including
-### index), returns true if so
-    while num > 0:
-        if get_word(text[index]) in words_tags or get_tag(text[index]) in words_tags:
-            return True
-        num -= 1
-        index -= 1
-    return False
-
-
-def get_sentence (index):
-### extracts the sentence (a string) that contains the given index, for searching
-    sent_start = index
-    sent_end = index + 1
-    while sent_start > 0 and sent_start not in boundaries:
-        sent_start -= 1
-    while sent_end < len(text) and sent_end not in boundaries:
-        sent_end += 1
-    return " ".join(map(get_word, text[sent_start : sent_end]))
-
-def get_sentence_no (index):
-### returns the sentence number, based on the orignal text newlines
-    while index not in boundaries:
-        index += 1
-    return boundaries.index(index)
-
-def get_sent_punct (index):
-### get the next sentence punctuation (e.g. ?, !, or .) after the given index
-    while text[index][0] not in sent_punct:
-        if index == len(text) - 1: #if the end of the text is reached
-            return "EOF"
-        index += 1
-    return get_word(text[index])
-
-def at_boundary (index):
-    if index +1 in boundaries:
-        return True
-    elif use_boundary_punct and get_word(text[index]) in punct:
-        return True
-    elif use_boundary_words and get_word(text[index]) in boundary_words:
+            blocker_strength = float("-inf")
+        self.features.append((POS, lemma, SO, int_modifier, negation != -1, int_modifier_negex, capitalized,
+                              exclamation, highlighter, nullified, blocker_strength, self.weights[index]))
+
+    def get_lookups(self):
+    ### the sorted (dictionary name, key) pairs looked up in the current text
+        lookups = set()
+        for (name, dictionary) in self.recorded_dictionaries:
+            for key in dictionary.looked_up:
+                lookups.add((name, key))
+        return sorted(lookups)
+
+    def get_lexicon_fingerprint(self):
+    ### a hash of everything the loaded dictionaries depend on: the settings in
+    ### LEXICON_SETTINGS and the contents of the dictionary files
+        fingerprint = hashlib.sha1()
+        for setting in LEXICON_SETTINGS:
+            fingerprint.update((setting + "=" + str(self.config.get(setting, "")) + "\n").encode("utf-8"))
+        for path in [self.adj_dict_path, self.adv_dict_path, self.verb_dict_path, self.noun_dict_path, self.int_dict_path, self.extra_dict_path]:
+            if path:
+                f = open(path, "rb")
+                fingerprint.update(f.read())
+                f.close()
+        return fingerprint.hexdigest()
+
+    def load_compiled_lexicon(self, fingerprint):
+    ### loads the dictionaries from the compiled lexicon, returns False (and
+    ### loads nothing) if it is missing, of another version or out of date
+        if not os.path.isfile(self.compiled_lexicon_path):
+            return False
+        f = open(self.compiled_lexicon_path, "rb")
+        try:
+            header = pickle.load(f)
+            if header != {"version": LEXICON_VERSION, "fingerprint": fingerprint}:
+                return False
+            dictionaries = pickle.load(f)
+        except (pickle.UnpicklingError, EOFError):
+            return False
+        finally:
+            f.close()
+        for name in LEXICON_DICTIONARIES:
+            setattr(self, name, dictionaries[name])
         return True
-    else:
+
+    def save_compiled_lexicon(self, fingerprint):
+    ### writes the loaded dictionaries to the compiled lexicon. The file is
+    ### written under a temporary name and then renamed, so that other
+    ### processes never read a partially written lexicon
+        dictionaries = {}
+        for name in LEXICON_DICTIONARIES:
+            dictionaries[name] = getattr(self, name)
+        temp_path = self.compiled_lexicon_path + "." + str(os.getpid())
+        f = open(temp_path, "wb")
+        pickle.dump({"version": LEXICON_VERSION, "fingerprint": fingerprint}, f, pickle.HIGHEST_PROTOCOL)
+        pickle.dump(dictionaries, f, pickle.HIGHEST_PROTOCOL)
+        f.close()
+        os.replace(temp_path, self.compiled_lexicon_path)
+
+    def load_dictionary_files(self):
+    ### load the five kinds of dictionaries from the dictionary files
+        self.load_dictionary (open (self.adj_dict_path, encoding = "ISO-8859-1"), self.adj_dict, self.c_adj_dict)
+        self.load_dictionary (open (self.adv_dict_path, encoding = "ISO-8859-1"), self.adv_dict, self.c_adv_dict)
+        self.load_dictionary (open (self.verb_dict_path, encoding = "ISO-8859-1"), self.verb_dict, self.c_verb_dict)
+        self.load_dictionary (open (self.noun_dict_path, encoding = "ISO-8859-1"), self.noun_dict, self.c_noun_dict)
+        self.load_dictionary (open (self.int_dict_path, encoding = "ISO-8859-1"), self.int_dict, self.c_int_dict)
+        if self.extra_dict_path:
+            self.load_extra_dict(open (self.extra_dict_path, encoding = "ISO-8859-1"))
+        if self.simple_SO:
+            for s_dict in [self.adj_dict,self.adv_dict,self.verb_dict, self.noun_dict]:
+                for entry in s_dict:
+                    if s_dict[entry] > 0:
+                        s_dict[entry] = 2
+                    elif s_dict[entry] < 0:
+                        s_dict[entry] = -2
+            for entry in self.int_dict:
+                if self.int_dict[entry] > 0:
+                    self.int_dict[entry] = .5
+                elif self.int_dict[entry] < 0 and self.int_dict[entry] > -1:
+                    self.int_dict[entry] = -.5
+                elif self.int_dict[entry] < -1:
+                    self.int_dict[entry] = -2
+            for c_dict in [self.c_adj_dict,self.c_adv_dict,self.c_verb_dict, self.c_noun_dict]:
+                for entry in c_dict:
+                    for i in range(len(c_dict[entry])):
+                        if c_dict[entry][i][1] > 0:
+                            c_dict[entry][i] = [c_dict[entry][i][0], 2]
+                        elif c_dict[entry][i][1] < 0:
+                            c_dict[entry][i] = [c_dict[entry][i][0], -2]
+            for entry in self.c_int_dict:
+                 for i in range(len(self.c_int_dict[entry])):
+                     if self.c_int_dict[entry][i][1] > 0:
+                         self.c_int_dict[entry][i] = [self.c_int_dict[entry][i][0], .5]
+                     elif self.c_int_dict[entry][i][1] < 0 and self.c_int_dict[entry][i][1] > -1:
+                         self.c_int_dict[entry][i] = [self.c_int_dict[entry][i][0], -.5]
+                     elif self.c_int_dict[entry][i][1] < -1:
+                         self.c_int_dict[entry][i] = [self.c_int_dict[entry][i][0], -2]
+
+
+    def compile_multiwords(self):
+    ### compiles the multi-word entries of the c_dicts for match_multiword. Each
+    ### entry gets, as its third element, the slots after the key word and the
+    ### slots before it (nearest first). A slot is a 4-ple: the count ("*", "+",
+    ### "?" or a number), the words, the tags and whether it allows an intensifier
+    ### The multi-word intensifiers are compiled into a trie for find_intensifier,
+    ### keyed by their last word and then by the words before it. A node is a
+    ### list of the intensifier ending there (as the position of its definition,
+    ### its length and its modifier, or None) and the child nodes
+        for c_dict in [self.c_adj_dict, self.c_adv_dict, self.c_verb_dict, self.c_noun_dict]:
+            for entry in c_dict:
+                for dict_entry in c_dict[entry]:
+                    words = dict_entry[0]
+                    start = words.index("#")
+                    dict_entry[2:] = [[self.compile_slots(words[start + 1:]), self.compile_slots(words[start - 1::-1] if start > 0 else [])]]
+        self.max_int_length = 1 # the longest intensifier, which bounds the INT searches
+        self.c_int_trie = {} # the multi-word intensifiers, from the last word backward
+        for entry in self.c_int_dict:
+            for order in range(len(self.c_int_dict[entry])):
+                (words, modifier) = self.c_int_dict[entry][order]
+                self.max_int_length = max(self.max_int_length, len(words))
+                if not all(isinstance(word, str) for word in words[:-1]):
+                    continue # only plain words can match
+                node = self.c_int_trie.setdefault(entry, [None, {}])
+                for word in reversed(words[:-1]):
+                    node = node[1].setdefault(word, [None, {}])
+                if node[0] is None: # the first definition is used
+                    node[0] = (order, len(words), modifier)
+
+    def compile_slots(self, words):
+        slots = []
+        for word in words:
+            if not isinstance(word, list):
+                word = [1, [word]] # unmodified words should be appear once
+            count = word[0]
+            if count not in ["*", "+", "?"]:
+                count = int(count)
+            slot_words = set()
+            slot_tags = set()
+            has_int = False
+            for word_or_tag in word[1]:
+                if word_or_tag.islower(): #match by word
+                    slot_words.add(word_or_tag)
+                elif word_or_tag == "INT": # intensifiers
+                    has_int = True
+                elif word_or_tag.isupper(): #match by tag
+                    slot_tags.add(word_or_tag)
+            slots.append((count, frozenset(slot_words), frozenset(slot_tags), has_int))
+        return tuple(slots)
+
+    def convert_ranges(self):
+    ### converts a list of string ranges in faction form (e.g. ["1/4-1/2", 2]) into a
+    ### a list of numerical ranges plus weight (e.g. [0.25, .5, 2]
+        new_ranges = []
+        for range in self.weights_by_location:
+            pair = range.split("-")
+            if len(pair) == 2:
+                start = convert_fraction(pair[0].strip())
+                end = convert_fraction(pair[1].strip())
+                if start >= 0 and start <= 1 and end >= 0 and end <= 1 and start < end:
+                    new_ranges.append([start,end, self.weights_by_location[range]])
+        return new_ranges
+
+
+    def add_token(self, token, weight):
+    ### adds a token, given as a word, tag list, to the end of the text. A word
+    ### that contains "/" gives more than two parts; the first is used as the
+    ### word and the second as the tag, but such tokens are not scored
+        word = token[0]
+        if word not in self.word_numbers:
+            self.word_numbers[word] = len(self.vocabulary)
+            self.vocabulary.append(word)
+            self.vocabulary_lower.append(word.lower())
+            self.vocabulary_caps.append(word.isupper())
+        word_id = self.word_numbers[word]
+        self.word_ids.append(word_id)
+        self.words.append(self.vocabulary[word_id])
+        self.lower_words.append(self.vocabulary_lower[word_id])
+        self.caps.append(self.vocabulary_caps[word_id])
+        self.tag_ids.append(self.get_tag_number(token[1]))
+        self.simple.append(len(token) == 2)
+        self.consumed.append(0)
+        self.weights.append(weight)
+
+    def get_tag_number(self, tag):
+        if tag not in self.tag_numbers:
+            self.tag_numbers[tag] = len(self.tag_names)
+            self.tag_names.append(tag)
+        return self.tag_numbers[tag]
+
+    def get_token_tag(self, index):
+    ### the tag of the token at index, or "MOD" if it already modifies another word
+        if self.consumed[index]:
+            return "MOD"
+        return self.tag_names[self.tag_ids[index]]
+
+    def set_token_tag(self, index, tag):
+        self.tag_ids[index] = self.get_tag_number(tag)
+
+    def fill_text_and_weights(self, lines):
+    ### Read in the text, given as its lines (an open file or any other iterable
+    ### of lines). The text is assumed to be properly spaced and tagged,
+    ### i.e. there should be a space between every word/tag pair or XML tag
+    ### if there are XML tags and those tags have been assigned weight, the weight
+    ### will be applied after the opening tag and will be removed at the closing
+    ### tag. All XML tags are removed for the SO calculation
+        weight = 1.0 # start with weight 1
+        temp_weight = 1.0 # keep track of weight before a zero
+        for line in lines:
+            for word in split_line(line):
+                if word[0] == "<" and word[-1] == ">": #XML tag
+                    (weight, temp_weight) = self.apply_XML_tag(word, weight, temp_weight)
+                elif "/" in word:
+                    self.add_token(word.split("/"), weight)
+            self.boundaries.append(len(self.words))
+
+    def apply_XML_tag(self, XML_word, weight, temp_weight):
+    ### gives the (weight, temp_weight) that follow an opening or closing XML
+    ### tag, given the ones before it
+        if self.use_XML_weighing:
+            XML_tag = XML_word.strip("<>/")
+            if XML_tag in self.weight_tags:
+                weight_modifier = self.weight_tags[XML_tag]
+            elif is_decimal(XML_tag):
+                weight_modifier = float(XML_tag)
+            else:
+                weight_modifier = 1
+            if XML_word[1] == "/":
+                if weight_modifier != 0:
+                    weight /= weight_modifier # remove weight
+                else:
+                    weight = temp_weight # use pre-zero weight
+            else:
+                if weight_modifier != 0:
+                    weight *= weight_modifier # add weight
+                else:
+                    temp_weight = weight # save weight
+                    weight = 0
+        return (weight, temp_weight)
+
+    def fill_packed_text(self, corpus, doc_index):
+    ### fills the text with a document of a packed corpus (an SO_Pack.PackedCorpus),
+    ### the same way fill_text_and_weights does with its preprocessed file. The
+    ### word ids (and the vocabulary) are those of the corpus, and the XML tags
+    ### are weighed again, so the same packed corpus can be used with any config
+        if self.packed_corpus is not corpus: # the corpus tags, as tag numbers
+            self.packed_corpus = corpus
+            self.packed_tag_numbers = [self.get_tag_number(tag) for tag in corpus.tags]
+        (word_ids, tag_ids, simple, boundaries, XML_positions, XML_ids) = corpus.get_document(doc_index)
+        self.vocabulary = corpus.words
+        self.vocabulary_lower = corpus.words_lower
+        self.vocabulary_caps = corpus.words_caps
+        self.word_ids.frombytes(word_ids.cast("B"))
+        self.words = [self.vocabulary[word_id] for word_id in self.word_ids]
+        self.lower_words = [self.vocabulary_lower[word_id] for word_id in self.word_ids]
+        self.caps = bytearray([self.vocabulary_caps[word_id] for word_id in self.word_ids])
+        tag_numbers = self.packed_tag_numbers
+        self.tag_ids = array.array("H", [tag_numbers[tag_id] for tag_id in tag_ids])
+        self.simple = bytearray(simple)
+        self.consumed = bytearray(len(self.words))
+        weight = 1.0
+        temp_weight = 1.0
+        for i in range(len(XML_positions)): # each weight holds up to the next tag
+            self.weights.extend([weight] * (XML_positions[i] - len(self.weights)))
+            (weight, temp_weight) = self.apply_XML_tag(corpus.XML_words[XML_ids[i]], weight, temp_weight)
+        self.weights.extend([weight] * (len(self.words) - len(self.weights)))
+        self.boundaries = list(boundaries)
+
+    def apply_location_weights(self):
+    ### multiplies the weights of words within the fraction ranges given by
+    ### weights_by_location
+        if self.use_weight_by_location:  # add location weights
+            range_dict = self.convert_ranges()
+            for i in range(len(self.weights)):
+                for interval in range_dict:  #if the current index in range
+                    if interval[0] <= float(i)/len(self.weights) and interval[1] > float(i)/len(self.weights):
+                        self.weights[i] *= interval[2]  #add the weight
+
+    ### English steming functions ###
+
+    def stem_NN(self, NN):
+        if NN not in self.noun_dict and NN not in self.c_noun_dict and  len(NN) > 2 and NN[-1] == "s":   # boys -> boy
+            NN = NN[:-1]
+            if NN not in self.noun_dict and NN not in self.c_noun_dict and NN[-1] == "e": # watches -> watch
+                NN = NN[:-1]
+                if NN not in self.noun_dict and NN not in self.c_noun_dict and NN[-1] == "i": # flies -> fly
+                    NN = NN[:-1] + "y"
+        return NN
+
+    def stem_VB(self, VB, type):
+        if type == "" or type == "P" or len(VB) < 4 or VB in self.verb_dict or VB in self.c_verb_dict:
+            return VB
+        elif type == "D" or type == "N":
+            if VB[-1] == "d":
+                VB = VB[:-1]   #  loved -> love
+                if not VB in self.verb_dict and not VB in self.c_verb_dict:
+                    if VB[-1] == "e":
+                        VB = VB[:-1]   # enjoyed -> enjoy
+                    if not VB in self.verb_dict and not VB in self.c_verb_dict:
+                        if VB[-1] == "i":
+                            VB = VB[:-1] + "y" # tried -> try
+                        elif len(VB) > 1 and VB[-1] == VB[-2]:
+                            VB = VB[:-1]   # compelled -> compel
+            return VB
+        elif type == "G":
+            VB = VB[:-3] # obeying -> obey
+            if not VB in self.verb_dict and not VB in self.c_verb_dict:
+                if len(VB) > 1 and VB[-1] == VB[-2]:
+                    VB = VB[:-1] # stopping -> stop
+                else:
+                    VB = VB + "e" # amusing -> amuse
+            return VB
+        elif type == "Z" and len(VB) > 3:
+            if VB[-1] == "s":
+                VB = VB[:-1]  # likes -> like
+                if VB not in self.verb_dict and not VB in self.c_verb_dict and VB[-1] == "e":
+                    VB = VB[:-1]  # watches -> watch
+                    if VB not in self.verb_dict and not VB in self.c_verb_dict and VB[-1] == "i":
+                        VB = VB[:-1] + "y"  # flies -> fly
+            return VB
+
+    def stem_RB_to_JJ(self, RB):
+    ### used to find the adjective that is the stem of an adverb so that the adverb
+    ### can be added automatically to the dictionary
+        JJ = RB
+        if len(JJ) > 3 and JJ[-2:] == "ly":
+            JJ = JJ[:-2]  # sharply -> sharp
+            if not JJ in self.adj_dict:
+                if JJ + "l" in self.adj_dict:
+                    JJ += "l" # full -> fully
+                elif JJ + "le" in self.adj_dict:
+                    JJ += "le" # simply -> simple
+                elif JJ[-1] == "i" and JJ[:-1] + "y" in self.adj_dict:
+                    JJ = JJ[:-1] + "y" # merrily -> merry
+                elif len(JJ) > 5 and JJ[-2:] == "al" and JJ[:-2] in self.adj_dict:
+                    JJ = JJ[:-2] # angelic -> angelically
+        return JJ
+
+    def stem_ative_adj(self, JJ):
+    # this function does stemming for both comparative and superlative adjectives
+    # after the suffix "er" or "est" has been removed
+        if JJ not in self.adj_dict:
+            if JJ + "e" in self.adj_dict:
+                JJ += "e" # abler/ablest -> able
+            elif JJ[:-1] in self.adj_dict:
+                JJ = JJ[:-1] # bigger/biggest -> big
+            elif JJ[-1] == "i" and JJ[:-1] + "y" in self.adj_dict:
+                JJ = JJ[:-1] + "y" # easier/easiest -> easy
+        return JJ
+
+
+    def stem_comp_JJ(self, JJ):
+        if JJ[-2:] == "er":
+            JJ = self.stem_ative_adj(JJ[:-2]) # fairer -> fair
+        return JJ
+
+    def stem_super_JJ(self, JJ):
+        if JJ[-3:] == "est":
+            JJ = self.stem_ative_adj(JJ[:-3]) # fairest -> fair
+        return JJ
+
+    ### Spanish Stemming Fuctions
+
+    def stem_NC(self, NC):
+        if NC not in self.noun_dict and len(NC) > 2 and NC[-1] == "s":   # diplomas -> diploma
+            NC = NC[:-1]
+        if NC not in self.noun_dict and NC not in self.c_noun_dict and len(NC) > 1:
+            if NC[-1] == "a":
+                NC = NC[:-1] + "o" #hermanas -> hermano
+            elif NC[-1] == "e": # actor -> actores
+                NC = NC[:-1]
+        return NC
+
+    def stem_AQ(self, AQ):
+        if AQ not in self.adj_dict and len(AQ) > 2 and AQ[-1] == "s":   # buenos -> bueno
+            AQ = AQ[:-1]
+        if AQ not in self.adj_dict and AQ not in self.c_adj_dict and len(AQ) > 1:
+            if AQ[-1] == "a":    # buena -> bueno
+                AQ = AQ[:-1] +  "o"
+            elif AQ[-1] == "e": #  -> watch
+                AQ = AQ[:-1]
+        return AQ
+
+    def stem_RG_to_AQ(self, RG):
+    ### used to find the adjective that is the stem of an adverb so that the adverb
+    ### can be added automatically to the dictionary
+        AQ = RG
+        if len(AQ) > 6 and AQ[-5:] == "mente" :
+            AQ = AQ[:-5]  # felizmente -> feliz
+            if not AQ in self.adj_dict:
+                if AQ[-1] == "a":
+                    AQ = AQ[:-1] + "o" # nuevamente -> nuevo
+        return AQ
+
+
+    def stem_super_AQ(self, AQ):
+    # this function removes "isima" or "isimo" from the word
+        if AQ not in self.adj_dict:
+            if len(AQ) > 6 and AQ[-5:] in [chr(237) + "sima", chr(237) + "simo", "isima", "isimo"]:
+                AQ = AQ[:-5]
+                if AQ not in self.adj_dict:
+                    if AQ[-2:] == "qu":
+                        AQ = AQ[:-2] + "co"
+                    elif AQ[-2] == "gu":
+                        AQ = AQ[:-1] = "o"
+                    else:
+                        AQ += "o"
+        return AQ
+
+    ### Language general stemming functions ###
+
+    def get_stem(self, stemmer, word, *args):
+    ### returns stemmer(word, *args), from the stem cache if possible. The
+    ### stemmers only depend on the word and the noun, verb and adjective
+    ### dictionaries, so the cache is kept for all the texts, and must be cleared
+    ### with clear_stem_cache() whenever those dictionaries change
+        if self.recorded_dictionaries is not None:
+            return stemmer(word, *args)
+        key = (stemmer.__name__, word) + args
+        if key in self.stem_cache:
+            self.stem_cache_hits += 1
+            return self.stem_cache[key]
+        self.stem_cache_misses += 1
+        stem = stemmer(word, *args)
+        if len(self.stem_cache) >= STEM_CACHE_SIZE:
+            self.stem_cache.clear()
+        self.stem_cache[key] = stem
+        return stem
+
+    def clear_stem_cache(self):
+        self.stem_cache = {} # (stemmer name, word, other arguments) -> stem
+        self.stem_cache_hits = 0
+        self.stem_cache_misses = 0
+
+    def stem_noun(self, noun):
+        if self.language == "English":
+            return self.stem_NN(noun)
+        elif self.language == "Spanish":
+            return self.stem_NC(noun)
+
+    def stem_adv_to_adj(self, adverb):
+        if self.language == "English":
+            return self.stem_RB_to_JJ(adverb)
+        elif self.language == "Spanish":
+            return self.stem_RG_to_AQ(adverb)
+
+    def stem_super_adj(self, adj):
+        if self.language == "English":
+            return self.stem_super_JJ(adj)
+        elif self.language == "Spanish":
+            return self.stem_super_AQ(adj)
+
+
+    def find_intensifier(self, index):
+    ### this function determines whether the given index is the last word (or,
+    ### trivially, the only word) in an intensifier. If so, it returns a list
+    ### containing, as its first element, the length of the intensifier and,
+    ### as its second element, the modifier from the relevant intensifier dictionary
+        if index < 0 or index >= len(self.words) or self.get_token_tag(index) == "MOD": # already modifying something
+            return False
+        if self.lower_words[index] in self.c_int_trie: # might be complex
+            node = self.c_int_trie[self.lower_words[index]]
+            found = node[0]
+            i = index - 1
+            while i > -1 and self.lower_words[i] in node[1]: # walk back along the words
+                node = node[1][self.lower_words[i]]
+                if node[0] is not None and (found is None or node[0][0] < found[0]):
+                    found = node[0] # an earlier definition
+                i -= 1
+            if found is not None:
+                return [found[1], found[2]]
+        if self.lower_words[index] in self.int_dict: # simple intensifier
+            modifier = self.int_dict[self.lower_words[index]]
+            if self.caps[index] and self.use_cap_int: # if capitalized
+                 modifier *= self.capital_modifier   # increase intensification
+            return [1, modifier]
         return False
 
+    def get_multiword_state(self, slots, slot, index):
+    ### the matching state at the start of the given slot, skipping slots that
+    ### have already been matched as many times as required
+        while slot < len(slots) and slots[slot][0] == 0:
+            slot += 1
+        if slot == len(slots):
+            return (slot, 0, index)
+        return (slot, slots[slot][0], index)
+
+    def get_multiword_options(self, state, slots, step):
+    ### lists the ways to continue matching from the given state, in the order
+    ### they are tried: an optional slot is first skipped, then an intensifier
+    ### is tried, then the word at index. Each option is a 3-ple: the next
+    ### state, the number of words it matches and the intensifier value (or None)
+        (slot, count, index) = state
+        (_, slot_words, slot_tags, has_int) = slots[slot]
+        options = []
+        if count == "*" or count == "?": # word optional - try without it
+            options.append((self.get_multiword_state(slots, slot + 1, index), 0, None))
+        if index == len(self.words) or index == -1:
+            return options # reached the end of the text
+        if has_int: # if looking for a intensifiers
+            if step == 1:
+                i = 1
+                while i <= self.max_int_length and index + i < len(self.words) and self.words[index + i] not in self.sent_punct:
+                    intensifier = self.find_intensifier(index + i - 1)
+                    if intensifier and intensifier[0] == i:
+                        options.append((self.get_multiword_state(slots, slot + 1, index + i), i, intensifier[1]))
+                    i += 1
+            else:
+                intensifier = self.find_intensifier(index)
+                if intensifier:
+                    options.append((self.get_multiword_state(slots, slot + 1, index - intensifier[0]), intensifier[0], intensifier[1]))
+        if self.lower_words[index] in slot_words or self.get_token_tag(index) in slot_tags:
+            if count == "*" or count == "+":
+                options.append(((slot, "*", index + step), 1, None))
+            elif count == "?" or count == 1:
+                options.append((self.get_multiword_state(slots, slot + 1, index + step), 1, None))
+            else:
+                options.append(((slot, count - 1, index + step), 1, None))
+        return options
+
+    def match_multiword(self, index, slots, step):
+    ### this function matches the compiled (partial) multi-word dictionary entry
+    ### (slots) with the corresponding part of the text, starting at index and
+    ### going forward (step 1) or backward (step -1). The options of each state
+    ### are tried in order, depth first, with an explicit stack; the result of
+    ### every state is kept so that no state is matched twice
+    ### the function returns a list containing the number of words matched (or -1
+    ### if the match failed) and the value of any intensifier found
+        results = {} # state -> (words matched, intensifier) or None if failed
+        start = self.get_multiword_state(slots, 0, index)
+        stack = [[start, None, 0]] # state, its options, the option being tried
+        while stack:
+            frame = stack[-1]
+            state = frame[0]
+            if frame[1] is None:
+                if state[0] == len(slots):
+                    results[state] = (0, 0) #done
+                    stack.pop()
+                    continue
+                frame[1] = self.get_multiword_options(state, slots, step)
+            options = frame[1]
+            while frame[2] < len(options):
+                (next_state, length, intensifier) = options[frame[2]]
+                if next_state not in results:
+                    break
+                result = results[next_state]
+                if result is not None:
+                    if intensifier is None:
+                        intensifier = result[1]
+                    results[state] = (result[0] + length, intensifier)
+                    break
+                frame[2] += 1
+            if state in results:
+                stack.pop()
+            elif frame[2] == len(options):
+                results[state] = None
+                stack.pop()
+            else:
+                stack.append([options[frame[2]][0], None, 0])
+        if results[start] is None:
+            return [-1, 0]
+        return list(results[start])
+
+
+    def find_multiword(self, index, dict_entry_list):
+    ### this function determines whether the words surrounding the key word at
+    ### index match one of the dictionary definitions in dict_entry_list. If so,
+    ### it returns a list containing the SO value, the number of words in the phrase,
+    ### that are to the left of index, the number of words to the right, and the
+    ### value of any intensifier. Any word specifically designated in the defintion
+    ### will have its tag changed to "MOD" so that it will not be counted twice
+        for dict_entry in dict_entry_list:
+            SO = dict_entry[1]
+            (forward_slots, backward_slots) = dict_entry[2]
+            intensifier = 0
+            if forward_slots:
+                (countforward, int_temp) = self.match_multiword(index + 1, forward_slots, 1)
+                if int_temp != 0:
+                    intensifier = int_temp
+            else:
+                countforward = 0
+            if backward_slots:
+                (countback, int_temp) = self.match_multiword(index - 1, backward_slots, -1)
+                if int_temp != 0:
+                    intensifier = int_temp
+            else:
+                countback = 0
+            if countforward != -1 and countback != -1:
+                for i in range(index - countback, index + countforward + 1):
+                    if self.words[i] in dict_entry[0]:
+                        self.consumed[i] = 1
+                return [SO, countback, countforward, intensifier]
+        return False
 
-def has_sent_irrealis(index):
-### Returns true if there is a irrealis marker in the sentence and no
-### punctuation or boundary word intervenes between the marker and the index
-    if not (use_definite_assertion and words_within_num(index, definites, 1)):
-        while index != -1 and not at_boundary(index):
-            if get_word(text[index]).lower() in irrealis:
+    def words_within_num(self, index, words_tags, num):
+    ### check to see if something in words_tags is within num of index (including
+    ### index), returns true if so
+        while num > 0:
+            if self.words[index] in words_tags or self.get_token_tag(index) in words_tags:
                 return True
-            if language == "Spanish":
-                tag = get_tag(text[index])
-                if len(tag) == 4 and tag[0] == "V" and ((tag[2] == "M" and use_imperative) or (tag[2] == "S" and use_subjunctive) or (tag[3] == "C" and use_conditional)):
-                    return True
+            num -= 1
             index -= 1
-    return False
-
-def get_sent_highlighter(index):
-### If there is a word in the sentence prior to the index but before a boundary
-### marker (including a boundary marker) in the highlighter list, return it
-    while index != -1 and not at_boundary(index):
-        if get_word(text[index]).lower() in highlighters:
-            return get_word(text[index]).lower()
+        return False
+
+
+    def index_boundaries(self):
+    ### builds the boundary index of the current text: the boundary set, the
+    ### sentence number of every token and the span of every sentence, so that
+    ### the lookups below do not have to search the boundary list. The
+    ### boundaries must be in increasing order, as fill_text_and_weights makes them
+        self.boundary_set = set(self.boundaries)
+        self.sentence_numbers = []
+        sentence_no = 0
+        for index in range(len(self.words)):
+            while self.boundaries[sentence_no] < index: # a token at a boundary
+                sentence_no += 1                          # belongs to the sentence before it
+            self.sentence_numbers.append(sentence_no)
+        self.sentence_spans = []
+        sent_start = 0
+        for sent_end in self.boundaries:
+            if sent_end > sent_start: # an empty line repeats the span of the line before it
+                self.sentence_spans.append((sent_start, sent_end))
+                sent_start = sent_end
+            elif self.sentence_spans:
+                self.sentence_spans.append(self.sentence_spans[-1])
+            else:
+                self.sentence_spans.append((sent_start, sent_end))
+
+    def index_clauses(self):
+    ### builds the clause index of the current text, used by the backward and
+    ### forward searches below instead of testing at_boundary() word by word.
+    ### A clause ends at a newline boundary, punctuation or boundary word (as
+    ### decided by at_boundary); the searches never look past the end of the
+    ### clause. Only words are indexed, since the tags are changed while scoring
+        length = len(self.words)
+        self.boundary_flags = []
+        self.clause_starts = []
+        self.last_negators = []
+        self.last_irrealis = []
+        self.last_highlighters = []
+        self.last_sent_puncts = []
+        clause_start = 0
+        last_negator = -1
+        last_irrealis = -1
+        last_highlighter = -1
+        last_sent_punct = -1
+        for index in range(length):
+            word = self.words[index]
+            lower_word = self.lower_words[index]
+            if lower_word in self.negators:
+                last_negator = index
+            if lower_word in self.irrealis:
+                last_irrealis = index
+            if lower_word in self.highlighters:
+                last_highlighter = index
+            if word in self.sent_punct:
+                last_sent_punct = index
+            boundary = self.at_boundary(index)
+            if boundary:
+                clause_start = index + 1
+            self.boundary_flags.append(boundary)
+            self.clause_starts.append(clause_start)
+            self.last_negators.append(last_negator)
+            self.last_irrealis.append(last_irrealis)
+            self.last_highlighters.append(last_highlighter)
+            self.last_sent_puncts.append(last_sent_punct)
+        self.clause_ends = [length - 1] * length
+        self.next_sent_puncts = [-1] * length
+        clause_end = length - 1
+        next_sent_punct = -1
+        for index in range(length - 1, -1, -1):
+            if self.boundary_flags[index]:
+                clause_end = index
+            if self.last_sent_puncts[index] == index:
+                next_sent_punct = index
+            self.clause_ends[index] = clause_end
+            self.next_sent_puncts[index] = next_sent_punct
+
+    def get_sentence(self, index):
+    ### extracts the sentence (a string) that contains the given index, for searching
+        sent_start = index
+        sent_end = index + 1
+        while sent_start > 0 and sent_start not in self.boundary_set:
+            sent_start -= 1
+        while sent_end < len(self.words) and sent_end not in self.boundary_set:
+            sent_end += 1
+        return " ".join(self.words[sent_start : sent_end])
+
+    def get_sentence_no(self, index):
+    ### returns the sentence number, based on the orignal text newlines
+        return self.sentence_numbers[index]
+
+    def get_sent_punct(self, index):
+    ### get the next sentence punctuation (e.g. ?, !, or .) after the given index
+        if self.next_sent_puncts[index] == -1: #if the end of the text is reached
+            return "EOF"
+        return self.words[self.next_sent_puncts[index]]
+
+    def at_boundary(self, index):
+        if index +1 in self.boundary_set:
+            return True
+        elif self.use_boundary_punct and self.words[index] in self.punct:
+            return True
+        elif self.use_boundary_words and self.words[index] in self.boundary_words:
+            return True
         else:
-            index -= 1
-    return False
-
-
-def find_negation(index, word_type):
-### looks backwards for a negator and returns its index if one is found and
-### there is no intervening puctuation or boundary word. If restricted negation
-### is used (for the given word type), the search will only continue if each
-### word or its tag is in the skipped list for its type
-    search = True
-    found = -1
-    while search and not at_boundary(index) and index != -1:
-        current = get_word(text[index]).lower()
-        if current in negators:
-            search = False
-            found = index
-        if restricted_neg[word_type] and current not in skipped[word_type] and get_tag(text[index]) not in skipped[word_type]:
-            search = False
-        index -= 1
-    return found
-
-def is_blocker(SO, index):
-    if index > -1 and index < len(text) and len(text[index]) == 2:
-        (modifier, tag) = text[index]
-        if tag == adv_tag and modifier in adv_dict and abs(adv_dict[modifier]) >= blocker_cutoff:
-            if abs(SO + adv_dict[modifier]) < abs(SO) + abs(adv_dict[modifier]):
-                return True
-        elif tag == adj_tag and modifier in adj_dict and abs(adj_dict[modifier]) >= blocker_cutoff:
-            if abs(SO + adj_dict[modifier]) < abs(SO) + abs(adj_dict[modifier]):
-                return True
-        elif tag[:2] == verb_tag and modifier in verb_dict and abs(verb_dict[modifier]) >= blocker_cutoff:
-            if abs(SO + verb_dict[modifier]) < abs(SO) + abs(verb_dict[modifier]):
+            return False
+
+
+    def has_sent_irrealis(self, index):
+    ### Returns true if there is a irrealis marker in the sentence and no
+    ### punctuation or boundary word intervenes between the marker and the index
+        if index != -1 and not (self.use_definite_assertion and self.words_within_num(index, self.definites, 1)):
+            if self.last_irrealis[index] >= self.clause_starts[index]:
                 return True
+            if self.language == "Spanish":
+                for i in range(index, self.clause_starts[index] - 1, -1):
+                    tag = self.get_token_tag(i)
+                    if len(tag) == 4 and tag[0] == "V" and ((tag[2] == "M" and self.use_imperative) or (tag[2] == "S" and self.use_subjunctive) or (tag[3] == "C" and self.use_conditional)):
+                        return True
+        return False
+
+    def get_sent_highlighter(self, index):
+    ### If there is a word in the sentence prior to the index but before a boundary
+    ### marker (including a boundary marker) in the highlighter list, return it
+        if index != -1 and self.last_highlighters[index] >= self.clause_starts[index]:
+            return self.lower_words[self.last_highlighters[index]]
+        return False
+
+
+    def find_negation(self, index, word_type):
+    ### looks backwards for a negator and returns its index if one is found and
+    ### there is no intervening puctuation or boundary word. If restricted negation
+    ### is used (for the given word type), the search will only continue if each
+    ### word or its tag is in the skipped list for its type
+        if index == -1 or self.last_negators[index] < self.clause_starts[index]:
+            return -1
+        found = self.last_negators[index]
+        if self.restricted_neg[word_type]:
+            for i in range(index, found, -1):
+                current = self.lower_words[i]
+                if current not in self.skipped[word_type] and self.get_token_tag(i) not in self.skipped[word_type]:
+                    return -1
+        return found
+
+    def get_blocker_value(self, SO, index):
+    ### the strength (absolute SO) of the word at index as a blocker of a word
+    ### having the given SO value, or None if it cannot block it (it is not an
+    ### adverb, adjective or verb of the opposite orientation)
+        if index > -1 and index < len(self.words) and self.simple[index]:
+            modifier = self.words[index]
+            tag = self.get_token_tag(index)
+            if tag == self.adv_tag and modifier in self.adv_dict:
+                modifier_SO = self.adv_dict[modifier]
+            elif tag == self.adj_tag and modifier in self.adj_dict:
+                modifier_SO = self.adj_dict[modifier]
+            elif tag[:2] == self.verb_tag and modifier in self.verb_dict:
+                modifier_SO = self.verb_dict[modifier]
+            else:
+                return None
+            if abs(SO + modifier_SO) < abs(SO) + abs(modifier_SO):
+                return abs(modifier_SO)
+        return None
+
+    def is_blocker(self, SO, index):
+        blocker_value = self.get_blocker_value(SO, index)
+        return blocker_value is not None and blocker_value >= self.blocker_cutoff
+
+
+    def find_blocker(self, SO, index, POS):
+    ### this function tests if the item at index is of the correct type, orientation
+    ### and strength (as determined by blocker_cutoff) to nullify a word having the
+    ### given SO value
+        for i in range(index, max(self.clause_starts[index], 1) - 1, -1):
+            if self.simple[i-1]:
+                modifier = self.words[i-1]
+                tag = self.get_token_tag(i-1)
+                if self.is_blocker(SO, i-1):
+                    return True
+                if not modifier in self.skipped[POS] and not tag[:2] in self.skipped[POS]:
+                    break
+        return False
 
 
-def find_blocker(SO, index, POS):
-### this function tests if the item at index is of the correct type, orientation
-### and strength (as determined by blocker_cutoff) to nullify a word having the
-### given SO value
-    stop = False
-    while index > 0 and not stop and not at_boundary(index):
-        if len (text[index-1]) == 2:
-            (modifier, tag) = text[index-1]
-            if is_blocker(SO, index-1):
+    def get_blocker_strength(self, SO, index, POS):
+    ### the strength of the strongest blocker that find_blocker looks at, that
+    ### is, the lowest blocker_cutoff at which the word would be blocked
+    ### (-infinity if there is no blocker)
+        strength = float("-inf")
+        for i in range(index, max(self.clause_starts[index], 1) - 1, -1):
+            if self.simple[i-1]:
+                modifier = self.words[i-1]
+                tag = self.get_token_tag(i-1)
+                blocker_value = self.get_blocker_value(SO, i-1)
+                if blocker_value is not None:
+                    strength = max(strength, blocker_value)
+                if not modifier in self.skipped[POS] and not tag[:2] in self.skipped[POS]:
+                    break
+        return strength
+
+    def find_VP_boundary(self, index):
+    ### forward search for the index immediately preceding punctuation or a boundary
+    ### word or punctuation. Used to find intensifiers remote from the verb
+        if index < len(self.words) - 1:
+            return self.clause_ends[index]
+        return index
+
+    def is_in_predicate(self, index):
+    ### backwards search for a verb of any kind. Used to determine if a comparative
+    ### or superlative adjective is in the predicate
+        for i in range(index - 1, max(self.clause_starts[index], 1) - 2, -1):
+            tag = self.get_token_tag(i)
+            if (self.language == "English" and tag[:2] == "VB" or tag in ["AUX", "AUXG"]) or (self.language == "Spanish" and tag[0] == "V"):
                 return True
-            if not modifier in skipped[POS] and not tag[:2] in skipped[POS]:
-                stop = True
-        index -= 1
-    return False
-
-
-def find_VP_boundary (index):
-### forward search for the index immediately preceding punctuation or a boundary
-### word or punctuation. Used to find intensifiers remote from the verb
-    while not at_boundary(index) and index < len(text) - 1:
-        index += 1
-    return index
-
-def is_in_predicate (index):
-### backwards search for a verb of any kind. Used to determine if a comparative
-### or superlative adjective is in the predicate
-    while not at_boundary(index) and index > 0:
-        index -= 1
-        tag = get_tag(text[index])
-        if (language == "English" and tag[:2] == "VB" or tag in ["AUX", "AUXG"]) or (language == "Spanish" and tag[0] == "V"):
-            return True
-    return False
+        return False
 
-def is_in_imperative (index):
-### Tries to determine if the word at index is in an imperative based on whether
-### first word in the clause is a VBP (and not a question or within the
-### scope of a definite determiner)
-    if get_sent_punct(index) != "?" and not (words_within_num(index, definites, 1)):
-        i = index
-        while i > -1 and get_word(text[i]) not in sent_punct:
-            if at_boundary(index):
-                return False
-            i -=1
-        (word, tag) = text[i+1]
-        if (tag == "VBP" or tag == "VB") and word.lower() not in ["were", "was", "am"]:
-            return True
-    return False
-
-def is_in_quotes (index):
-### check to see if a particular word is contained within quotation marks.
-### looks to a sentence boundary on the left, and one past the sentence
-### boundary on the right; an item in quotes should have an odd number of
-### quotation marks in the sentence on either sides
-    quotes_left = 0
-    quotes_right = 0
-    found = False
-    current = ""
-    i = index
-    while current not in sent_punct and i > -1:
-        current = get_word(text[i])
-        if current == '"' or current == "'":
-            quotes_left += 1
-        i -= 1
-    if operator.mod(quotes_left,2) == 1:
+    def is_in_imperative(self, index):
+    ### Tries to determine if the word at index is in an imperative based on whether
+    ### first word in the clause is a VBP (and not a question or within the
+    ### scope of a definite determiner). An index of -1 (before the first word
+    ### of the text) checks the first word directly
+        if index == -1:
+            if self.words[-1] in self.sent_punct:
+                sent_punct = self.words[-1]
+            else:
+                sent_punct = self.get_sent_punct(0)
+        else:
+            sent_punct = self.get_sent_punct(index)
+        if sent_punct != "?" and not (self.words_within_num(index, self.definites, 1)):
+            if index == -1:
+                i = -1
+            else:
+                i = self.last_sent_puncts[index] # the start of the sentence
+                if i != index and self.boundary_flags[index]:
+                    return False
+            tag = self.get_token_tag(i+1)
+            if (tag == "VBP" or tag == "VB") and self.lower_words[i+1] not in ["were", "was", "am"]:
+                return True
+        return False
+
+    def is_in_quotes(self, index):
+    ### check to see if a particular word is contained within quotation marks.
+    ### looks to a sentence boundary on the left, and one past the sentence
+    ### boundary on the right; an item in quotes should have an odd number of
+    ### quotation marks in the sentence on either sides
+        quotes_left = 0
+        quotes_right = 0
+        found = False
         current = ""
         i = index
-        while not found and current not in sent_punct and i < len(text):
-            current = get_word(text[i])
+        while current not in self.sent_punct and i > -1:
+            current = self.words[i]
             if current == '"' or current == "'":
+                quotes_left += 1
+            i -= 1
+        if operator.mod(quotes_left,2) == 1:
+            current = ""
+            i = index
+            while not found and current not in self.sent_punct and i < len(self.words):
+                current = self.words[i]
+                if current == '"' or current == "'":
+                    quotes_right += 1
+                i += 1
+            if  (quotes_left - quotes_right == 1) and i < len(self.words) - 1 and self.words[i+1] == '"':
                 quotes_right += 1
-            i += 1
-        if  (quotes_left - quotes_right == 1) and i < len(text) - 1 and get_word(text[i+1]) == '"':
-            quotes_right += 1
-        if operator.mod(quotes_right,2) == 1:
-            found = True
-    return found
-
-
-
-def apply_other_modifiers (SO, index, leftedge):
-### several modifiers that apply equally to all parts of speech based on
-### their context. Words in all caps, in a sentences ending with an
-### exclamation mark, or with some other highlighter are intensified,
-### while words appearing in a question or quotes or with some other
-### irrealis marker are nullified
-        output = []
-        if  use_cap_int and get_word(text[index]).isupper():
-            output.append("X " + str(capital_modifier) +  " (CAPITALIZED)")
-            SO *= capital_modifier
-        if  use_exclam_int and get_sent_punct(index) == "!":
-            output.append("X " + str(exclam_modifier) + " (EXCLAMATION)")
-            SO *= exclam_modifier
-        if  use_highlighters:
-            highlighter = get_sent_highlighter(leftedge)
+            if operator.mod(quotes_right,2) == 1:
+                found = True
+        return found
+
+
+    def get_other_modifiers(self, index, leftedge):
+    ### the (name, operator, value) modifiers that apply_other_modifiers applies
+    ### to the word at index, in order. The nullifying ones (in
+    ### NULLIFYING_MODIFIERS) set the SO to 0, the others multiply it
+        modifiers = []
+        if  self.use_cap_int and self.caps[index]:
+            modifiers.append(("CAPITALIZED", "X", self.capital_modifier))
+        if  self.use_exclam_int and self.get_sent_punct(index) == "!":
+            modifiers.append(("EXCLAMATION", "X", self.exclam_modifier))
+        if  self.use_highlighters:
+            highlighter = self.get_sent_highlighter(leftedge)
             if highlighter:
-                output.append("X " + str(highlighters[highlighter]) + " (HIGHLIGHTED)")
-                SO *= highlighters[highlighter]
-        if use_quest_mod and get_sent_punct(index) == "?" and not (use_definite_assertion and words_within_num(leftedge, definites, 1)):
-            output.append("X 0 (QUESTION)")
-            SO = 0
-        if language == "English" and use_imperative and is_in_imperative(leftedge):
-            output.append("X 0 (IMPERATIVE)")
-            SO = 0
-        if use_quote_mod and is_in_quotes(index):
-            output.append("X 0 (QUOTES)")
-            SO = 0
-        if  use_irrealis and has_sent_irrealis(leftedge):
-            output.append ("X 0 (IRREALIS)")
-            SO = 0
-        return [SO, output]
-
-def fix_all_caps_English():
-### tagger tags most all uppercase words as NNP, this function tries to see if
-### they belong in another dictionary (if so, it changes the tag)
-    for i in range(0, len(text)):
-        if len(text[i]) == 2:
-            (word, tag) = text[i]
-            if len(word) > 2 and word.isupper() and tag == "NNP":
-                word = word.lower()
-                if word in adj_dict or word in c_adj_dict:
-                    text[i][1] = "JJ"
-                elif word in adv_dict or word in c_adv_dict:
-                    text[i][1] == "RB"
-
-                else:
-                    ex_tag = "" # verbs need to be stemmed
-                    if word[-1] == "s":
-                        word = stem_VB(word, "Z")
-                        ex_tag = "Z"
-                    elif word[-3:] == "ing":
-                        word = stem_VB(word, "G")
-                        ex_tag = "G"
-                    elif word[-2:] == "ed":
-                        word = stem_VB(word, "D")
-                        ex_tag = "D"
-                    if word in verb_dict or word in c_verb_dict:
-                        text[i][1] = "VB" + ex_tag
-
-def fix_all_caps_Spanish():
-### tagger tags most all uppercase words as NP, this function tries to see if
-### they belong in another dictionary (if so, it changes the tag)
-    for i in range(0, len(text)):
-        if len(text[i]) == 2:
-            (word, tag) = text[i]
-            if len(word) > 2 and word.isupper() and tag == "NP":
-                word = word.lower()
-                alt_word = stem_AQ(word)
-                if alt_word in adj_dict or word in c_adj_dict:
-                    text[i][1] = "AQ"
+                modifiers.append(("HIGHLIGHTED", "X", self.highlighters[highlighter]))
+        if self.use_quest_mod and self.get_sent_punct(index) == "?" and not (self.use_definite_assertion and self.words_within_num(leftedge, self.definites, 1)):
+            modifiers.append(("QUESTION", "X", 0))
+        if self.language == "English" and self.use_imperative and self.is_in_imperative(leftedge):
+            modifiers.append(("IMPERATIVE", "X", 0))
+        if self.use_quote_mod and self.is_in_quotes(index):
+            modifiers.append(("QUOTES", "X", 0))
+        if  self.use_irrealis and self.has_sent_irrealis(leftedge):
+            modifiers.append(("IRREALIS", "X", 0))
+        return modifiers
+
+    def apply_other_modifiers(self, SO, index, leftedge):
+    ### several modifiers that apply equally to all parts of speech based on
+    ### their context. Words in all caps, in a sentences ending with an
+    ### exclamation mark, or with some other highlighter are intensified,
+    ### while words appearing in a question or quotes or with some other
+    ### irrealis marker are nullified
+            modifiers = self.get_other_modifiers(index, leftedge)
+            for (name, operator, value) in modifiers:
+                if name in NULLIFYING_MODIFIERS:
+                    SO = 0
                 else:
-                    alt_word = stem_adv_to_adj(word)
-                    if alt_word in adj_dict:
-                        text[i][1] == "RG"
-
-def fix_all_caps():
-    if language == "English":
-        fix_all_caps_English()
-    elif language == "Spanish":
-        fix_all_caps_Spanish()
-
-
-def apply_weights (word_SO, index):
-### this is the last step in the calculation, external weights and negation
-### weights are applied
-    if use_heavy_negation and word_SO < 0: # weighing of negative SO
-        word_SO *= neg_multiplier          # items
-        if output_calculations:
-            richout.write(" X " + str(neg_multiplier) + " (NEGATIVE)")
-    word_SO *= weights[index] # apply weights
-    if weights[index] != 1:
-        if output_calculations:
-            richout.write (" X " + str(weights[index]) + " (WEIGHTED)")
-    if output_calculations:
-        richout.write (" = " + str(word_SO) + "\n")
-    return word_SO
-
-def apply_weights_adv (word_SO, index, output):
-### this is the last step in the calculation, external weights and negation
-### weights are applied
-    if use_heavy_negation and word_SO < 0: # weighing of negative SO
-        word_SO *= neg_multiplier          # items
-        if output_calculations:
-            output += " X " + str(neg_multiplier) + " (NEGATIVE)"
-    word_SO *= weights[index] # apply weights
-    if weights[index] != 1:
-        if output_calculations:
-            output += " X " + str(weights[index]) + " (WEIGHTED)"
-    if output_calculations:
-        output += (" = " + str(word_SO) + "\n")
-    return [word_SO, output]
-
-
-### SO calculators by part of speech
-### All of these sub-calculators do more or less the same thing:
-### Stem the word (if necessary)
-### look for intensifiers
-### look for negation
-### look for negation external intensifiers (e.g. I really didn't like it)
-### apply intensification and negation, if necessary
-### apply other types of modifiers, including those relevant to capitalization,
-### punctuation, blocking, repitition, etc.
-### print the output
-###
-### differences that are particular to certain parts of speech are noted below
-
-def get_noun_SO(index):
-    NN = get_word(text[index])
-    original_NN = NN
-    if NN.isupper():
-        NN = NN.lower() # if all upper case, change to lower case
-    if get_word(text[index - 1]) in sent_punct:
-        NN = NN.lower() # change the word to lower case if sentence initial
-    ntype = get_tag(text[index])[2:]
-    NN = stem_noun(NN)
-    if NN in c_noun_dict:
-        multiword_result = find_multiword(index, c_noun_dict[NN])
-    else:
-        multiword_result = False
-    if NN not in noun_dict and not multiword_result:
-        return 0
-    else:
-        if multiword_result:
-            (noun_SO, backcount, forwardcount, int_modifier) = multiword_result
-            output = list(map(get_word, text[index - backcount:index + forwardcount + 1]))
-            i = index - backcount - 1
-        else:
-            int_modifier = 0
-            output = [original_NN]
-            noun_SO = noun_dict[NN]
-            i = index - 1
-        if use_intensifiers:
-            if language == "Spanish": # look for post-nominal adj
-                intensifier = find_intensifier(index +1) # look for post-nominal adj
-                if intensifier:
-                    int_modifier += intensifier[1]
-                    text[index + 1][1] = "MOD"
-                    output += [get_word(text[index+1])]
-            intensifier = find_intensifier(i)
-            if intensifier:
-                int_modifier = intensifier[1]
-                for j in range (0, intensifier[0]):
-                    text[i][1] = "MOD" # block modifier being used twice
-                    i -= 1
-                output = list(map(get_word, text[i + 1:i + intensifier[0] + 1])) + output
-        negation = find_negation(i, noun_tag)
-        if negation != -1:
-            output = list(map(get_word, text[negation:i+1])) + output
-            if use_intensifiers:
-                int_modifier_negex = 0
-                i = negation - 1
-                if language == "English":
-                    while text[i][0] in skipped[adj_tag]:
-                        i -= 1
-                intensifier = find_intensifier(i)
-                if intensifier:
-                    int_modifier_negex = intensifier[1]
-                    for j in range (0, intensifier[0]):
-                        text[i][1] = "MOD" # block modifier being used twice
-                        i -= 1
-                    output = list(map(get_word, text[i + 1:i + intensifier[0] + 1])) + output
-        output.append(str(noun_SO))
-        if int_modifier != 0:
-            noun_SO = noun_SO *(1+int_modifier)
-            output.append("X " + str(1 + int_modifier) + " (INTENSIFIED)")
-        elif use_blocking and find_blocker(noun_SO, index, noun_tag):
-            output.append("X 0 (BLOCKED)")
-            noun_SO = 0
-        if use_negation and negation != -1:
-            if neg_negation_nullification and noun_SO < 0:
-                neg_shift = abs(noun_SO)
-            elif polarity_switch_neg or (limit_shift and abs(noun_SO) * 2 < noun_neg_shift):
-                neg_shift = abs(noun_SO) * 2
+                    SO *= value
+            return [SO, modifiers]
+
+    def fix_caps_English(self, i):
+    ### tagger tags most all uppercase words as NNP, this function tries to see if
+    ### they belong in another dictionary (if so, it changes the tag)
+        word = self.words[i]
+        if len(word) > 2 and self.caps[i] and self.get_token_tag(i) == "NNP":
+            word = word.lower()
+            if word in self.adj_dict or word in self.c_adj_dict:
+                self.set_token_tag(i, "JJ")
+            elif word in self.adv_dict or word in self.c_adv_dict:
+                self.get_token_tag(i) == "RB"
+
             else:
-                neg_shift = noun_neg_shift
-            if noun_SO > 0:
-                noun_SO -= neg_shift
-                output.append ("- "+ str(neg_shift))
-            elif noun_SO < 0:
-                noun_SO += neg_shift
-                output.append ("+ "+ str(neg_shift))
-            output.append("(NEGATED)")
-            if use_intensifiers and int_modifier_negex != 0:
-                noun_SO *=(1+int_modifier_negex)
-                output.append("X " + str(1 + int_modifier_negex) + " (INTENSIFIED)")
-        (noun_SO, new_out) = apply_other_modifiers(noun_SO, index, i)
-        output += new_out
-        if noun_SO != 0:
-            if int_modifier != 0 and int_multiplier != 1:
-                noun_SO *= int_multiplier
-                output.append("X " + str(int_multiplier) + " (INT_WEIGHT)")
-            if NN not in word_counts[0]:
-                word_counts[0][NN] = 1
+                ex_tag = "" # verbs need to be stemmed
+                if word[-1] == "s":
+                    word = self.get_stem(self.stem_VB, word, "Z")
+                    ex_tag = "Z"
+                elif word[-3:] == "ing":
+                    word = self.get_stem(self.stem_VB, word, "G")
+                    ex_tag = "G"
+                elif word[-2:] == "ed":
+                    word = self.get_stem(self.stem_VB, word, "D")
+                    ex_tag = "D"
+                if word in self.verb_dict or word in self.c_verb_dict:
+                    self.set_token_tag(i, "VB" + ex_tag)
+
+    def fix_caps_Spanish(self, i):
+    ### tagger tags most all uppercase words as NP, this function tries to see if
+    ### they belong in another dictionary (if so, it changes the tag)
+        word = self.words[i]
+        if len(word) > 2 and self.caps[i] and self.get_token_tag(i) == "NP":
+            word = word.lower()
+            alt_word = self.get_stem(self.stem_AQ, word)
+            if alt_word in self.adj_dict or word in self.c_adj_dict:
+                self.set_token_tag(i, "AQ")
             else:
-                word_counts[0][NN] += 1
-                if negation == -1:
-                    if use_word_counts_lower:
-                        noun_SO /= word_counts[0][NN]
-                        output.append("X 1/" + str(word_counts[0][NN]) + " (REPEATED)")
-                    if use_word_counts_block:
-                        noun_SO = 0
-                        output.append("X 0 (REPEATED)")
-        if noun_multiplier != 1:
-            noun_SO *= noun_multiplier
-            output.append("X " + str(noun_multiplier) + " (NOUN)")
-        if output_calculations:
-            for word in output:
-                richout.write(word + " ")
-        if output_calculations and noun_SO == 0:
-            richout.write("= 0\n")
-        return noun_SO
-
-def get_verb_SO(index):
-### Verbs are special because their adverbal modifiers are not necessarily
-### adjecent to the verb; a special search is done for clause
-### final modifiers
-    VB = get_word(text[index])
-    original_VB = VB
-    if VB.isupper():
-        VB = VB.lower()   # if all upper case, change to lower case
-    if get_word(text[index - 1]) in sent_punct:
-        VB = VB.lower()  # change the word to lower case if sentence initial
-    if language == "English":
-        vtype = get_tag(text[index])[2:]
-        VB = stem_VB(VB, vtype)
-    if VB in c_verb_dict:
-        multiword_result = find_multiword(index, c_verb_dict[VB])
-    else:
-        multiword_result = False
-    if VB in not_wanted_verb:
-        return 0
-    elif VB not in verb_dict and not multiword_result:
-        return 0
-    else:
-        if multiword_result:
-            (verb_SO, backcount, forwardcount, int_modifier) = multiword_result
-            output = list(map(get_word, text[index - backcount:index + forwardcount + 1]))
-            i = index - backcount - 1
+                alt_word = self.get_stem(self.stem_adv_to_adj, word)
+                if alt_word in self.adj_dict:
+                    self.get_token_tag(i) == "RG"
+
+    def fix_caps(self, i):
+        if self.language == "English":
+            self.fix_caps_English(i)
+        elif self.language == "Spanish":
+            self.fix_caps_Spanish(i)
+
+    def fix_all_caps(self):
+        for i in range(0, len(self.words)):
+            if self.simple[i]:
+                self.fix_caps(i)
+
+    def find_candidates(self):
+    ### a single pass over the text that fixes the tags of words in all caps (if
+    ### fix_cap_tags is used) and lists the positions of the nouns, verbs,
+    ### adjectives and adverbs, in the order of word_counts. Candidates can still
+    ### be used as modifiers by the earlier parts of speech, so each part of
+    ### speech must check that the candidate has not been consumed
+        candidates = [[], [], [], []]
+        pos_tags = {self.noun_tag: candidates[0], self.verb_tag: candidates[1], self.adj_tag: candidates[2], self.adv_tag: candidates[3]}
+        for index in range(0, len(self.words)):
+            if self.simple[index]:
+                if self.fix_cap_tags:
+                    self.fix_caps(index)
+                tag = self.get_token_tag(index)[:2]
+                if tag in pos_tags:
+                    pos_tags[tag].append(index)
+        return candidates
+
+
+    def apply_weights(self, word_SO, index):
+    ### this is the last step in the calculation, external weights and negation
+    ### weights are applied
+        if self.use_heavy_negation and word_SO < 0: # weighing of negative SO
+            word_SO *= self.neg_multiplier          # items
+            if self.output_calculations:
+                self.contribution.weight_modifiers.append(("NEGATIVE", "X", self.neg_multiplier))
+        word_SO *= self.weights[index] # apply weights
+        if self.weights[index] != 1:
+            if self.output_calculations:
+                self.contribution.weight_modifiers.append(("WEIGHTED", "X", self.weights[index]))
+        if self.output_calculations:
+            self.contribution.final_SO = word_SO
+        return word_SO
+
+
+    ### SO calculators by part of speech
+    ### All of these sub-calculators do more or less the same thing:
+    ### Stem the word (if necessary)
+    ### look for intensifiers
+    ### look for negation
+    ### look for negation external intensifiers (e.g. I really didn't like it)
+    ### apply intensification and negation, if necessary
+    ### apply other types of modifiers, including those relevant to capitalization,
+    ### punctuation, blocking, repitition, etc.
+    ### print the output
+    ###
+    ### differences that are particular to certain parts of speech are noted below
+
+    def get_noun_SO(self, index):
+        NN = self.words[index]
+        if self.caps[index]:
+            NN = self.lower_words[index] # if all upper case, change to lower case
+        if self.words[index - 1] in self.sent_punct:
+            NN = self.lower_words[index] # change the word to lower case if sentence initial
+        ntype = self.get_token_tag(index)[2:]
+        NN = self.get_stem(self.stem_noun, NN)
+        if NN in self.c_noun_dict:
+            multiword_result = self.find_multiword(index, self.c_noun_dict[NN])
         else:
-            int_modifier = 0
-            output = [original_VB]
-            verb_SO = verb_dict[VB]
-            i = index - 1
-        if use_intensifiers:
-            intensifier = find_intensifier(i)
-            if intensifier:
-                int_modifier += intensifier[1]
-                for j in range (0, intensifier[0]):
-                    text[i][1] = "MOD" # block modifier being used twice
-                    i -= 1
-                output = list(map(get_word, text[i + 1:i + intensifier[0] + 1])) + output
-            if use_clause_final_int: # look for clause-final modifier
-                edge = find_VP_boundary(index)
-                intensifier = find_intensifier(edge - 1)
+            multiword_result = False
+        if NN not in self.noun_dict and not multiword_result:
+            return 0
+        else:
+            if multiword_result:
+                (noun_SO, backcount, forwardcount, int_modifier) = multiword_result
+                if self.output_calculations:
+                    contribution = SOContribution(index - backcount, index + forwardcount + 1)
+                i = index - backcount - 1
+            else:
+                int_modifier = 0
+                if self.output_calculations:
+                    contribution = SOContribution(index, index + 1)
+                noun_SO = self.noun_dict[NN]
+                i = index - 1
+            if self.use_intensifiers:
+                if self.language == "Spanish": # look for post-nominal adj
+                    intensifier = self.find_intensifier(index +1) # look for post-nominal adj
+                    if intensifier:
+                        int_modifier += intensifier[1]
+                        self.consumed[index + 1] = 1
+                        if self.output_calculations:
+                            contribution.spans.append((index + 1, index + 2))
+                intensifier = self.find_intensifier(i)
                 if intensifier:
                     int_modifier = intensifier[1]
                     for j in range (0, intensifier[0]):
-                        text[edge - 1 - j][1] = "MOD"
-                    output = output + list(map(get_word, text[index + 1: edge]))
-        negation = find_negation(i, verb_tag)
-        if negation != -1:
-            output = list(map(get_word, text[negation:i+1])) + output
-            if use_intensifiers:
-                int_modifier_negex = 0
-                i = negation - 1
-                if language == "English":
-                    while text[i][0] in skipped["JJ"]:
-                        i -= 1
-                intensifier = find_intensifier(i)
-                if intensifier:
-                    int_modifier_negex = intensifier[1]
-                    for j in range (0, intensifier[0]):
-                        text[i][1] = "MOD" # block modifier being used twice
+                        self.consumed[i] = 1 # block modifier being used twice
                         i -= 1
-                    output = list(map(get_word, text[i + 1:i + intensifier[0] + 1])) + output
-        output.append(str(verb_SO))
-        if int_modifier != 0:
-            verb_SO = verb_SO *(1+int_modifier)
-            output.append("X " + str(1 + int_modifier) + " (INTENSIFIED)")
-        elif use_blocking and find_blocker(verb_SO, index, verb_tag):
-            output.append("X 0 (BLOCKED)")
-            verb_SO = 0
-        if use_negation and negation != -1:
-            if neg_negation_nullification and verb_SO < 0:
-                neg_shift = abs(verb_SO)
-            elif polarity_switch_neg or (limit_shift and abs(verb_SO) * 2 < verb_neg_shift):
-                neg_shift = abs(verb_SO) * 2
-            else:
-                neg_shift = verb_neg_shift
-            if verb_SO > 0:
-                verb_SO -= neg_shift
-                output.append ("- "+ str(neg_shift))
-            elif verb_SO < 0:
-                verb_SO += neg_shift
-                output.append("+ " + str(neg_shift))
-            output.append("(NEGATED)")
-            if use_intensifiers and int_modifier_negex != 0:
-                verb_SO *=(1+int_modifier_negex)
-                output.append("X " + str(1 + int_modifier_negex) + " (INTENSIFIED)")
-        (verb_SO, new_out) = apply_other_modifiers(verb_SO, index, i)
-        output += new_out
-        if verb_SO != 0:
-            if int_modifier != 0 and int_multiplier != 1:
-                verb_SO *= int_multiplier
-                output.append("X " + str(int_multiplier) + " (INT_WEIGHT)")
-            if VB not in word_counts[1]:
-                word_counts[1][VB] = 1
-            else:
-                word_counts[1][VB] += 1
-                if negation == -1:
-                    if use_word_counts_lower:
-                        verb_SO /= word_counts[1][VB]
-                        output.append("X 1/" + str(word_counts[1][VB]) + " (REPEATED)")
-                    if use_word_counts_block:
-                        verb_SO = 0
-                        output.append("X 0 (REPEATED)")
-        if verb_multiplier != 1:
-            verb_SO *= verb_multiplier
-            output.append("X " + str(verb_multiplier) + " (VERB)")
-        if output_calculations:
-            for word in output:
-                richout.write(word + " ")
-        if output_calculations and verb_SO == 0:
-            richout.write("= 0\n") # calculation is over
-        return verb_SO
-
-def get_adj_SO(index):
-### Comparative and superlative adjectives require special stemming, and are
-### treated as if they have been intensified with "more" or "most". Non-
-### predicative uses of this kind of adjective are often not intended to
-### express sentiment, and are therefore ignored. Adjectives often have
-### more than one intensifier (e.g. really very good) so the search for
-### intensifiers is iterative.
-    JJ = get_word(text[index])
-    original_JJ = JJ
-    int_modifier = 0
-    if JJ.isupper():
-        JJ = JJ.lower()      # if all upper case, change to lower case
-    if get_word(text[index - 1]) in sent_punct:
-        JJ = JJ.lower()    # change the word to lower case if sentence initial
-    if language == "English":
-        adjtype = get_tag(text[index])[2:]
-        if not use_comparatives and (adjtype == "R" or get_word(text[index -1]) in comparatives):
-            return 0
-        if not use_superlatives and (adjtype == "S" or get_word(text[index-1]) in superlatives or JJ in ["best","worst"]):
-            return 0
-        if adjtype == "R" and JJ not in adj_dict and JJ not in not_wanted_adj:
-            JJ = stem_comp_JJ(JJ)
-            if use_intensifiers:
-                int_modifier += int_dict["more"]
-        elif adjtype == "S" and JJ not in adj_dict and JJ not in not_wanted_adj:
-            JJ = stem_super_adj(JJ)
-            if use_intensifiers:
-                int_modifier += 1
-    elif language == "Spanish":
-        JJ = stem_AQ(JJ)
-        if not use_comparatives and (get_word(text[index -1]) in comparatives):
+                    if self.output_calculations:
+                        contribution.spans.insert(0, (i + 1, i + intensifier[0] + 1))
+            negation = self.find_negation(i, self.noun_tag)
+            if negation != -1:
+                if self.output_calculations:
+                    contribution.spans.insert(0, (negation, i+1))
+                if self.use_intensifiers:
+                    int_modifier_negex = 0
+                    i = negation - 1
+                    if self.language == "English":
+                        while self.words[i] in self.skipped[self.adj_tag]:
+                            i -= 1
+                    intensifier = self.find_intensifier(i)
+                    if intensifier:
+                        int_modifier_negex = intensifier[1]
+                        for j in range (0, intensifier[0]):
+                            self.consumed[i] = 1 # block modifier being used twice
+                            i -= 1
+                        if self.output_calculations:
+                            contribution.spans.insert(0, (i + 1, i + intensifier[0] + 1))
+            if self.features is not None:
+                self.add_feature(0, NN, index, i, noun_SO, int_modifier, negation, int_modifier_negex if negation != -1 and self.use_intensifiers else 0)
+            if self.output_calculations:
+                contribution.SO = noun_SO
+            if int_modifier != 0:
+                noun_SO = noun_SO *(1+int_modifier)
+                if self.output_calculations:
+                    contribution.modifiers.append(("INTENSIFIED", "X", 1 + int_modifier))
+            elif self.use_blocking and self.find_blocker(noun_SO, index, self.noun_tag):
+                if self.output_calculations:
+                    contribution.modifiers.append(("BLOCKED", "X", 0))
+                noun_SO = 0
+            if self.use_negation and negation != -1:
+                if self.neg_negation_nullification and noun_SO < 0:
+                    neg_shift = abs(noun_SO)
+                elif self.polarity_switch_neg or (self.limit_shift and abs(noun_SO) * 2 < self.noun_neg_shift):
+                    neg_shift = abs(noun_SO) * 2
+                else:
+                    neg_shift = self.noun_neg_shift
+                if noun_SO > 0:
+                    noun_SO -= neg_shift
+                    if self.output_calculations:
+                        contribution.modifiers.append(("NEGATED", "-", neg_shift))
+                elif noun_SO < 0:
+                    noun_SO += neg_shift
+                    if self.output_calculations:
+                        contribution.modifiers.append(("NEGATED", "+", neg_shift))
+                elif self.output_calculations:
+                    contribution.modifiers.append(("NEGATED", "", 0))
+                if self.use_intensifiers and int_modifier_negex != 0:
+                    noun_SO *=(1+int_modifier_negex)
+                    if self.output_calculations:
+                        contribution.modifiers.append(("INTENSIFIED", "X", 1 + int_modifier_negex))
+            (noun_SO, new_out) = self.apply_other_modifiers(noun_SO, index, i)
+            if self.output_calculations:
+                contribution.modifiers += new_out
+            if noun_SO != 0:
+                if int_modifier != 0 and self.int_multiplier != 1:
+                    noun_SO *= self.int_multiplier
+                    if self.output_calculations:
+                        contribution.modifiers.append(("INT_WEIGHT", "X", self.int_multiplier))
+                if NN not in self.word_counts[0]:
+                    self.word_counts[0][NN] = 1
+                else:
+                    self.word_counts[0][NN] += 1
+                    if negation == -1:
+                        if self.use_word_counts_lower:
+                            noun_SO /= self.word_counts[0][NN]
+                            if self.output_calculations:
+                                contribution.modifiers.append(("REPEATED", "/", self.word_counts[0][NN]))
+                        if self.use_word_counts_block:
+                            noun_SO = 0
+                            if self.output_calculations:
+                                contribution.modifiers.append(("REPEATED", "X", 0))
+            if self.noun_multiplier != 1:
+                noun_SO *= self.noun_multiplier
+                if self.output_calculations:
+                    contribution.modifiers.append(("NOUN", "X", self.noun_multiplier))
+            if self.output_calculations:
+                self.contribution = contribution
+                self.contributions[0].append(contribution)
+            return noun_SO
+
+    def get_verb_SO(self, index):
+    ### Verbs are special because their adverbal modifiers are not necessarily
+    ### adjecent to the verb; a special search is done for clause
+    ### final modifiers
+        VB = self.words[index]
+        if self.caps[index]:
+            VB = self.lower_words[index]   # if all upper case, change to lower case
+        if self.words[index - 1] in self.sent_punct:
+            VB = self.lower_words[index]  # change the word to lower case if sentence initial
+        if self.language == "English":
+            vtype = self.get_token_tag(index)[2:]
+            VB = self.get_stem(self.stem_VB, VB, vtype)
+        if VB in self.c_verb_dict:
+            multiword_result = self.find_multiword(index, self.c_verb_dict[VB])
+        else:
+            multiword_result = False
+        if VB in self.not_wanted_verb:
             return 0
-        if not use_superlatives and ((get_word(text[index-1]) in comparatives and get_tag(text[index-2]) == "DA")or (AQ in ["mejor","p"+chr(233) + "simo"] and get_tag(text[index-2]) == "DA")):
+        elif VB not in self.verb_dict and not multiword_result:
             return 0
-        if JJ not in adj_dict and JJ not in not_wanted_adj:
-            new_JJ = stem_super_adj(JJ)
-            if use_intensifiers and use_superlatives and new_JJ != JJ:
-                JJ = new_JJ
-                int_modifier += 1
-    if JJ in c_adj_dict:
-        multiword_result = find_multiword(index, c_adj_dict[JJ])
-    else:
-        multiword_result = False
-    if JJ in not_wanted_adj:
-        return 0
-    elif language == "English" and ((adjtype == "S" or get_word(text[index-1]) in superlatives) and (not words_within_num(index, definites, 2) or not is_in_predicate(index)) or ((adjtype == "R" or get_word(text[index -1]) in comparatives) and not is_in_predicate(index))):
-        return 0        # superlatives must be preceded by a definite and be in the predicate         # comparatives must be in the predicate
-    elif JJ not in adj_dict and not multiword_result:
-        return 0
-    else:
-        if multiword_result:
-            (adj_SO, backcount, forwardcount, int_modifier) = multiword_result
-            output = list(map(get_word, text[index - backcount:index + forwardcount + 1]))
-            i = index - backcount - 1
         else:
-            output = [original_JJ]
-            adj_SO = adj_dict[JJ]
-            i = index - 1
-        if (language == "English" and get_tag(text[i]) == "DET" or get_word(text[i]) == "as") or (language == "Spanish" and get_tag(text[i]) == "DA" or get_tag(text[i]) == "DI" or get_word(text[i]) == "tan"): # look past determiners and "as" for intensification
-            i -= 1
-        if use_intensifiers:
-            intensifier = 1
-            while intensifier: # keep looking for instensifiers until no more
-                intensifier = find_intensifier(i)           # are found
+            if multiword_result:
+                (verb_SO, backcount, forwardcount, int_modifier) = multiword_result
+                if self.output_calculations:
+                    contribution = SOContribution(index - backcount, index + forwardcount + 1)
+                i = index - backcount - 1
+            else:
+                int_modifier = 0
+                if self.output_calculations:
+                    contribution = SOContribution(index, index + 1)
+                verb_SO = self.verb_dict[VB]
+                i = index - 1
+            if self.use_intensifiers:
+                intensifier = self.find_intensifier(i)
                 if intensifier:
                     int_modifier += intensifier[1]
                     for j in range (0, intensifier[0]):
-                        text[i][1] = "MOD" # block modifier being used twice
-                        i -= 1
-                    output = list(map(get_word, text[i + 1:i + intensifier[0] + 1])) + output
-        negation = find_negation(i, adj_tag)
-        if negation != -1:
-            output = list(map(get_word, text[negation:i+1])) + output
-            if use_intensifiers:
-                int_modifier_negex = 0
-                i = negation - 1
-                if language == "English":
-                    while text[i][0] in skipped["JJ"]:
-                        i -= 1
-                intensifier = find_intensifier(i)
-                if intensifier:
-                    int_modifier_negex = intensifier[1]
-                    for j in range (0, intensifier[0]):
-                        text[i][1] = "MOD" # block modifier being used twice
+                        self.consumed[i] = 1 # block modifier being used twice
                         i -= 1
-                    output = list(map(get_word, text[i + 1:i + intensifier[0] + 1])) + output
-        output.append(str(adj_SO))
-        if int_modifier != 0:
-            adj_SO = adj_SO *(1+int_modifier)
-            output.append("X " + str(1 + int_modifier) + " (INTENSIFIED)")
-            if ((language == "English" and adjtype == "R") or get_word(text[index -1]) in comparatives):
-                output.append("(COMPARATIVE)")
-            if (language == "English" and (adjtype == "S" or get_word(text[index-1]) in superlatives)):
-                output.append("(SUPERLATIVE)")
-            elif (language == "Spanish" and (get_word(text[index-1]) in comparatives and get_tag(text[index-2]) == "DA")or (JJ in ["mejor","p"+chr(233) + "simo"] and get_tag(text[index-2]) == "DA")):
-                output.append("(SUPERLATIVE)")
-        elif use_blocking and find_blocker(adj_SO, index, adj_tag):
-            output.append("X 0 (BLOCKED)")
-            adj_SO = 0
-        if use_negation and negation != -1:
-            if neg_negation_nullification and adj_SO < 0:
-                neg_shift = abs(adj_SO)
-            elif polarity_switch_neg or (limit_shift and abs(adj_SO) * 2 < adj_neg_shift):
-                neg_shift = abs(adj_SO) * 2
+                    if self.output_calculations:
+                        contribution.spans.insert(0, (i + 1, i + intensifier[0] + 1))
+                if self.use_clause_final_int: # look for clause-final modifier
+                    edge = self.find_VP_boundary(index)
+                    intensifier = self.find_intensifier(edge - 1)
+                    if intensifier:
+                        int_modifier = intensifier[1]
+                        for j in range (0, intensifier[0]):
+                            self.consumed[edge - 1 - j] = 1
+                        if self.output_calculations:
+                            contribution.spans.append((index + 1, edge))
+            negation = self.find_negation(i, self.verb_tag)
+            if negation != -1:
+                if self.output_calculations:
+                    contribution.spans.insert(0, (negation, i+1))
+                if self.use_intensifiers:
+                    int_modifier_negex = 0
+                    i = negation - 1
+                    if self.language == "English":
+                        while self.words[i] in self.skipped["JJ"]:
+                            i -= 1
+                    intensifier = self.find_intensifier(i)
+                    if intensifier:
+                        int_modifier_negex = intensifier[1]
+                        for j in range (0, intensifier[0]):
+                            self.consumed[i] = 1 # block modifier being used twice
+                            i -= 1
+                        if self.output_calculations:
+                            contribution.spans.insert(0, (i + 1, i + intensifier[0] + 1))
+            if self.features is not None:
+                self.add_feature(1, VB, index, i, verb_SO, int_modifier, negation, int_modifier_negex if negation != -1 and self.use_intensifiers else 0)
+            if self.output_calculations:
+                contribution.SO = verb_SO
+            if int_modifier != 0:
+                verb_SO = verb_SO *(1+int_modifier)
+                if self.output_calculations:
+                    contribution.modifiers.append(("INTENSIFIED", "X", 1 + int_modifier))
+            elif self.use_blocking and self.find_blocker(verb_SO, index, self.verb_tag):
+                if self.output_calculations:
+                    contribution.modifiers.append(("BLOCKED", "X", 0))
+                verb_SO = 0
+            if self.use_negation and negation != -1:
+                if self.neg_negation_nullification and verb_SO < 0:
+                    neg_shift = abs(verb_SO)
+                elif self.polarity_switch_neg or (self.limit_shift and abs(verb_SO) * 2 < self.verb_neg_shift):
+                    neg_shift = abs(verb_SO) * 2
+                else:
+                    neg_shift = self.verb_neg_shift
+                if verb_SO > 0:
+                    verb_SO -= neg_shift
+                    if self.output_calculations:
+                        contribution.modifiers.append(("NEGATED", "-", neg_shift))
+                elif verb_SO < 0:
+                    verb_SO += neg_shift
+                    if self.output_calculations:
+                        contribution.modifiers.append(("NEGATED", "+", neg_shift))
+                elif self.output_calculations:
+                    contribution.modifiers.append(("NEGATED", "", 0))
+                if self.use_intensifiers and int_modifier_negex != 0:
+                    verb_SO *=(1+int_modifier_negex)
+                    if self.output_calculations:
+                        contribution.modifiers.append(("INTENSIFIED", "X", 1 + int_modifier_negex))
+            (verb_SO, new_out) = self.apply_other_modifiers(verb_SO, index, i)
+            if self.output_calculations:
+                contribution.modifiers += new_out
+            if verb_SO != 0:
+                if int_modifier != 0 and self.int_multiplier != 1:
+                    verb_SO *= self.int_multiplier
+                    if self.output_calculations:
+                        contribution.modifiers.append(("INT_WEIGHT", "X", self.int_multiplier))
+                if VB not in self.word_counts[1]:
+                    self.word_counts[1][VB] = 1
+                else:
+                    self.word_counts[1][VB] += 1
+                    if negation == -1:
+                        if self.use_word_counts_lower:
+                            verb_SO /= self.word_counts[1][VB]
+                            if self.output_calculations:
+                                contribution.modifiers.append(("REPEATED", "/", self.word_counts[1][VB]))
+                        if self.use_word_counts_block:
+                            verb_SO = 0
+                            if self.output_calculations:
+                                contribution.modifiers.append(("REPEATED", "X", 0))
+            if self.verb_multiplier != 1:
+                verb_SO *= self.verb_multiplier
+                if self.output_calculations:
+                    contribution.modifiers.append(("VERB", "X", self.verb_multiplier))
+            if self.output_calculations:
+                self.contribution = contribution
+                self.contributions[1].append(contribution)
+            return verb_SO
+
+    def get_adj_SO(self, index):
+    ### Comparative and superlative adjectives require special stemming, and are
+    ### treated as if they have been intensified with "more" or "most". Non-
+    ### predicative uses of this kind of adjective are often not intended to
+    ### express sentiment, and are therefore ignored. Adjectives often have
+    ### more than one intensifier (e.g. really very good) so the search for
+    ### intensifiers is iterative.
+        JJ = self.words[index]
+        int_modifier = 0
+        if self.caps[index]:
+            JJ = self.lower_words[index]      # if all upper case, change to lower case
+        if self.words[index - 1] in self.sent_punct:
+            JJ = self.lower_words[index]    # change the word to lower case if sentence initial
+        if self.language == "English":
+            adjtype = self.get_token_tag(index)[2:]
+            if not self.use_comparatives and (adjtype == "R" or self.words[index -1] in self.comparatives):
+                return 0
+            if not self.use_superlatives and (adjtype == "S" or self.words[index-1] in self.superlatives or JJ in ["best","worst"]):
+                return 0
+            if adjtype == "R" and JJ not in self.adj_dict and JJ not in self.not_wanted_adj:
+                JJ = self.get_stem(self.stem_comp_JJ, JJ)
+                if self.use_intensifiers:
+                    int_modifier += self.int_dict["more"]
+            elif adjtype == "S" and JJ not in self.adj_dict and JJ not in self.not_wanted_adj:
+                JJ = self.get_stem(self.stem_super_adj, JJ)
+                if self.use_intensifiers:
+                    int_modifier += 1
+        elif self.language == "Spanish":
+            JJ = self.get_stem(self.stem_AQ, JJ)
+            if not self.use_comparatives and (self.words[index -1] in self.comparatives):
+                return 0
+            if not self.use_superlatives and ((self.words[index-1] in self.comparatives and self.get_token_tag(index-2) == "DA")or (AQ in ["mejor","p"+chr(233) + "simo"] and self.get_token_tag(index-2) == "DA")):
+                return 0
+            if JJ not in self.adj_dict and JJ not in self.not_wanted_adj:
+                new_JJ = self.get_stem(self.stem_super_adj, JJ)
+                if self.use_intensifiers and self.use_superlatives and new_JJ != JJ:
+                    JJ = new_JJ
+                    int_modifier += 1
+        if JJ in self.c_adj_dict:
+            multiword_result = self.find_multiword(index, self.c_adj_dict[JJ])
+        else:
+            multiword_result = False
+        if JJ in self.not_wanted_adj:
+            return 0
+        elif self.language == "English" and ((adjtype == "S" or self.words[index-1] in self.superlatives) and (not self.words_within_num(index, self.definites, 2) or not self.is_in_predicate(index)) or ((adjtype == "R" or self.words[index -1] in self.comparatives) and not self.is_in_predicate(index))):
+            return 0        # superlatives must be preceded by a definite and be in the predicate         # comparatives must be in the predicate
+        elif JJ not in self.adj_dict and not multiword_result:
+            return 0
+        else:
+            if multiword_result:
+                (adj_SO, backcount, forwardcount, int_modifier) = multiword_result
+                if self.output_calculations:
+                    contribution = SOContribution(index - backcount, index + forwardcount + 1)
+                i = index - backcount - 1
             else:
-                neg_shift = adj_neg_shift
-            if adj_SO > 0:
-                adj_SO -= neg_shift
-                output.append ("- "+ str(neg_shift))
-            elif adj_SO < 0:
-                adj_SO += neg_shift
-                output.append ("+ "+ str(neg_shift))
-            output.append("(NEGATED)")
-            if use_intensifiers and int_modifier_negex != 0:
-                adj_SO *=(1+int_modifier_negex)
-                output.append("X " + str(1 + int_modifier_negex) + " (INTENSIFIED)")
-        (adj_SO, new_out) = apply_other_modifiers(adj_SO, index, i)
-        output += new_out
-        if int_modifier != 0 and int_multiplier != 1:
-            adj_SO *= int_multiplier
-            output.append("X " + str(int_multiplier) + " (INT_WEIGHT)")
-        if JJ not in word_counts[2]:
-            word_counts[2][JJ] = 1
+                if self.output_calculations:
+                    contribution = SOContribution(index, index + 1)
+                adj_SO = self.adj_dict[JJ]
+                i = index - 1
+            if (self.language == "English" and self.get_token_tag(i) == "DET" or self.words[i] == "as") or (self.language == "Spanish" and self.get_token_tag(i) == "DA" or self.get_token_tag(i) == "DI" or self.words[i] == "tan"): # look past determiners and "as" for intensification
+                i -= 1
+            if self.use_intensifiers:
+                intensifier = 1
+                while intensifier: # keep looking for instensifiers until no more
+                    intensifier = self.find_intensifier(i)           # are found
+                    if intensifier:
+                        int_modifier += intensifier[1]
+                        for j in range (0, intensifier[0]):
+                            self.consumed[i] = 1 # block modifier being used twice
+                            i -= 1
+                        if self.output_calculations:
+                            contribution.spans.insert(0, (i + 1, i + intensifier[0] + 1))
+            negation = self.find_negation(i, self.adj_tag)
+            if negation != -1:
+                if self.output_calculations:
+                    contribution.spans.insert(0, (negation, i+1))
+                if self.use_intensifiers:
+                    int_modifier_negex = 0
+                    i = negation - 1
+                    if self.language == "English":
+                        while self.words[i] in self.skipped["JJ"]:
+                            i -= 1
+                    intensifier = self.find_intensifier(i)
+                    if intensifier:
+                        int_modifier_negex = intensifier[1]
+                        for j in range (0, intensifier[0]):
+                            self.consumed[i] = 1 # block modifier being used twice
+                            i -= 1
+                        if self.output_calculations:
+                            contribution.spans.insert(0, (i + 1, i + intensifier[0] + 1))
+            if self.features is not None:
+                self.add_feature(2, JJ, index, i, adj_SO, int_modifier, negation, int_modifier_negex if negation != -1 and self.use_intensifiers else 0)
+            if self.output_calculations:
+                contribution.SO = adj_SO
+            if int_modifier != 0:
+                adj_SO = adj_SO *(1+int_modifier)
+                if self.output_calculations:
+                    contribution.modifiers.append(("INTENSIFIED", "X", 1 + int_modifier))
+                if ((self.language == "English" and adjtype == "R") or self.words[index -1] in self.comparatives):
+                    if self.output_calculations:
+                        contribution.modifiers.append(("COMPARATIVE", "", 0))
+                if (self.language == "English" and (adjtype == "S" or self.words[index-1] in self.superlatives)):
+                    if self.output_calculations:
+                        contribution.modifiers.append(("SUPERLATIVE", "", 0))
+                elif (self.language == "Spanish" and (self.words[index-1] in self.comparatives and self.get_token_tag(index-2) == "DA")or (JJ in ["mejor","p"+chr(233) + "simo"] and self.get_token_tag(index-2) == "DA")):
+                    if self.output_calculations:
+                        contribution.modifiers.append(("SUPERLATIVE", "", 0))
+            elif self.use_blocking and self.find_blocker(adj_SO, index, self.adj_tag):
+                if self.output_calculations:
+                    contribution.modifiers.append(("BLOCKED", "X", 0))
+                adj_SO = 0
+            if self.use_negation and negation != -1:
+                if self.neg_negation_nullification and adj_SO < 0:
+                    neg_shift = abs(adj_SO)
+                elif self.polarity_switch_neg or (self.limit_shift and abs(adj_SO) * 2 < self.adj_neg_shift):
+                    neg_shift = abs(adj_SO) * 2
+                else:
+                    neg_shift = self.adj_neg_shift
+                if adj_SO > 0:
+                    adj_SO -= neg_shift
+                    if self.output_calculations:
+                        contribution.modifiers.append(("NEGATED", "-", neg_shift))
+                elif adj_SO < 0:
+                    adj_SO += neg_shift
+                    if self.output_calculations:
+                        contribution.modifiers.append(("NEGATED", "+", neg_shift))
+                elif self.output_calculations:
+                    contribution.modifiers.append(("NEGATED", "", 0))
+                if self.use_intensifiers and int_modifier_negex != 0:
+                    adj_SO *=(1+int_modifier_negex)
+                    if self.output_calculations:
+                        contribution.modifiers.append(("INTENSIFIED", "X", 1 + int_modifier_negex))
+            (adj_SO, new_out) = self.apply_other_modifiers(adj_SO, index, i)
+            if self.output_calculations:
+                contribution.modifiers += new_out
+            if int_modifier != 0 and self.int_multiplier != 1:
+                adj_SO *= self.int_multiplier
+                if self.output_calculations:
+                    contribution.modifiers.append(("INT_WEIGHT", "X", self.int_multiplier))
+            if JJ not in self.word_counts[2]:
+                self.word_counts[2][JJ] = 1
+            else:
+                self.word_counts[2][JJ] += 1
+                if negation == -1:
+                    if self.use_word_counts_lower:
+                        adj_SO /= self.word_counts[2][JJ]
+                        if self.output_calculations:
+                            contribution.modifiers.append(("REPEATED", "/", self.word_counts[2][JJ]))
+                    if self.use_word_counts_block:
+                        adj_SO = 0
+                        if self.output_calculations:
+                            contribution.modifiers.append(("REPEATED", "X", 0))
+            if self.adj_multiplier != 1:
+                adj_SO *= self.adj_multiplier
+                if self.output_calculations:
+                    contribution.modifiers.append(("ADJECTIVE", "X", self.adj_multiplier))
+            if self.output_calculations:
+                self.contribution = contribution
+                self.contributions[2].append(contribution)
+            return adj_SO
+
+    def get_adv_SO(self, index):
+    ### There are two special things to note about dealing with adverbs: one is that
+    ### their SO value can be derived automatically from the lemma in the
+    ### adjective dictionary. The other is the special handling of "too", which
+    ### is counted only when it does not appear next to punctuation (which rules out
+    ### most cases of "too" in the sense of "also")
+        RB = self.words[index]
+        if self.caps[index]:
+            RB = self.lower_words[index]   # if all upper case, change to lower case
+        if self.words[index - 1] in self.sent_punct:
+            RB = self.lower_words[index] # change the word to lower case if sentence initial
+        if self.adv_learning and RB not in self.adv_dict and RB not in self.not_wanted_adv:
+            JJ = self.get_stem(self.stem_adv_to_adj, RB) # stem the adverb to its corresponding adj
+            if JJ in self.adj_dict:
+                self.adv_dict[RB] = self.adj_dict[JJ] # take its SO value
+                self.new_adv_dict[RB] = self.adj_dict[JJ]
+        if RB in self.c_adv_dict:
+            multiword_result = self.find_multiword(index, self.c_adv_dict[RB])
         else:
-            word_counts[2][JJ] += 1
-            if negation == -1:
-                if use_word_counts_lower:
-                    adj_SO /= word_counts[2][JJ]
-                    output.append("X 1/" + str(word_counts[2][JJ]) + " (REPEATED)")
-                if use_word_counts_block:
-                    adj_SO = 0
-                    output.append("X 0 (REPEATED)")
-        if adj_multiplier != 1:
-            adj_SO *= adj_multiplier
-            output.append("X " + str(adj_multiplier) + " (ADJECTIVE)")
-        if output_calculations:
-            for word in output:
-                richout.write(word + " ")
-        if output_calculations and adj_SO == 0:
-            richout.write("= 0\n") # calculation is over
-        return adj_SO
-
-def get_adv_SO(index):
-### There are two special things to note about dealing with adverbs: one is that
-### their SO value can be derived automatically from the lemma in the
-### adjective dictionary. The other is the special handling of "too", which
-### is counted only when it does not appear next to punctuation (which rules out
-### most cases of "too" in the sense of "also")
-    RB = get_word(text[index])
-    original_RB = RB
-    if RB.isupper():
-        RB = RB.lower()   # if all upper case, change to lower case
-    if get_word(text[index - 1]) in sent_punct:
-        RB = RB.lower() # change the word to lower case if sentence initial
-    if adv_learning and RB not in adv_dict and RB not in not_wanted_adv:
-        JJ = stem_adv_to_adj(RB) # stem the adverb to its corresponding adj
-        if JJ in adj_dict:
-            adv_dict[RB] = adj_dict[JJ] # take its SO value
-            new_adv_dict[RB] = adj_dict[JJ]
-    if RB in c_adv_dict:
-        multiword_result = find_multiword(index, c_adv_dict[RB])
-    else:
-        multiword_result = False
-    if RB in not_wanted_adv or (language == "English" and (RB == "too" and index < len(text) - 1 and get_word(text[index + 1]) in punct) or (RB == "well" and index < len(text) - 1 and get_word(text[index + 1]) == ",")):
-        return [0,""]                    # do not count too next to punctuation
-    elif RB not in adv_dict and not multiword_result:
-        return [0,""]
-    else:
-        if multiword_result:
-            (adv_SO, backcount, forwardcount, int_modifier) = multiword_result
-            output = list(map(get_word, text[index - backcount:index + forwardcount + 1]))
-            i = index - backcount - 1
+            multiword_result = False
+        if RB in self.not_wanted_adv or (self.language == "English" and (RB == "too" and index < len(self.words) - 1 and self.words[index + 1] in self.punct) or (RB == "well" and index < len(self.words) - 1 and self.words[index + 1] == ",")):
+            return 0                    # do not count too next to punctuation
+        elif RB not in self.adv_dict and not multiword_result:
+            return 0
         else:
-            int_modifier = 0
-            output = [original_RB]
-            adv_SO = adv_dict[RB]
-            i = index - 1
-        if (language == "English" and get_word(text[i]) == "as") or (language == "Spanish" and get_word(text[i]) == "tan"): # look past "as" for intensification
-            i -= 1
-        if use_intensifiers:
-            intensifier = find_intensifier(i)
-            if intensifier:
-                int_modifier += intensifier[1]
-                for j in range (0, intensifier[0]):
-                    text[i][1] = "MOD" # block modifier being used twice
-                    i -= 1
-                output = list(map(get_word, text[i + 1:i + intensifier[0] + 1])) + output
-        negation = find_negation(i, adv_tag)
-        if negation != -1:
-            output = list(map(get_word, text[negation:i+1])) + output
-            if use_intensifiers:
-                int_modifier_negex = 0
-                i = negation - 1
-                if language == "English":
-                    while text[i][0] in skipped["JJ"]:
-                        i -= 1
-                intensifier = find_intensifier(i)
+            if multiword_result:
+                (adv_SO, backcount, forwardcount, int_modifier) = multiword_result
+                if self.output_calculations:
+                    contribution = SOContribution(index - backcount, index + forwardcount + 1)
+                i = index - backcount - 1
+            else:
+                int_modifier = 0
+                if self.output_calculations:
+                    contribution = SOContribution(index, index + 1)
+                adv_SO = self.adv_dict[RB]
+                i = index - 1
+            if (self.language == "English" and self.words[i] == "as") or (self.language == "Spanish" and self.words[i] == "tan"): # look past "as" for intensification
+                i -= 1
+            if self.use_intensifiers:
+                intensifier = self.find_intensifier(i)
                 if intensifier:
-                    int_modifier_negex = intensifier[1]
+                    int_modifier += intensifier[1]
                     for j in range (0, intensifier[0]):
-                        text[i][1] = "MOD" # block modifier being used twice
+                        self.consumed[i] = 1 # block modifier being used twice
                         i -= 1
-                    output = list(map(get_word, text[i + 1:i + intensifier[0] + 1])) + output
-        output.append(str(adv_SO))
-        if int_modifier != 0:
-            adv_SO = adv_SO *(1+int_modifier)
-            output.append("X " + str(1 + int_modifier) + " (INTENSIFIED)")
-        elif use_blocking and find_blocker(adv_SO, index, adv_tag):
-            output.append("X 0 (BLOCKED)")
-            adv_SO = 0
-        if use_negation and negation != -1:
-            if neg_negation_nullification and adv_SO < 0:
-                neg_shift = abs(adv_SO)
-            elif polarity_switch_neg or (limit_shift and abs(adv_SO) * 2 < adv_neg_shift):
-                neg_shift = abs(adv_SO) * 2
+                    if self.output_calculations:
+                        contribution.spans.insert(0, (i + 1, i + intensifier[0] + 1))
+            negation = self.find_negation(i, self.adv_tag)
+            if negation != -1:
+                if self.output_calculations:
+                    contribution.spans.insert(0, (negation, i+1))
+                if self.use_intensifiers:
+                    int_modifier_negex = 0
+                    i = negation - 1
+                    if self.language == "English":
+                        while self.words[i] in self.skipped["JJ"]:
+                            i -= 1
+                    intensifier = self.find_intensifier(i)
+                    if intensifier:
+                        int_modifier_negex = intensifier[1]
+                        for j in range (0, intensifier[0]):
+                            self.consumed[i] = 1 # block modifier being used twice
+                            i -= 1
+                        if self.output_calculations:
+                            contribution.spans.insert(0, (i + 1, i + intensifier[0] + 1))
+            if self.features is not None:
+                self.add_feature(3, RB, index, i, adv_SO, int_modifier, negation, int_modifier_negex if negation != -1 and self.use_intensifiers else 0)
+            if self.output_calculations:
+                contribution.SO = adv_SO
+            if int_modifier != 0:
+                adv_SO = adv_SO *(1+int_modifier)
+                if self.output_calculations:
+                    contribution.modifiers.append(("INTENSIFIED", "X", 1 + int_modifier))
+            elif self.use_blocking and self.find_blocker(adv_SO, index, self.adv_tag):
+                if self.output_calculations:
+                    contribution.modifiers.append(("BLOCKED", "X", 0))
+                adv_SO = 0
+            if self.use_negation and negation != -1:
+                if self.neg_negation_nullification and adv_SO < 0:
+                    neg_shift = abs(adv_SO)
+                elif self.polarity_switch_neg or (self.limit_shift and abs(adv_SO) * 2 < self.adv_neg_shift):
+                    neg_shift = abs(adv_SO) * 2
+                else:
+                    neg_shift = self.adv_neg_shift
+                if adv_SO > 0:
+                    adv_SO -= neg_shift
+                    if self.output_calculations:
+                        contribution.modifiers.append(("NEGATED", "-", neg_shift))
+                elif adv_SO < 0:
+                    adv_SO += neg_shift
+                    if self.output_calculations:
+                        contribution.modifiers.append(("NEGATED", "+", neg_shift))
+                elif self.output_calculations:
+                    contribution.modifiers.append(("NEGATED", "", 0))
+                if self.use_intensifiers and int_modifier_negex != 0:
+                    adv_SO *=(1+int_modifier_negex)
+                    if self.output_calculations:
+                        contribution.modifiers.append(("INTENSIFIED", "X", 1 + int_modifier_negex))
+            (adv_SO, new_out) = self.apply_other_modifiers(adv_SO, index, i)
+            if self.output_calculations:
+                contribution.modifiers += new_out
+            if adv_SO != 0:
+                if int_modifier != 0 and self.int_multiplier != 1:
+                    adv_SO *= self.int_multiplier
+                    if self.output_calculations:
+                        contribution.modifiers.append(("INT_WEIGHT", "X", self.int_multiplier))
+                if RB not in self.word_counts[3]:
+                    self.word_counts[3][RB] = 1
+                else:
+                    self.word_counts[3][RB] += 1
+                    if negation == -1:
+                        if self.use_word_counts_lower:
+                            adv_SO /= self.word_counts[3][RB]
+                            if self.output_calculations:
+                                contribution.modifiers.append(("REPEATED", "/", self.word_counts[3][RB]))
+                        if self.use_word_counts_block:
+                            adv_SO = 0
+                            if self.output_calculations:
+                                contribution.modifiers.append(("REPEATED", "X", 0))
+            if self.adv_multiplier != 1:
+                adv_SO *= self.adv_multiplier
+                if self.output_calculations:
+                    contribution.modifiers.append(("ADVERB", "X", self.adv_multiplier))
+            if self.output_calculations and adv_SO != 0: # adverbs that end up
+                self.contribution = contribution      # with no SO are not listed
+                self.contributions[3].append(contribution)
+            return adv_SO
+
+
+    ### Main script ###
+
+    ### Note that there are 4 (or even 5) iterations through the text. The
+    ### rationale for interating seperately for each part of speech (and the
+    ### ordering of those iterations) is that adverbs and adjectives which are used
+    ### as intensifiers of nouns, verbs, or adjectives need to be marked so they
+    ### are not counted twice.
+
+    def score(self, tokens, weights=None, boundaries=None, name=""):
+    ### calculates the SO of a text given as a list of (word, tag) pairs, and
+    ### returns an SOResult. weights (one per token) default to 1, boundaries
+    ### (the token index after each line) default to a single line. The tokens
+    ### are copied, so the caller's list is left untouched
+        self.reset_text()
+        for token in tokens:
+            self.add_token(token, 1.0)
+        if weights is not None:
+            self.weights = array.array("d", weights)
+        if boundaries is None:
+            self.boundaries = [len(self.words)]
+        else:
+            self.boundaries = list(boundaries)
+        self.apply_location_weights()
+        return self.calculate_SO(name)
+
+    def score_file(self, input_path, basic_output, rich_output, save_adverbs=True, rich_json_output=None):
+    ### calculates the SO of a single preprocessed file and appends the results to
+    ### the basic and rich outputs, and to the JSON lines rich output if one is
+    ### given. If save_adverbs is False, newly learned adverbs are only returned
+    ### in the result, for the caller to save
+        with open(input_path, "r") as infile:
+            return self.score_document(os.path.basename(input_path), infile, basic_output, rich_output, save_adverbs, rich_json_output)
+
+    def score_document(self, name, lines, basic_output, rich_output, save_adverbs=True, rich_json_output=None):
+    ### the same as score_file, for a preprocessed document given by its name
+    ### and its lines, e.g. one record of a corpus stream
+        self.reset_text()
+        self.fill_text_and_weights(lines)
+        self.apply_location_weights()
+        return self.write_result(self.calculate_SO(name), basic_output, rich_output, save_adverbs, rich_json_output)
+
+    def score_packed(self, corpus, doc_index, basic_output, rich_output, save_adverbs=True, rich_json_output=None):
+    ### the same as score_file, for a document of a packed corpus, given by its
+    ### position in the corpus
+        self.reset_text()
+        self.fill_packed_text(corpus, doc_index)
+        self.apply_location_weights()
+        return self.write_result(self.calculate_SO(corpus.names[doc_index]), basic_output, rich_output, save_adverbs, rich_json_output)
+
+    def write_result(self, result, basic_output, rich_output, save_adverbs=True, rich_json_output=None):
+    ### appends the result of a text to the outputs, and saves the adverbs it
+    ### learned unless save_adverbs is False
+        basic_output.write(result.name + "\t" + str(result.text_SO) + "\n")
+        rich_output.write(result.render_text())
+        if rich_json_output is not None:
+            rich_json_output.write(json.dumps(result.render_dict()) + "\n")
+        if self.adv_learning and result.new_adverbs and save_adverbs: # output the new adverb
+            save_new_adverbs(self.adv_dict_path, result.new_adverbs)      # dictionary
+        return result
+
+    def calculate_SO(self, name):
+    ### calculates the SO of the current text, which must already be filled
+        text_SO = 0
+        SO_counter = 0
+        sentence_SO = {}
+
+        sections = [] # the explanation, if output_calculations is on
+
+        adv_count = len(self.adv_dict) # for determining if there are new adverbs
+
+        self.index_boundaries()
+        self.index_clauses()
+
+        candidates = self.find_candidates()
+
+        if self.use_nouns:
+            nouns_SO = 0
+            for index in candidates[0]:
+                if not self.consumed[index]: # not used by a previous word
+                    word_SO = self.get_noun_SO(index)
+                    if word_SO != 0:
+                        word_SO = self.apply_weights(word_SO, index)
+                        nouns_SO += word_SO
+                    if self.output_sentences:
+                        sentence_no = self.get_sentence_no(index)
+                        if sentence_no not in sentence_SO:
+                            sentence_SO[sentence_no] = word_SO
+                        else:
+                            sentence_SO[sentence_no] += word_SO
+            noun_count = sum_word_counts(self.word_counts[0])
+            if noun_count > 0:
+                average_SO = nouns_SO/noun_count
+                text_SO += nouns_SO
+                SO_counter += noun_count
             else:
-                neg_shift = adv_neg_shift
-            if adv_SO > 0:
-                adv_SO -= neg_shift
-                output.append ("- "+ str(neg_shift))
-            elif adv_SO < 0:
-                adv_SO += neg_shift
-                output.append ("+ "+ str(neg_shift))
-            output.append("(NEGATED)")
-            if use_intensifiers and int_modifier_negex != 0:
-                adv_SO *=(1+int_modifier_negex)
-                output.append("X " + str(1 + int_modifier_negex) + " (INTENSIFIED)")
-        (adv_SO, new_out) = apply_other_modifiers(adv_SO, index, i)
-        output += new_out
-        if adv_SO != 0:
-            if int_modifier != 0 and int_multiplier != 1:
-                adv_SO *= int_multiplier
-                output.append("X " + str(int_multiplier) + " (INT_WEIGHT)")
-            if RB not in word_counts[3]:
-                word_counts[3][RB] = 1
+                average_SO = 0
+            sections.append(("Nouns", self.contributions[0], average_SO))
+
+
+        if self.use_verbs:
+            verbs_SO = 0
+            for index in candidates[1]:
+                if not self.consumed[index]: # not used by a previous word
+                    word_SO = self.get_verb_SO(index)
+                    if word_SO != 0:
+                        word_SO = self.apply_weights(word_SO, index)
+                        verbs_SO += word_SO
+                    if self.output_sentences:
+                        sentence_no = self.get_sentence_no(index)
+                        if sentence_no not in sentence_SO:
+                            sentence_SO[sentence_no] = word_SO
+                        else:
+                            sentence_SO[sentence_no] += word_SO
+            verb_count = sum_word_counts(self.word_counts[1])
+            if verb_count > 0:
+                average_SO = verbs_SO/verb_count
+                text_SO += verbs_SO
+                SO_counter += verb_count
             else:
-                word_counts[3][RB] += 1
-                if negation == -1:
-                    if use_word_counts_lower:
-                        adv_SO /= word_counts[3][RB]
-                        output.append("X 1/" + str(word_counts[3][RB]) + " (REPEATED)")
-                    if use_word_counts_block:
-                        adv_SO = 0
-                        output.append("X 0 (REPEATED)")
-        if adv_multiplier != 1:
-            adv_SO *= adv_multiplier
-            output.append("X " + str(adv_multiplier) + " (ADVERB)")
-        full_output = ""
-        if output_calculations:
-            for word in output:
-                full_output += word + " "
-        if output_calculations and adv_SO == 0:
-            full_output += ("= 0\n") # calucation is over
-        return [adv_SO, full_output]
-
-
- ### Main script ###
-
-### Note that there are 4 (or even 5) iterations through the text. The
-### rationale for interating seperately for each part of speech (and the
-### ordering of those iterations) is that adverbs and adjectives which are used
-### as intensifiers of nouns, verbs, or adjectives need to be marked so they
-### are not counted twice.
-
-
-load_dictionaries()
-fill_text_and_weights(infile)
-
-
-if output_sentences:
-    sentence_SO = {}
-
-adv_count = len(adv_dict) # for determining if there are new adverbs
-
-if output_calculations:
-    richout.write("######\n---------\n" + os.path.basename(args.input) + "\n---------\nText Length: " + str(len(text)) + "\n---------\n")
-
-if fix_cap_tags:
-    fix_all_caps()
-
-if use_nouns:
-    nouns_SO = 0
-    if output_calculations:
-        richout.write("Nouns:\n-----\n")
-    for index in range(0, len(text)):
-        if len(text[index]) == 2:
-            (word, tag) = text[index]
-            if tag[:2] == noun_tag:
-                word_SO = get_noun_SO(index)
-                if word_SO != 0:
-                    word_SO = apply_weights(word_SO, index)
-                    nouns_SO += word_SO
-                if output_sentences:
-                    sentence_no = get_sentence_no(index)
-                    if sentence_no not in sentence_SO:
-                        sentence_SO[sentence_no] = word_SO
-                    else:
-                        sentence_SO[sentence_no] += word_SO
-    noun_count = sum_word_counts(word_counts[0])
-    if noun_count > 0:
-        if output_calculations:
-            richout.write("-----\nAverage SO: " + str(nouns_SO/noun_count) + "\n-----\n")
-        text_SO += nouns_SO
-        SO_counter += noun_count
-    else:
-        if output_calculations:
-            richout.write("-----\nAverage SO: 0\n-----\n")
-
-
-if use_verbs:
-    if output_calculations:
-        richout.write("Verbs:\n-----\n")
-    verbs_SO = 0
-    for index in range(0, len(text)):
-        if len(text[index]) == 2:
-            (word, tag) = text[index]
-            if tag[:2] == verb_tag:
-                word_SO = get_verb_SO(index)
-                if word_SO != 0:
-                    word_SO = apply_weights(word_SO, index)
-                    verbs_SO += word_SO
-                if output_sentences:
-                    sentence_no = get_sentence_no(index)
-                    if sentence_no not in sentence_SO:
-                        sentence_SO[sentence_no] = word_SO
-                    else:
-                        sentence_SO[sentence_no] += word_SO
-    verb_count = sum_word_counts(word_counts[1])
-    if verb_count > 0:
-        if output_calculations:
-            richout.write("-----\nAverage SO: " + str(verbs_SO/verb_count) + "\n-----\n")
-        text_SO += verbs_SO
-        SO_counter += verb_count
-    else:
-        if output_calculations:
-            richout.write("-----\nAverage SO: 0\n-----\n")
-
-if use_adjectives:
-    adjs_SO = 0
-    if output_calculations:
-        richout.write("Adjectives:\n-----\n")
-    for index in range(0, len(text)):
-        if len(text[index]) == 2:
-            (word, tag) = text[index]
-            if tag[:2] == adj_tag:
-                word_SO = get_adj_SO(index)
-                if word_SO != 0:
-                    word_SO = apply_weights(word_SO, index)
-                    adjs_SO += word_SO
-                if output_sentences:
-                    sentence_no = get_sentence_no(index)
-                    if sentence_no not in sentence_SO:
-                        sentence_SO[sentence_no] = word_SO
-                    else:
-                        sentence_SO[sentence_no] += word_SO
-    adj_count = sum_word_counts(word_counts[2])
-    if adj_count > 0:
-        if output_calculations:
-            richout.write("-----\nAverage SO: " + str(adjs_SO/adj_count) + "\n-----\n")
-        text_SO += adjs_SO
-        SO_counter += adj_count
-    else:
-        if output_calculations:
-            richout.write("-----\nAverage SO: 0\n-----\n")
-
-adv_outputs = []
-if use_adverbs:
-    advs_SO = 0
-    if output_calculations:
-        richout.write("Adverbs:\n-----\n")
-    for index in range(len(text) - 1, -1, -1): # backwards iteration, since
-        if len(text[index]) == 2:
-            (word, tag) = text[index]             # adverbs modify adverbs
-            if tag[:2] == adv_tag:
-                (word_SO,output) = get_adv_SO(index)
-                if word_SO != 0:
-                    (word_SO,output) = apply_weights_adv(word_SO, index, output)
-                    advs_SO += word_SO
-                    adv_outputs.insert(0,output)
-                if output_sentences:
-                    sentence_no = get_sentence_no(index)
-                    if sentence_no not in sentence_SO:
-                        sentence_SO[sentence_no] = word_SO
-                    else:
-                        sentence_SO[sentence_no] += word_SO
-        adv_count = sum_word_counts(word_counts[3])
-    for output in adv_outputs:
-        richout.write(output)
-    if adv_count > 0:
-        if output_calculations:
-            richout.write("-----\nAverage SO: " + str(advs_SO/adv_count) + "\n-----\n")
-        text_SO += advs_SO
-        SO_counter += adv_count
-    else:
-        if output_calculations:
-            richout.write("-----\nAverage SO: 0\n-----\n")
+                average_SO = 0
+            sections.append(("Verbs", self.contributions[1], average_SO))
+
+        if self.use_adjectives:
+            adjs_SO = 0
+            for index in candidates[2]:
+                if not self.consumed[index]: # not used by a previous word
+                    word_SO = self.get_adj_SO(index)
+                    if word_SO != 0:
+                        word_SO = self.apply_weights(word_SO, index)
+                        adjs_SO += word_SO
+                    if self.output_sentences:
+                        sentence_no = self.get_sentence_no(index)
+                        if sentence_no not in sentence_SO:
+                            sentence_SO[sentence_no] = word_SO
+                        else:
+                            sentence_SO[sentence_no] += word_SO
+            adj_count = sum_word_counts(self.word_counts[2])
+            if adj_count > 0:
+                average_SO = adjs_SO/adj_count
+                text_SO += adjs_SO
+                SO_counter += adj_count
+            else:
+                average_SO = 0
+            sections.append(("Adjectives", self.contributions[2], average_SO))
+
+        if self.use_adverbs:
+            advs_SO = 0
+            for index in reversed(candidates[3]): # backwards iteration, since
+                if not self.consumed[index]: # adverbs modify adverbs
+                    word_SO = self.get_adv_SO(index)
+                    if word_SO != 0:
+                        word_SO = self.apply_weights(word_SO, index)
+                        advs_SO += word_SO
+                    if self.output_sentences:
+                        sentence_no = self.get_sentence_no(index)
+                        if sentence_no not in sentence_SO:
+                            sentence_SO[sentence_no] = word_SO
+                        else:
+                            sentence_SO[sentence_no] += word_SO
+            if self.words: # an empty text keeps the size of the adverb dictionary
+                adv_count = sum_word_counts(self.word_counts[3])
+            self.contributions[3].reverse() # back in text order
+            if adv_count > 0:
+                average_SO = advs_SO/adv_count
+                text_SO += advs_SO
+                SO_counter += adv_count
+            else:
+                average_SO = 0
+            sections.append(("Adverbs", self.contributions[3], average_SO))
 
 
-if SO_counter > 0:
-    text_SO = text_SO / SO_counter #calculate the final SO for the text
+        if SO_counter > 0:
+            text_SO = text_SO / SO_counter #calculate the final SO for the text
 
-basicout.write(os.path.basename(args.input) + "\t" + str(text_SO) + "\n")
-if output_sentences:
-    richout.write("-----\nSO by Sentence\n-----\n")
-    for i in range(len(boundaries)):
-        richout.write(get_sentence(boundaries[i] -1) + " ")
-        if i in sentence_SO:
-            richout.write(str(sentence_SO[i]) + "\n")
+        if not self.output_calculations:
+            sections = None
+        if self.output_sentences:
+            sentence_spans = self.sentence_spans
         else:
-            richout.write("0\n")
-if output_calculations:
-    richout.write("---------\nTotal SO: " + str(text_SO) + "\n---------\n")
-
-if adv_learning and new_adv_dict: # output the new adverb
-    f = open(adv_dict_path, "a")  # dictionary
-    for adverb in new_adv_dict:
-        f.write(adverb + "\t" + str(int(adv_dict[adverb])) + "\n")
-    f.close()
-
-basicout.close()
-richout.close()
\ No newline at end of file
+            sentence_spans = None
+        if self.recorded_dictionaries is not None:
+            lookups = self.get_lookups()
+        else:
+            lookups = None
+        return SOResult(name, text_SO, SO_counter, sentence_SO, self.new_adv_dict, self.words, sections, sentence_spans, lookups)
+
+
+def main():
+    args = get_command_arguments()
+    if args.compile_lexicon:
+        config = get_configuration_from_file(args.config)
+        compiled_lexicon = config.get("compiled_lexicon")
+        if not compiled_lexicon:
+            print("Set compiled_lexicon in " + args.config + " to compile the lexicon.")
+            return
+        config["compiled_lexicon"] = "" # always build from the dictionary files
+        calculator = SentimentCalculator(config)
+        calculator.compiled_lexicon_path = calculator.dic_dir + compiled_lexicon
+        calculator.save_compiled_lexicon(calculator.get_lexicon_fingerprint())
+        print("Compiled lexicon written to " + calculator.compiled_lexicon_path)
+        return
+    calculator = SentimentCalculator(args.config)
+    basic_output = open(args.basicout_path, "a")
+    rich_output = open(args.richout_path, "a")
+    if args.rich_json_path:
+        rich_json_output = open(args.rich_json_path, "a")
+    else:
+        rich_json_output = None
+    calculator.score_file(args.input, basic_output, rich_output, rich_json_output=rich_json_output)
+    basic_output.close()
+    rich_output.close()
+    if rich_json_output is not None:
+        rich_json_output.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+import argparse
+import csv
+import numpy
+import SO_Run
+
+# Evaluates the scores of a run against the gold labels at many cutoffs at once.
+# The scores and labels are loaded into arrays once and sorted; cumulative counts
+# of the positive and negative documents along the sorted scores then give, for
+# each cutoff, how many of each are above and below it, so that every cutoff
+# costs two binary searches instead of a pass over the documents.
+# As in SO_Run, a document is predicted positive if its score is above the
+# cutoff, negative if it is below, and neutral (wrong either way) if it is equal.
+
+SWEEP_COLUMNS = ["Cutoff", "Positive_Accuracy", "Negative_Accuracy", "Accuracy",
+                 "Positive_Precision", "Positive_Recall", "Positive_F1",
+                 "Negative_Precision", "Negative_Recall", "Negative_F1", "Macro_F1"]
+
+
+def get_command_arguments():
+    '''
+    Read command line input and set values to arguments.
+    :return: a list of arguments
+    '''
+    parser = argparse.ArgumentParser(description='SFU Sentiment Calculator cutoff sweep')
+    parser.add_argument('--input', '-i', type=str, dest='input', action='store',
+                        default='../Sample/output/SO_CAL_Output/BOOKS/file_sentiment.csv',
+                        help="The file_sentiment.csv of a run")
+    parser.add_argument('--gold', '-g', type=str, dest='gold', action='store',
+                        default='../Sample/gold/gold.txt',
+                        help="The gold file path")
+    parser.add_argument('--output', '-o', type=str, dest='output', action='store',
+                        default='cutoff_sweep.csv',
+                        help="The cutoff_sweep.csv path")
+    parser.add_argument('--cutoffs', '-n', type=int, dest='cutoffs', action='store',
+                        default=1000,
+                        help="The number of cutoffs, evenly spaced from the lowest score to the highest")
+    args = parser.parse_args()
+    return args
+
+
+def load_labelled_scores(file_sentiment_path, gold_dct, pos_mark="positive", neg_mark="negative"):
+    '''
+    Read the scores of the documents that have a positive or negative gold label.
+    :param file_sentiment_path: file_sentiment.csv path
+    :param gold_dct: the gold dictionary, see SO_Run.read_gold_file
+    :param pos_mark: the positive gold label
+    :param neg_mark: the negative gold label
+    :return: an array of the scores, and an array of the labels (True for positive)
+    '''
+    scores = []
+    labels = []
+    with open(file_sentiment_path) as fs:
+        for r in csv.DictReader(fs):
+            gold = gold_dct.get(r['File_Name'])
+            if gold == pos_mark or gold == neg_mark:
+                scores.append(float(r['Score']))
+                labels.append(gold == pos_mark)
+    return numpy.array(scores, dtype=numpy.float64), numpy.array(labels, dtype=bool)
+
+
+def get_cutoffs(scores, cutoff_count):
+    '''
+    :param scores: the scores
+    :param cutoff_count: the number of cutoffs
+    :return: an array of cutoff_count cutoffs, evenly spaced from the lowest score to the highest
+    '''
+    if len(scores) == 0:
+        return numpy.zeros(1)
+    return numpy.linspace(scores.min(), scores.max(), max(1, cutoff_count))
+
+
+def divide(numerators, denominators):
+    '''
+    :return: numerators / denominators, 0 where the denominator is 0
+    '''
+    numerators = numpy.asarray(numerators, dtype=numpy.float64)
+    denominators = numpy.asarray(denominators, dtype=numpy.float64)
+    return numpy.divide(numerators, denominators, out=numpy.zeros(numpy.broadcast(numerators, denominators).shape),
+                        where=denominators != 0)
+
+
+def sweep_cutoffs(scores, labels, cutoffs):
+    '''
+    Evaluate the scores at each cutoff.
+    :param scores: the scores of the labelled documents
+    :param labels: their labels (True for positive)
+    :param cutoffs: the cutoffs
+    :return: a dictionary of each name in SWEEP_COLUMNS -> an array with a value for each cutoff
+    '''
+    order = numpy.argsort(scores, kind="mergesort")
+    sorted_scores = scores[order]
+    sorted_labels = labels[order]
+    # positives_below[k] (negatives_below[k]) is the number of positive (negative) documents among the k lowest scores
+    positives_below = numpy.concatenate(([0], numpy.cumsum(sorted_labels)))
+    negatives_below = numpy.arange(len(scores) + 1) - positives_below
+    positive_total = positives_below[-1]
+    negative_total = negatives_below[-1]
+
+    below = numpy.searchsorted(sorted_scores, cutoffs, side="left")  # the number of scores < cutoff
+    not_above = numpy.searchsorted(sorted_scores, cutoffs, side="right")  # the number of scores <= cutoff
+    true_positives = positive_total - positives_below[not_above]
+    true_negatives = negatives_below[below]
+    predicted_positives = len(scores) - not_above
+    predicted_negatives = below
+
+    sweep = {"Cutoff": numpy.asarray(cutoffs, dtype=numpy.float64)}
+    sweep["Positive_Accuracy"] = divide(true_positives, positive_total)
+    sweep["Negative_Accuracy"] = divide(true_negatives, negative_total)
+    sweep["Accuracy"] = divide(true_positives + true_negatives, len(scores))
+    for (name, true_count, predicted_count, total) in [("Positive", true_positives, predicted_positives, positive_total),
+                                                       ("Negative", true_negatives, predicted_negatives, negative_total)]:
+        precision = divide(true_count, predicted_count)
+        recall = divide(true_count, total)
+        sweep[name + "_Precision"] = precision
+        sweep[name + "_Recall"] = recall
+        sweep[name + "_F1"] = divide(2 * precision * recall, precision + recall)
+    sweep["Macro_F1"] = (sweep["Positive_F1"] + sweep["Negative_F1"]) / 2
+    return sweep
+
+
+def get_best_cutoff(sweep, metric="Accuracy"):
+    '''
+    :param sweep: the result of sweep_cutoffs
+    :param metric: the column to maximise
+    :return: the position of the best cutoff (the lowest one, if several are equally good)
+    '''
+    return int(numpy.argmax(sweep[metric]))
+
+
+def write_sweep(sweep, sweep_path):
+    '''
+    Write cutoff_sweep.csv, with the columns in SWEEP_COLUMNS and a row for each cutoff.
+    :param sweep: the result of sweep_cutoffs
+    :param sweep_path: cutoff_sweep.csv path
+    :return: None
+    '''
+    table = numpy.column_stack([sweep[name] for name in SWEEP_COLUMNS])
+    numpy.savetxt(sweep_path, table, fmt="%.10g", delimiter=",", header=",".join(SWEEP_COLUMNS), comments="")
+
+
+def evaluate_cutoffs(file_sentiment_path, gold_dct, sweep_path, cutoff_count):
+    '''
+    Sweep the cutoffs for the scores of a run, write cutoff_sweep.csv and print the best cutoff.
+    :param file_sentiment_path: file_sentiment.csv path
+    :param gold_dct: the gold dictionary
+    :param sweep_path: cutoff_sweep.csv path
+    :param cutoff_count: the number of cutoffs
+    :return: the best cutoff
+    '''
+    (scores, labels) = load_labelled_scores(file_sentiment_path, gold_dct)
+    sweep = sweep_cutoffs(scores, labels, get_cutoffs(scores, cutoff_count))
+    write_sweep(sweep, sweep_path)
+    best = get_best_cutoff(sweep)
+    print("Best cutoff of %d: %g (accuracy %.1f %%, positive %.1f %%, negative %.1f %%, macro F1 %.3f), over %d labelled files"
+          % (len(sweep["Cutoff"]), sweep["Cutoff"][best], 100.0 * sweep["Accuracy"][best], 100.0 * sweep["Positive_Accuracy"][best],
+             100.0 * sweep["Negative_Accuracy"][best], sweep["Macro_F1"][best], len(scores)))
+    return sweep["Cutoff"][best]
+
+
+def main():
+    args = get_command_arguments()
+    evaluate_cutoffs(args.input, SO_Run.read_gold_file(args.gold), args.output, args.cutoffs)
+
+if __name__ == "__main__":
+    main()
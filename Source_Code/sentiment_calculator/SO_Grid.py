@@ -0,0 +1,366 @@
+import argparse
+import os
+import io
+import time
+import hashlib
+import itertools
+import numpy
+import SO_Calc
+import SO_Pack
+import SO_Run
+
+# Grid search over the numeric settings of the config. The multipliers, negation
+# shifts, capital and exclamation modifiers and the blocker cutoff only change the
+# arithmetic of SO-CAL, not which words are found, intensified, negated or
+# repeated. So the corpus is scored once, with the calculator recording a feature
+# row for each SO carrying word (see SentimentCalculator.record_features), and the
+# features are kept in columns. The SO of every document is then calculated
+# again from the columns with NumPy for each combination of settings of the grid,
+# and each combination is evaluated against the gold data.
+# The features only depend on the other settings of the config, the dictionaries
+# and the documents, and can be saved to a feature cache to try other grids later.
+# One approximation: an intensifier in all caps keeps the capital_modifier of the
+# config (only the SO carrying words in all caps use the capital_modifier of the grid).
+
+GRID_SETTINGS = ["adj_multiplier", "adv_multiplier", "verb_multiplier", "noun_multiplier", "int_multiplier",
+                 "neg_multiplier", "capital_modifier", "exclam_modifier", "noun_neg_shift", "verb_neg_shift",
+                 "adj_neg_shift", "adv_neg_shift", "blocker_cutoff"]
+FEATURES_VERSION = 1  # increase whenever the features or the way they are used change
+MAX_CHUNK_CELLS = 1 << 21  # the most (settings, word) values calculated at once
+
+
+def get_command_arguments():
+    '''
+    Read command line input and set values to arguments.
+    :return: a list of arguments
+    '''
+    parser = argparse.ArgumentParser(description='SFU Sentiment Calculator grid search')
+    parser.add_argument('--input', '-i', type=str, dest='input', action='store',
+                        default='../Sample/output/Preprocessed_Output/BOOKS',
+                        help="The input, as for SO_Run.py")
+    parser.add_argument('--input_format', '-f', type=str, dest='input_format', action='store',
+                        default='files', choices=['files', 'jsonl', 'tsv', 'packed'],
+                        help="The input format, as for SO_Run.py")
+    parser.add_argument('--config', '-c', type=str, dest='config', action='store',
+                        default='../Resources/config_files/en_SO_Calc.ini',
+                        help="The config file; the settings that are not in the grid are taken from it")
+    parser.add_argument('--cutoff', '-cf', type=float, dest='cutoff', action='store',
+                        default=0.0,
+                        help="The cutoff value")
+    parser.add_argument('--gold', '-g', type=str, dest='gold', action='store',
+                        default='',
+                        help="The gold file path")
+    parser.add_argument('--grid', '-gr', type=str, dest='grid', action='append',
+                        default=[],
+                        help="""A setting and the values to try, e.g. adj_multiplier=1,1.5,2; it can be given
+                                several times, and every combination of the values is tried""")
+    parser.add_argument('--feature_cache', '-fc', type=str, dest='feature_cache', action='store',
+                        default='',
+                        help="""A feature cache file (.npz). If it holds the features of the same config settings
+                                and dictionaries, the input is not scored again""")
+    parser.add_argument('--output', '-o', type=str, dest='output', action='store',
+                        default='grid_search.csv',
+                        help="The grid_search.csv path")
+    args = parser.parse_args()
+    return args
+
+
+def get_features_fingerprint(calculator):
+    '''
+    A hash of everything the features depend on, apart from the documents:
+    the settings of the config that are not in GRID_SETTINGS and the dictionaries.
+    :param calculator: the SentimentCalculator
+    :return: the fingerprint
+    '''
+    settings = sorted(item for item in calculator.config.items() if item[0] not in GRID_SETTINGS)
+    text = str(FEATURES_VERSION) + "\n" + repr(settings) + "\n" + calculator.get_lexicon_fingerprint()
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def extract_features(calculator, documents):
+    '''
+    Score the documents once, and keep the feature rows of their SO carrying words in columns.
+    The rows are ordered so that the rows of each document, and within it the rows of each
+    (part of speech, lemma) group (whose repetitions lower the SO), follow each other.
+    :param calculator: the SentimentCalculator, with the config the features are extracted with
+    :param documents: the documents, as for SO_Run.calculate_sentiment
+    :return: a dictionary of column name -> array: the columns in SO_Calc.FEATURE_COLUMNS (with lemma
+             replaced by group, the number of the group of the row), document (the number of the document
+             of the row), and names and scores, the name and SO of each document
+    '''
+    calculator.record_features()
+    names = []
+    scores = []
+    documents_column = []
+    groups = []
+    group_count = 0
+    columns = dict((name, []) for name in SO_Calc.FEATURE_COLUMNS if name != "lemma")
+    for document in documents:
+        result = SO_Run.score_document(calculator, document, io.StringIO(), io.StringIO(), None, save_adverbs=False)
+        group_numbers = {}
+        for row in calculator.features:
+            key = (row[0], row[1])  # (POS, lemma)
+            if key not in group_numbers:
+                group_numbers[key] = group_count
+                group_count += 1
+            groups.append(group_numbers[key])
+        for row in calculator.features:
+            documents_column.append(len(names))
+            for (name, value) in zip(SO_Calc.FEATURE_COLUMNS, row):
+                if name != "lemma":
+                    columns[name].append(value)
+        names.append(result.name)
+        scores.append(result.text_SO)
+    # the group numbers grow by document, so sorting by group keeps the documents in order
+    order = numpy.argsort(numpy.array(groups, dtype=numpy.int64), kind="mergesort")
+    features = {"group": numpy.array(groups, dtype=numpy.int64)[order],
+                "document": numpy.array(documents_column, dtype=numpy.int64)[order],
+                "names": numpy.array(names, dtype=str),
+                "scores": numpy.array(scores, dtype=numpy.float64)}
+    for name in columns:
+        if name in ["POS"]:
+            dtype = numpy.int8
+        elif name in ["negated", "capitalized", "exclamation", "nullified"]:
+            dtype = bool
+        else:
+            dtype = numpy.float64
+        features[name] = numpy.array(columns[name], dtype=dtype)[order]
+    return features
+
+
+def save_features(features, fingerprint, feature_cache_path):
+    '''
+    Save the features to a feature cache.
+    :param features: the features, see extract_features
+    :param fingerprint: their fingerprint, see get_features_fingerprint
+    :param feature_cache_path: the feature cache (.npz) path
+    :return: None
+    '''
+    with open(feature_cache_path, "wb") as feature_cache:
+        numpy.savez(feature_cache, fingerprint=numpy.array(fingerprint), **features)
+
+
+def load_features(feature_cache_path, fingerprint):
+    '''
+    Load the features from a feature cache.
+    :param feature_cache_path: the feature cache (.npz) path
+    :param fingerprint: the fingerprint the features must have
+    :return: the features, or None if there is no feature cache or it holds other features
+    '''
+    if not os.path.isfile(feature_cache_path):
+        return None
+    with numpy.load(feature_cache_path) as feature_cache:
+        if str(feature_cache["fingerprint"]) != fingerprint:
+            return None
+        return dict((name, feature_cache[name]) for name in feature_cache.files if name != "fingerprint")
+
+
+def read_grid(grid_options, config):
+    '''
+    Make every combination of the values of the grid.
+    :param grid_options: the --grid options, e.g. ["adj_multiplier=1,1.5,2", "neg_multiplier=1,1.5"]
+    :param config: the config, for the settings that are not in the grid
+    :return: the names of the settings in the grid, and a dictionary of each name in GRID_SETTINGS ->
+             an array of its value in each combination
+    '''
+    names = []
+    values = []
+    for option in grid_options:
+        (name, option_values) = option.split("=", 1)
+        name = name.strip()
+        if name not in GRID_SETTINGS:
+            raise ValueError(name + " is not one of the grid settings: " + ", ".join(GRID_SETTINGS))
+        names.append(name)
+        values.append([float(value) for value in option_values.split(",")])
+    combinations = list(itertools.product(*values))
+    settings = {}
+    for name in GRID_SETTINGS:
+        if name in names:
+            settings[name] = numpy.array([combination[names.index(name)] for combination in combinations], dtype=numpy.float64)
+        else:
+            settings[name] = numpy.full(len(combinations), float(config[name]))
+    return names, settings
+
+
+def calculate_word_SO(features, settings, config):
+    '''
+    Calculate the SO of every SO carrying word for some combinations of settings, as
+    SentimentCalculator.get_noun_SO (and the other calculators) and apply_weights do.
+    :param features: the features, see extract_features
+    :param settings: a dictionary of each name in GRID_SETTINGS -> an array of its value in each combination
+    :param config: the config, for the settings that are not in the grid
+    :return: an array of the final SO of each word (one row for each combination), and an array of
+             whether each word is counted in the average of its document
+    '''
+    POS = features["POS"]
+    SO = features["SO"]
+    int_modifier = features["int_modifier"]
+    intensified = int_modifier != 0
+    row_settings = dict((name, settings[name][:, None]) for name in GRID_SETTINGS)
+
+    word_SO = numpy.where(intensified, SO * (1 + int_modifier), SO)[None, :]
+    if config["use_blocking"]:
+        blocked = features["blocker_strength"][None, :] >= row_settings["blocker_cutoff"]
+        word_SO = numpy.where(blocked & ~intensified, 0.0, word_SO)
+
+    if config["use_negation"]:
+        negated = features["negated"]
+        neg_shift_by_POS = numpy.column_stack([settings["noun_neg_shift"], settings["verb_neg_shift"],
+                                               settings["adj_neg_shift"], settings["adv_neg_shift"]])
+        neg_shift = neg_shift_by_POS[:, POS]
+        if config["polarity_switch_neg"]:
+            shift = numpy.abs(word_SO) * 2
+        elif config["limit_shift"]:
+            shift = numpy.where(numpy.abs(word_SO) * 2 < neg_shift, numpy.abs(word_SO) * 2, neg_shift)
+        else:
+            shift = neg_shift + 0 * word_SO
+        if config["neg_negation_nullification"]:
+            shift = numpy.where(word_SO < 0, numpy.abs(word_SO), shift)
+        shifted_SO = numpy.where(word_SO > 0, word_SO - shift, numpy.where(word_SO < 0, word_SO + shift, word_SO))
+        negex = features["int_modifier_negex"]
+        shifted_SO = numpy.where(negex != 0, shifted_SO * (1 + negex), shifted_SO)
+        word_SO = numpy.where(negated, shifted_SO, word_SO)
+
+    word_SO = numpy.where(features["capitalized"], word_SO * row_settings["capital_modifier"], word_SO)
+    word_SO = numpy.where(features["exclamation"], word_SO * row_settings["exclam_modifier"], word_SO)
+    word_SO = word_SO * features["highlighter"]
+    word_SO = numpy.where(features["nullified"], 0.0, word_SO)
+
+    # adjectives are always counted, the others only if their SO is not 0 at this point
+    counted = (word_SO != 0) | (POS == 2)
+    word_SO = numpy.where(intensified, word_SO * row_settings["int_multiplier"], word_SO)
+    counts = numpy.cumsum(counted, axis=1)
+    group = features["group"]
+    group_starts = numpy.flatnonzero(numpy.concatenate(([True], group[1:] != group[:-1])))
+    group_start = numpy.repeat(group_starts, numpy.diff(numpy.append(group_starts, len(group))))
+    repetition = counts - (counts - counted)[:, group_start]  # the number of counted words of the group so far
+    repeated = counted & (repetition > 1) & ~features["negated"]
+    if config["use_word_counts_lower"]:
+        word_SO = numpy.where(repeated, word_SO / numpy.maximum(repetition, 1), word_SO)
+    if config["use_word_counts_block"]:
+        word_SO = numpy.where(repeated, 0.0, word_SO)
+    multiplier_by_POS = numpy.column_stack([settings["noun_multiplier"], settings["verb_multiplier"],
+                                            settings["adj_multiplier"], settings["adv_multiplier"]])
+    word_SO = word_SO * multiplier_by_POS[:, POS]
+
+    if config["use_heavy_negation"]:
+        word_SO = numpy.where(word_SO < 0, word_SO * row_settings["neg_multiplier"], word_SO)
+    word_SO = word_SO * features["weight"]
+    return word_SO, counted
+
+
+def calculate_scores(features, settings, config):
+    '''
+    Calculate the SO of every document for each combination of settings.
+    :param features: the features, see extract_features
+    :param settings: a dictionary of each name in GRID_SETTINGS -> an array of its value in each combination
+    :param config: the config, for the settings that are not in the grid
+    :return: an array of the SO of each document, with one row for each combination
+    '''
+    combination_count = len(settings[GRID_SETTINGS[0]])
+    document_count = len(features["names"])
+    scores = numpy.zeros((combination_count, document_count))
+    document = features["document"]
+    if len(document) == 0:
+        return scores
+    document_starts = numpy.flatnonzero(numpy.concatenate(([True], document[1:] != document[:-1])))
+    chunk_size = max(1, MAX_CHUNK_CELLS // len(document))
+    for start in range(0, combination_count, chunk_size):
+        chunk = dict((name, settings[name][start:start + chunk_size]) for name in GRID_SETTINGS)
+        (word_SO, counted) = calculate_word_SO(features, chunk, config)
+        totals = numpy.add.reduceat(word_SO, document_starts, axis=1)
+        counts = numpy.add.reduceat(counted.astype(numpy.int64), document_starts, axis=1)
+        scores[start:start + chunk_size, document[document_starts]] = totals / numpy.maximum(counts, 1)
+    return scores
+
+
+def evaluate_scores(scores, names, gold_dct, cutoff, pos_mark="positive", neg_mark="negative"):
+    '''
+    Evaluate the SO of the documents for each combination of settings against the gold data.
+    :param scores: the SO of each document, with one row for each combination
+    :param names: the name of each document
+    :param gold_dct: the gold dictionary, see SO_Run.read_gold_file
+    :param cutoff: cutoff value
+    :param pos_mark: the positive gold label
+    :param neg_mark: the negative gold label
+    :return: a dictionary of Accuracy, Positive_Accuracy and Negative_Accuracy -> an array of the value for each combination
+    '''
+    gold = [gold_dct.get(name) for name in names]
+    positive = numpy.array([label == pos_mark for label in gold], dtype=bool)
+    negative = numpy.array([label == neg_mark for label in gold], dtype=bool)
+    positive_correct = ((scores > cutoff) & positive).sum(axis=1)
+    negative_correct = ((scores < cutoff) & negative).sum(axis=1)
+    positive_total = positive.sum()
+    negative_total = negative.sum()
+    return {"Accuracy": (positive_correct + negative_correct) / float(max(1, positive_total + negative_total)),
+            "Positive_Accuracy": positive_correct / float(max(1, positive_total)),
+            "Negative_Accuracy": negative_correct / float(max(1, negative_total))}
+
+
+def write_grid_search(grid_names, settings, evaluation, grid_search_path):
+    '''
+    Write grid_search.csv, with the value of each setting of the grid and the accuracies, for each combination.
+    :param grid_names: the names of the settings in the grid
+    :param settings: the value of each setting in each combination
+    :param evaluation: the result of evaluate_scores
+    :param grid_search_path: grid_search.csv path
+    :return: None
+    '''
+    columns = grid_names + ["Accuracy", "Positive_Accuracy", "Negative_Accuracy"]
+    table = numpy.column_stack([settings[name] for name in grid_names] +
+                               [evaluation[name] for name in ["Accuracy", "Positive_Accuracy", "Negative_Accuracy"]])
+    numpy.savetxt(grid_search_path, table, fmt="%.10g", delimiter=",", header=",".join(columns), comments="")
+
+
+def main():
+    args = get_command_arguments()
+    calculator = SO_Calc.SentimentCalculator(args.config)
+    config = calculator.config
+    fingerprint = get_features_fingerprint(calculator)
+    features = None
+    if args.feature_cache:
+        features = load_features(args.feature_cache, fingerprint)
+    if features is None:
+        start_time = time.time()
+        if args.input_format == "files":
+            documents = SO_Run.list_files(args.input)
+        elif args.input_format == "packed":
+            SO_Run.packed_corpus = SO_Pack.PackedCorpus(args.input)
+            documents = range(len(SO_Run.packed_corpus))
+        else:
+            documents = SO_Run.read_documents(args.input, args.input_format)
+        features = extract_features(calculator, documents)
+        print("Extracted the features of %d words of %d documents in %.2f seconds"
+              % (len(features["SO"]), len(features["names"]), time.time() - start_time))
+        if args.feature_cache:
+            save_features(features, fingerprint, args.feature_cache)
+    else:
+        print("Loaded the features of %d words of %d documents" % (len(features["SO"]), len(features["names"])))
+
+    # the features give back the scores of the config itself
+    config_settings = dict((name, numpy.array([float(config[name])])) for name in GRID_SETTINGS)
+    difference = numpy.abs(calculate_scores(features, config_settings, config)[0] - features["scores"])
+    if len(difference) and difference.max() > 1e-9:
+        print("Warning: the features differ from the scores of the config by up to %g" % difference.max())
+
+    gold_file = args.gold
+    if gold_file == "" and args.input_format == "files":
+        gold_file = SO_Run.create_gold_file(args.input)
+    if gold_file == "":
+        print("The grid search needs gold data, give the gold file path with -g.")
+        return
+    gold_dct = SO_Run.read_gold_file(gold_file)
+
+    (grid_names, settings) = read_grid(args.grid, config)
+    start_time = time.time()
+    scores = calculate_scores(features, settings, config)
+    evaluation = evaluate_scores(scores, features["names"], gold_dct, args.cutoff)
+    print("Evaluated %d combinations of settings in %.2f seconds" % (len(scores), time.time() - start_time))
+    write_grid_search(grid_names, settings, evaluation, args.output)
+    best = int(numpy.argmax(evaluation["Accuracy"]))
+    print("Best: " + ", ".join("%s=%g" % (name, settings[name][best]) for name in grid_names) +
+          " (accuracy %.1f %%, positive %.1f %%, negative %.1f %%)" % (100.0 * evaluation["Accuracy"][best],
+          100.0 * evaluation["Positive_Accuracy"][best], 100.0 * evaluation["Negative_Accuracy"][best]))
+
+if __name__ == "__main__":
+    main()
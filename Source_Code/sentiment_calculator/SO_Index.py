@@ -0,0 +1,164 @@
+import sqlite3
+import pickle
+import array
+
+# The lemma index keeps, for every scored document, the dictionary keys that were
+# looked up while scoring it (single words, the key words of the multi-word
+# entries and the intensifiers, whether they were found or not) and its SO, in
+# an SQLite file, together with the dictionaries the documents were scored with.
+# A document can only get another SO from an edit of the dictionaries if it
+# looked up one of the edited keys, so after an edit only those documents need
+# to be scored again.
+
+INDEX_VERSION = 1  # increase whenever the layout of the lemma index changes
+
+
+def get_changed_keys(old_entries, new_entries):
+    '''
+    Compare two versions of the dictionaries.
+    :param old_entries: the entries of the old dictionaries, see SentimentCalculator.get_lexicon_entries
+    :param new_entries: the entries of the new dictionaries
+    :return: the set of (dictionary name, key) that were added, removed or changed
+    '''
+    changed = set()
+    for name in set(old_entries) | set(new_entries):
+        old_dictionary = old_entries.get(name, {})
+        new_dictionary = new_entries.get(name, {})
+        for key in set(old_dictionary) | set(new_dictionary):
+            if old_dictionary.get(key) != new_dictionary.get(key):
+                changed.add((name, key))
+    return changed
+
+
+class LemmaIndex():
+    '''
+    A persistent index from dictionary keys to the documents that looked them up.
+    '''
+
+    def __init__(self, index_path, commit_every=1000):
+        '''
+        Open (or create) a lemma index.
+        :param index_path: the index file path
+        :param commit_every: the number of added documents after which they are written to disk
+        '''
+        self.connection = sqlite3.connect(index_path)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS settings (name TEXT PRIMARY KEY, value BLOB)")
+        # the keys and the documents are numbered, and the lookups are stored as pairs of numbers;
+        # the lookups of each document are also kept with it, so that they can be removed when it is indexed again
+        self.connection.execute("CREATE TABLE IF NOT EXISTS lemmas (lemma_id INTEGER PRIMARY KEY, dictionary TEXT, lemma TEXT)")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS documents (document_id INTEGER PRIMARY KEY, document TEXT UNIQUE, "
+                                "SO REAL, lemma_ids BLOB)")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS lookups (lemma_id INTEGER, document_id INTEGER, "
+                                "PRIMARY KEY (lemma_id, document_id)) WITHOUT ROWID")
+        version = self.get_setting("version")
+        if version is None:
+            self.set_setting("version", INDEX_VERSION)
+        elif version != INDEX_VERSION:
+            self.connection.close()
+            raise ValueError(index_path + " was made by another version, delete it to build it again")
+        self.lemma_ids = {}  # (dictionary name, key) -> lemma_id
+        for (lemma_id, dictionary, lemma) in self.connection.execute("SELECT lemma_id, dictionary, lemma FROM lemmas"):
+            self.lemma_ids[(dictionary, lemma)] = lemma_id
+        self.commit_every = commit_every
+        self.uncommitted = 0
+
+    def get_setting(self, name):
+        '''
+        :param name: the setting name
+        :return: the value of the setting, or None if it is not set
+        '''
+        row = self.connection.execute("SELECT value FROM settings WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            return None
+        return pickle.loads(row[0])
+
+    def set_setting(self, name, value):
+        '''
+        :param name: the setting name
+        :param value: its value, which is pickled
+        :return: None
+        '''
+        self.connection.execute("INSERT OR REPLACE INTO settings VALUES (?, ?)", (name, pickle.dumps(value, pickle.HIGHEST_PROTOCOL)))
+
+    def get_lexicon(self):
+        '''
+        The config and dictionaries the indexed documents were scored with.
+        :return: a list of the config fingerprint and the dictionary entries, or None for a new index
+        '''
+        return self.get_setting("lexicon")
+
+    def set_lexicon(self, config_fingerprint, lexicon_entries):
+        '''
+        Record the config and dictionaries the indexed documents were scored with.
+        :param config_fingerprint: the fingerprint of the config, see SentimentCalculator.get_config_fingerprint
+        :param lexicon_entries: the dictionary entries, see SentimentCalculator.get_lexicon_entries
+        :return: None
+        '''
+        self.set_setting("lexicon", [config_fingerprint, lexicon_entries])
+
+    def get_SO(self, document):
+        '''
+        :param document: the document name
+        :return: the SO of the document when it was last indexed, or None if it is not in the index
+        '''
+        row = self.connection.execute("SELECT SO FROM documents WHERE document = ?", (document,)).fetchone()
+        if row is None:
+            return None
+        return row[0]
+
+    def get_lemma_id(self, key):
+        '''
+        :param key: a (dictionary name, key) pair
+        :return: its number, numbering it if it is new
+        '''
+        if key not in self.lemma_ids:
+            self.lemma_ids[key] = self.connection.execute("INSERT INTO lemmas (dictionary, lemma) VALUES (?, ?)", key).lastrowid
+        return self.lemma_ids[key]
+
+    def add_document(self, document, SO, lookups):
+        '''
+        Index a scored document, replacing what was indexed for it before.
+        :param document: the document name
+        :param SO: its SO
+        :param lookups: the (dictionary name, key) pairs looked up while scoring it, see SOResult.lookups
+        :return: None
+        '''
+        lemma_ids = array.array("q", [self.get_lemma_id(key) for key in lookups])
+        row = self.connection.execute("SELECT document_id, lemma_ids FROM documents WHERE document = ?", (document,)).fetchone()
+        if row is None:
+            document_id = self.connection.execute("INSERT INTO documents (document, SO, lemma_ids) VALUES (?, ?, ?)",
+                                                  (document, SO, lemma_ids.tobytes())).lastrowid
+        else:
+            document_id = row[0]
+            old_lemma_ids = array.array("q")
+            old_lemma_ids.frombytes(row[1])
+            self.connection.executemany("DELETE FROM lookups WHERE lemma_id = ? AND document_id = ?",
+                                        [(lemma_id, document_id) for lemma_id in old_lemma_ids])
+            self.connection.execute("UPDATE documents SET SO = ?, lemma_ids = ? WHERE document_id = ?",
+                                    (SO, lemma_ids.tobytes(), document_id))
+        self.connection.executemany("INSERT INTO lookups VALUES (?, ?)", [(lemma_id, document_id) for lemma_id in lemma_ids])
+        self.uncommitted += 1
+        if self.uncommitted >= self.commit_every:
+            self.connection.commit()
+            self.uncommitted = 0
+
+    def find_documents(self, keys):
+        '''
+        Find the documents that looked up any of the given keys.
+        :param keys: (dictionary name, key) pairs, e.g. from get_changed_keys
+        :return: the set of document names
+        '''
+        documents = set()
+        for key in keys:
+            if key in self.lemma_ids:
+                for row in self.connection.execute("SELECT document FROM lookups JOIN documents USING (document_id) "
+                                                   "WHERE lemma_id = ?", (self.lemma_ids[key],)):
+                    documents.add(row[0])
+        return documents
+
+    def close(self):
+        '''
+        Write the new documents to disk and close the index.
+        '''
+        self.connection.commit()
+        self.connection.close()
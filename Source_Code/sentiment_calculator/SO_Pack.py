@@ -0,0 +1,227 @@
+import os
+import sys
+import mmap
+import array
+import pickle
+import struct
+import tempfile
+import SO_Calc
+
+# A packed corpus holds many SO-CAL preprocessed documents in one file that is
+# memory-mapped when read. The tokens of every document are stored one after the
+# other in fixed-width arrays of word ids, tag ids and flags; the newline
+# boundaries and the XML tags of each document are stored as token offsets, and
+# a document index gives where each document starts in each of these arrays.
+# The arrays come first; they are followed by a pickled table (the vocabulary,
+# tags, XML tags, document names and the position of every array) and a
+# trailer with the position of that table.
+
+PACK_VERSION = 1  # increase whenever the layout of the packed corpus changes
+PACK_MAGIC = b"SOCALPCK"
+PACK_TRAILER = struct.Struct("<Q8s")  # the position of the table, then PACK_MAGIC
+PACK_ARRAYS = [("word_ids", "I"), ("tag_ids", "H"), ("simple", "B"),
+               ("boundaries", "I"), ("XML_positions", "I"), ("XML_ids", "I"),
+               ("doc_tokens", "Q"), ("doc_boundaries", "Q"), ("doc_XML", "Q")]
+
+
+def get_id(table, ids, value):
+    '''
+    The position of a value in a table, adding it to the table if needed.
+    :param table: the list of values
+    :param ids: the dictionary of value -> position in table
+    :param value: the value
+    :return: the position of the value
+    '''
+    if value not in ids:
+        ids[value] = len(table)
+        table.append(value)
+    return ids[value]
+
+
+def pack_corpus(documents, pack_path):
+    '''
+    Pack preprocessed documents into one packed corpus file.
+    The documents are read one at a time and their arrays are written to temporary files
+    next to the pack, so only the vocabulary and the document names are held in memory.
+    The words and XML tags are split exactly as SentimentCalculator.fill_text_and_weights does,
+    and the XML tags are stored as they are, since their weights depend on the config.
+    :param documents: an iterable of (document name, lines of the document)
+    :param pack_path: the packed corpus path
+    :return: the number of packed documents
+    '''
+    folder = os.path.dirname(os.path.abspath(pack_path))
+    words = []
+    word_numbers = {}
+    tags = []
+    tag_numbers = {}
+    XML_words = []
+    XML_numbers = {}
+    names = []
+    counts = {"doc_tokens": 0, "doc_boundaries": 0, "doc_XML": 0}
+    parts = {}
+    try:
+        for (name, typecode) in PACK_ARRAYS:
+            parts[name] = tempfile.TemporaryFile(dir=folder)
+        for (name, lines) in documents:
+            names.append(name)
+            for index_name in ["doc_tokens", "doc_boundaries", "doc_XML"]:
+                parts[index_name].write(array.array("Q", [counts[index_name]]).tobytes())
+            word_ids = array.array("I")
+            tag_ids = array.array("H")
+            simple = bytearray()
+            boundaries = array.array("I")
+            XML_positions = array.array("I")
+            XML_ids = array.array("I")
+            for line in lines:
+                for word in SO_Calc.split_line(line):
+                    if word[0] == "<" and word[-1] == ">":
+                        XML_positions.append(len(word_ids))
+                        XML_ids.append(get_id(XML_words, XML_numbers, word))
+                    elif "/" in word:
+                        token = word.split("/")
+                        word_ids.append(get_id(words, word_numbers, token[0]))
+                        tag_ids.append(get_id(tags, tag_numbers, token[1]))
+                        simple.append(len(token) == 2)
+                boundaries.append(len(word_ids))
+            parts["word_ids"].write(word_ids.tobytes())
+            parts["tag_ids"].write(tag_ids.tobytes())
+            parts["simple"].write(simple)
+            parts["boundaries"].write(boundaries.tobytes())
+            parts["XML_positions"].write(XML_positions.tobytes())
+            parts["XML_ids"].write(XML_ids.tobytes())
+            counts["doc_tokens"] += len(word_ids)
+            counts["doc_boundaries"] += len(boundaries)
+            counts["doc_XML"] += len(XML_ids)
+        for index_name in ["doc_tokens", "doc_boundaries", "doc_XML"]:  # the end of the last document
+            parts[index_name].write(array.array("Q", [counts[index_name]]).tobytes())
+
+        with tempfile.NamedTemporaryFile("wb", dir=folder, suffix=".pack", delete=False) as pack:
+            positions = {}
+            for (name, typecode) in PACK_ARRAYS:
+                part = parts[name]
+                length = part.tell()
+                part.seek(0)
+                positions[name] = (pack.tell(), length, typecode)
+                while True:
+                    block = part.read(1 << 20)
+                    if not block: break
+                    pack.write(block)
+                pack.write(b"\0" * (-pack.tell() % 8))  # keep every array aligned
+            table_position = pack.tell()
+            table = {"version": PACK_VERSION, "byteorder": sys.byteorder, "arrays": positions,
+                     "words": words, "tags": tags, "XML_words": XML_words, "names": names}
+            pickle.dump(table, pack, pickle.HIGHEST_PROTOCOL)
+            pack.write(PACK_TRAILER.pack(table_position, PACK_MAGIC))
+        os.replace(pack.name, pack_path)
+    finally:
+        for part in parts.values():
+            part.close()
+    return len(names)
+
+
+class PackedCorpus():
+    '''
+    A packed corpus, memory-mapped for reading.
+    The arrays are read in place through memoryviews, so a document is not copied until it is scored,
+    and any document can be read directly by its position or name.
+    '''
+
+    def __init__(self, pack_path):
+        '''
+        Open a packed corpus.
+        :param pack_path: the packed corpus path
+        '''
+        self.pack_path = pack_path
+        self.pack_file = open(pack_path, "rb")
+        self.data = mmap.mmap(self.pack_file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.data) < PACK_TRAILER.size:
+            raise ValueError(pack_path + " is not a packed corpus")
+        (table_position, magic) = PACK_TRAILER.unpack(self.data[-PACK_TRAILER.size:])
+        if magic != PACK_MAGIC:
+            raise ValueError(pack_path + " is not a packed corpus")
+        table = pickle.loads(self.data[table_position:-PACK_TRAILER.size])
+        if table["version"] != PACK_VERSION or table["byteorder"] != sys.byteorder:
+            raise ValueError(pack_path + " was packed by another version or on another platform, pack it again")
+        self.words = table["words"]
+        self.words_lower = [word.lower() for word in self.words]
+        self.words_caps = [word.isupper() for word in self.words]
+        self.tags = table["tags"]
+        self.XML_words = table["XML_words"]
+        self.names = table["names"]
+        self.name_numbers = None
+        self.view = memoryview(self.data)
+        self.arrays = {}
+        for name in table["arrays"]:
+            (position, length, typecode) = table["arrays"][name]
+            self.arrays[name] = self.view[position:position + length].cast(typecode)
+
+    def __len__(self):
+        return len(self.names)
+
+    def get_index(self, name):
+        '''
+        Find a document by its name.
+        :param name: the document name
+        :return: the position of the document in the corpus
+        '''
+        if self.name_numbers is None:
+            self.name_numbers = dict((self.names[i], i) for i in range(len(self.names)))
+        return self.name_numbers[name]
+
+    def get_document(self, doc_index):
+        '''
+        Read a document in place.
+        :param doc_index: the position of the document in the corpus
+        :return: memoryviews of its word ids, tag ids, simple flags, boundaries, XML tag positions and XML tag ids
+        '''
+        arrays = self.arrays
+        token_start = arrays["doc_tokens"][doc_index]
+        token_end = arrays["doc_tokens"][doc_index + 1]
+        boundary_start = arrays["doc_boundaries"][doc_index]
+        boundary_end = arrays["doc_boundaries"][doc_index + 1]
+        XML_start = arrays["doc_XML"][doc_index]
+        XML_end = arrays["doc_XML"][doc_index + 1]
+        return (arrays["word_ids"][token_start:token_end],
+                arrays["tag_ids"][token_start:token_end],
+                arrays["simple"][token_start:token_end],
+                arrays["boundaries"][boundary_start:boundary_end],
+                arrays["XML_positions"][XML_start:XML_end],
+                arrays["XML_ids"][XML_start:XML_end])
+
+    def get_document_lines(self, doc_index):
+        '''
+        Rebuild the text of a document, as lines of word/tag pairs and XML tags that
+        fill_text_and_weights reads the same way as the packed document.
+        Words that had more than one "/" keep only their word and tag, followed by a "/".
+        :param doc_index: the position of the document in the corpus
+        :return: the list of lines
+        '''
+        (word_ids, tag_ids, simple, boundaries, XML_positions, XML_ids) = self.get_document(doc_index)
+        lines = []
+        token = 0
+        XML = 0
+        for boundary in boundaries:
+            line = []
+            while token < boundary or (XML < len(XML_ids) and XML_positions[XML] <= boundary):
+                if XML < len(XML_ids) and XML_positions[XML] <= token:
+                    line.append(self.XML_words[XML_ids[XML]])
+                    XML += 1
+                else:
+                    word = self.words[word_ids[token]] + "/" + self.tags[tag_ids[token]]
+                    if not simple[token]:
+                        word += "/"
+                    line.append(word)
+                    token += 1
+            lines.append(" ".join(line))
+        return lines
+
+    def close(self):
+        '''
+        Release the memory map. The memoryviews given by get_document must not be used afterwards.
+        '''
+        for name in self.arrays:
+            self.arrays[name].release()
+        self.arrays = {}
+        self.view.release()
+        self.data.close()
+        self.pack_file.close()
@@ -0,0 +1,157 @@
+import argparse
+import os
+import sys
+import time
+import unidecode
+import SO_Calc
+import SO_Run
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "text_preprocessing"))
+import preprocess
+
+# Preprocessing and scoring in one pass. The raw files are annotated by the
+# Stanford CoreNLP server (see text_preprocessing/preprocess.py), and the words and
+# tags of each file go to the sentiment calculator as (word, tag) tokens as soon as
+# the file is annotated, without writing word/TAG files and reading them back. The
+# annotation requests stay in flight while a file is scored, so the two stages
+# overlap. Since the tokens are never joined with "/" and split again, a word that
+# contains "/" (e.g. a URL or 1/2) or spaces stays 1 scored word.
+# The preprocessed files can still be written, with --preprocessed_output.
+
+
+def get_command_arguments():
+    '''
+    Read command line input and set values to arguments.
+    :return: a list of arguments
+    '''
+    parser = argparse.ArgumentParser(description='SFU Sentiment Calculator, from raw text')
+    parser.add_argument('--input', '-i', type=str, dest='input_path', action='store',
+                        default='../Sample/input/Raw_Text/BOOKS',
+                        help="The input file or folder, of raw text")
+
+    parser.add_argument('--output', '-o', type=str, dest='output', action='store',
+                        default='../Sample/output/SO_CAL_Output/BOOKS',
+                        help="The output folder")
+
+    parser.add_argument('--preprocessed_output', '-po', type=str, dest='output_path', action='store',
+                        default='',
+                        help="The folder to also write the preprocessed files into (by default, none are written)")
+
+    parser.add_argument('--config', '-c', type=str, dest='config', action='store',
+                        default='../Resources/config_files/en_SO_Calc.ini',
+                        help="The configuration file for SO-CAL")
+
+    parser.add_argument('--cutoff', '-cf', type=float, dest='cutoff', action='store',
+                        default=0.0,
+                        help="The threshold for sentiment distinction")
+
+    parser.add_argument('--gold', '-g', type=str, dest='gold', action='store',
+                        default='',
+                        help="""The gold file, by default made from the input file names, see SO_Run.py
+                             """)
+
+    parser.add_argument('--server', '-s', type=str, dest='server_url', action='store',
+                        default='http://localhost:9000',
+                        help="The URL of the Stanford CoreNLP server")
+
+    parser.add_argument('--concurrency', '-n', type=int, dest='concurrency', action='store',
+                        default=1,
+                        help="The number of annotation requests to keep in flight at once")
+
+    parser.add_argument('--timeout', '-t', type=float, dest='timeout', action='store',
+                        default=60.0,
+                        help="The timeout of each annotation request in seconds")
+
+    parser.add_argument('--batch_tokens', '-b', type=int, dest='batch_tokens', action='store',
+                        default=0,
+                        help="The most tokens to send in one request, to send many small files at once (0 for 1 file per request)")
+
+    parser.add_argument('--server_timeout', '-st', type=float, dest='server_timeout', action='store',
+                        default=10.0,
+                        help="The -timeout of the Stanford CoreNLP server in seconds, used with --batch_tokens")
+
+    parser.add_argument('--chunk_tokens', '-k', type=int, dest='chunk_tokens', action='store',
+                        default=0,
+                        help="The number of tokens of the chunks that large files are split into (0 to send each file whole)")
+
+    parser.add_argument('--annotation_cache', '-ac', type=str, dest='cache_path', action='store',
+                        default='',
+                        help="The path of an annotation cache file, to annotate only texts not seen before")
+
+    parser.add_argument('--cache_size', '-cs', type=float, dest='cache_size', action='store',
+                        default=0,
+                        help="The most megabytes of annotations to keep in the annotation cache (0 for no bound)")
+
+    parser.add_argument('--server_version', '-v', type=str, dest='server_version', action='store',
+                        default='',
+                        help="The version of the Stanford CoreNLP server, which the annotation cache is keyed by")
+
+    parser.add_argument('--annotators', '-a', type=str, dest='annotators', action='store',
+                        default='tokenize,ssplit,pos',
+                        help="The Stanford CoreNLP annotators, which must include pos")
+
+    parser.set_defaults(log_path='')
+    return parser.parse_args()
+
+
+def get_tokens(sentences):
+    '''
+    Turn the annotated sentences of a file into tokens, as the preprocessed file would give them.
+    :param sentences: the sentences of json formatted data generated by CoreNLP
+    :return: a list of (word, tag) tokens, and the token index after each sentence
+    '''
+    tokens = []
+    boundaries = []
+    for sent in sentences:
+        for t in sent['tokens']:
+            tokens.append((unidecode.unidecode(t['originalText']), unidecode.unidecode(t['pos'])))
+        boundaries.append(len(tokens))
+    return tokens, boundaries
+
+
+def main():
+    pos_mark = "positive"
+    neg_mark = "negative"
+
+    args = get_command_arguments()
+    output_folder = args.output
+    if os.path.exists(output_folder) == False:
+        os.mkdir(output_folder)
+    gold_file = args.gold
+    if gold_file == "":
+        gold_file = SO_Run.create_gold_file(args.input_path)
+
+    basicout_path = os.path.abspath(output_folder) + "/output.txt"
+    richout_path = os.path.abspath(output_folder) + "/richout.txt"
+    file_sentiment_path = os.path.abspath(output_folder) + "/file_sentiment.csv"
+    prediction_accuracy_path = os.path.abspath(output_folder) + "/prediction_accuracy.txt"
+    richout_json = os.path.abspath(output_folder) + "/rich_output.jsonl"
+    open(file_sentiment_path, 'w').close()
+    open(prediction_accuracy_path, 'w').close()
+
+    calculator = SO_Calc.SentimentCalculator(args.config)
+    preprocessor = preprocess.Preprocess(args)
+    start_time = time.time()
+    with open(basicout_path, "w") as basicout, open(richout_path, "w") as richout, open(richout_json, "w") as rich_json:
+        def score_sentences(file_name, input_file_path, sentences):
+            (tokens, boundaries) = get_tokens(sentences)
+            result = calculator.score(tokens, boundaries=boundaries, name=file_name)
+            calculator.write_result(result, basicout, richout, True, rich_json)
+
+        preprocessor.document_handler = score_sentences
+        preprocessor.pos_tagging()
+    run_time = time.time() - start_time
+    print("Annotated and scored %d documents in %.2f seconds (%.1f docs/sec)"
+          % (preprocessor.files_done, run_time, preprocessor.files_done / max(run_time, 1e-9)))
+
+    SO_Run.generate_file_sentiment(basicout_path, args.cutoff, file_sentiment_path)
+    if gold_file == "":
+        print("Without gold data, the prediction accuracy will not be generated, see SO_Run.py.")
+    else:
+        gold_dct = SO_Run.read_gold_file(gold_file)
+        SO_Run.write_prediction_accuracy(file_sentiment_path, gold_dct, prediction_accuracy_path, pos_mark, neg_mark)
+
+    print("Find all the output in: " + output_folder)
+
+if __name__ == "__main__":
+    main()
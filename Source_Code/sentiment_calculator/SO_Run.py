@@ -1,8 +1,18 @@
 import argparse
 import os
+import sys
 import csv
-from collections import OrderedDict
 import json
+import time
+import io
+import heapq
+import itertools
+import tempfile
+import multiprocessing
+import SO_Calc
+import SO_Pack
+import SO_Cache
+import SO_Index
 
 
 def get_command_arguments():
@@ -13,7 +23,22 @@ def get_command_arguments():
     parser = argparse.ArgumentParser(description='SFU Sentiment Calculator')
     parser.add_argument('--input', '-i', type=str, dest='input', action='store',
                         default='../Sample/output/Preprocessed_Output/BOOKS',
-                        help="The input file or folder, and the file should be SO_CAL preprocessed text")
+                        help="""The input file or folder, and the file should be SO_CAL preprocessed text.
+                                With --input_format jsonl or tsv, the corpus file, or - for stdin.
+                                With --input_format packed, the packed corpus file
+                             """)
+
+    parser.add_argument('--input_format', '-f', type=str, dest='input_format', action='store',
+                        default='files', choices=['files', 'jsonl', 'tsv', 'packed'],
+                        help="""files: one document per file (the default).
+                                jsonl: one {"id": ..., "text": ...} object per line, the lines of the text separated by newlines.
+                                tsv: one document per line, the id followed by the lines of the text, separated by tabs.
+                                packed: a packed corpus made with --pack
+                             """)
+
+    parser.add_argument('--pack', '-p', type=str, dest='pack', action='store',
+                        default='',
+                        help="Pack the input into this packed corpus file instead of scoring it")
 
     parser.add_argument('--output', '-o', type=str, dest='output', action='store',
                         default='../Sample/output/SO_CAL_Output/BOOKS',
@@ -32,6 +57,37 @@ def get_command_arguments():
                         help="""The gold file,
                                 but if your data files start with 'yes' or 'no', the gold file is not necessary
                              """)
+
+    parser.add_argument('--workers', '-w', type=int, dest='workers', action='store',
+                        default=1,
+                        help="The number of worker processes used to score the files")
+
+    parser.add_argument('--result_cache', '-r', type=str, dest='result_cache', action='store',
+                        default='',
+                        help="""A result cache file (created if needed). Documents already scored with the same
+                                config and dictionaries are taken from it instead of being scored again
+                             """)
+
+    parser.add_argument('--lemma_index', '-l', type=str, dest='lemma_index', action='store',
+                        default='',
+                        help="""A lemma index file (created if needed), updated with the dictionary entries
+                                looked up for each scored document
+                             """)
+
+    parser.add_argument('--rescore_changed', '-rc', dest='rescore_changed', action='store_true',
+                        help="""With --lemma_index, only score the documents that looked up a dictionary entry
+                                changed since they were indexed (or are not indexed yet), and write
+                                rescore_report.csv with their old and new scores
+                             """)
+
+    parser.add_argument('--sweep_cutoffs', '-sw', type=int, dest='sweep_cutoffs', action='store',
+                        default=0,
+                        help="""With gold data, also evaluate this many cutoffs, evenly spaced from the lowest
+                                score to the highest, write cutoff_sweep.csv and report the best cutoff (needs NumPy)
+                             """)
+
+    parser.add_argument('--sort_rich_output', '-s', dest='sort_rich_output', action='store_true',
+                        help="Sort rich_output.jsonl by file name once all the files are scored")
     args = parser.parse_args()
     return args
 
@@ -98,122 +154,549 @@ def generate_file_sentiment(basicout_path, cutoff, file_sentiment_path):
     :param file_sentiment_path: file_sentiment.csv path
     :return: None, but write into file_sentiment.csv
     '''
-    dct_lst = []
+    with open(basicout_path) as basic_output, open(file_sentiment_path, 'a') as csv_out:
+        fieldnames = ['File_Name', 'Sentiment', 'Score']
+        writer = csv.DictWriter(csv_out, fieldnames=fieldnames)
 
-    with open(basicout_path) as basic_output:
+        if os.stat(file_sentiment_path).st_size == 0: writer.writeheader()
         for r in basic_output:
-            file_score = r.strip().split()
+            file_score = r.rstrip("\n").rsplit("\t", 1)
             file = file_score[0]
             score = float(file_score[1])
-            if score < cutoff:
-                sentiment = "negative"
-            elif score > cutoff:
-                sentiment = "positive"
-            else:
-                sentiment = "neutral"
-            dct_lst.append({"File_Name":file, "Sentiment":sentiment, "Score":score})
+            writer.writerow({"File_Name":file, "Sentiment":get_sentiment(score, cutoff), "Score":score})
 
-    with open(file_sentiment_path, 'a') as csv_out:
-        fieldnames = ['File_Name', 'Sentiment', 'Score']
+
+def write_prediction_accuracy(file_sentiment_path, gold_dct, prediction_accuracy_path, pos_mark="positive", neg_mark="negative"):
+    '''
+    Compare the predicted sentiment of each file with the gold data.
+    :param file_sentiment_path: file_sentiment.csv path
+    :param gold_dct: the gold dictionary
+    :param prediction_accuracy_path: prediction_accuracy.txt path
+    :param pos_mark: the positive gold label
+    :param neg_mark: the negative gold label
+    :return: None, and write into prediction_accuracy.txt
+    '''
+    p_total = 0
+    n_total = 0
+    p_correct = 0
+    n_correct = 0
+
+    with open(file_sentiment_path) as fs:
+        sentiment_csv = csv.DictReader(fs)
+        for r in sentiment_csv:
+            file_name = r['File_Name']
+            predicted_sentiment = r['Sentiment']
+            if gold_dct[file_name] == pos_mark:
+                p_total += 1
+                if predicted_sentiment == pos_mark:
+                    p_correct += 1
+            elif gold_dct[file_name] == neg_mark:
+                n_total += 1
+                if predicted_sentiment == neg_mark:
+                    n_correct += 1
+
+    with open(prediction_accuracy_path, 'a') as pa:
+        pa.write("------\nResults:\n------\n")
+        if p_total > 0:
+            pa.write(str(p_total) + " Positive Reviews\n")
+            pa.write("Percent Correct: " + str(100.0*p_correct/p_total) + " %\n")
+        else:
+            pa.write("Total Predicted Positive Review is 0.\n")
+        if n_total > 0:
+            pa.write(str(n_total) + " Negative Reviews\n")
+            pa.write("Percent Correct: " + str(100.0*n_correct/n_total) + " %\n")
+        else:
+            pa.write("Total Predicted Negative Review is 0.\n")
+        total = p_total + n_total
+        correct = p_correct + n_correct
+        if total > 0:
+            pa.write(str(total) + " Total Reviews\n")
+            pa.write("Percent Correct: " + str(100.0*correct/total) + " %\n")
+        else:
+            pa.write("Total Predicted Positive & Negative Review is 0.\n")
+
+
+def get_sentiment(score, cutoff):
+    '''
+    Classify a score.
+    :param score: the SO score
+    :param cutoff: cutoff value
+    :return: "negative", "positive" or "neutral"
+    '''
+    if score < cutoff:
+        return "negative"
+    elif score > cutoff:
+        return "positive"
+    return "neutral"
+
+
+def generate_rescore_report(rescored, lemma_index, cutoff, rescore_report_path):
+    '''
+    Generate rescore_report.csv, after scoring again the documents that may have changed.
+    For each of them, it has the document name, its old and new scores and sentiments
+    (the old ones are empty for documents that were not indexed), and whether its sentiment changed.
+    :param rescored: the name and old SO of each scored document, as given by calculate_sentiment
+    :param lemma_index: the LemmaIndex, already updated with the new scores
+    :param cutoff: cutoff value
+    :param rescore_report_path: rescore_report.csv path
+    :return: the number of documents whose sentiment changed
+    '''
+    changed_count = 0
+    with open(rescore_report_path, 'w') as csv_out:
+        fieldnames = ['File_Name', 'Old_Score', 'New_Score', 'Old_Sentiment', 'New_Sentiment', 'Changed']
         writer = csv.DictWriter(csv_out, fieldnames=fieldnames)
+        writer.writeheader()
+        for (name, old_score) in rescored:
+            new_score = lemma_index.get_SO(name)
+            new_sentiment = get_sentiment(new_score, cutoff)
+            if old_score is None:
+                old_score = ""
+                old_sentiment = ""
+                changed = "new"
+            else:
+                old_sentiment = get_sentiment(old_score, cutoff)
+                changed = "yes" if old_sentiment != new_sentiment else "no"
+                if changed == "yes":
+                    changed_count += 1
+            writer.writerow({"File_Name":name, "Old_Score":old_score, "New_Score":new_score,
+                             "Old_Sentiment":old_sentiment, "New_Sentiment":new_sentiment, "Changed":changed})
+    return changed_count
 
-        if os.stat(file_sentiment_path).st_size == 0: writer.writeheader()
-        for dct in dct_lst:
-            writer.writerow(dct)
-
-
-def generate_richoutJSON(richout_input, richout_output):
-    '''
-    Convert richout.txt to JSON formatted output. The original order did not change.
-    :param richout_input: the path of richout.txt
-    :param richout_output: the path of rich_output.json
-    :return: None, but generated rich_output.json
-    '''
-    rich_dct = {}
-    within_file = 0
-    latest_key = ""
-    latest_file = ""
-    keys = ["Nouns", "Verbs", "Adjectives", "Adverbs", "SO by Sentence"]
-
-    with open(richout_input) as richin:
-        for r in richin:
-            r = r.strip()
-            if r == "": continue
-            if "######" not in r and '---' not in r and ":" not in r and within_file == 0:
-                within_file = 1
-                file_name = r
-                rich_dct[file_name] = OrderedDict([("Text Length", 0), ("Nouns", {"List":[], "Average SO":0}),
-                                                   ("Verbs", {"List":[], "Average SO":0}),
-                                                   ("Adjectives", {"List":[], "Average SO":0}),
-                                                   ("Adverbs", {"List":[], "Average SO":0}), ("SO by Sentence",[]),
-                                                   ("Total SO", 0)])
-                latest_file = file_name
-                continue
-            if within_file == 1:
-                if r.startswith("Text Length:"):
-                    rich_dct[latest_file]["Text Length"] = float(r.split(': ')[1])
-                elif r.split(':')[0] in keys:
-                    latest_key = r.split(':')[0]
-                elif '---' not in r and r.startswith("Total SO:") == False:
-                    if r.startswith("Average SO:"):
-                        rich_dct[latest_file][latest_key]["Average SO"] = float(r.split(': ')[1])
-                    elif latest_key != "SO by Sentence":
-                        rich_dct[latest_file][latest_key]["List"].append(r)
-                    elif "######" not in r:
-                        so_score = r.split()[-1]
-                        sent = ' '.join(r.split()[:-1])
-                        rich_dct[latest_file][latest_key].append({sent:so_score})
-                elif r.startswith("Total SO:"):
-                    rich_dct[latest_file]["Total SO"] = float(r.split(': ')[1])
-
-            if "######" in r:
-                within_file = 0
-
-    sorted_dict = OrderedDict(sorted(rich_dct.items(), key=lambda t: t[0]))
-    with open(richout_output, 'w') as richout:
-        json.dump(sorted_dict, richout)
+
+def get_rich_output_file_name(line):
+    '''
+    The sort key of a rich_output.jsonl line.
+    :param line: one line of rich_output.jsonl
+    :return: the file name of the line
+    '''
+    return json.loads(line)["File Name"]
+
+
+def sort_rich_output(rich_json_path, chunk_lines=100000):
+    '''
+    Sort rich_output.jsonl by file name with an external merge sort,
+    so that the whole corpus never has to be held in memory:
+    runs of chunk_lines lines are sorted and written to temporary files next to rich_output.jsonl,
+    which are then merged back into rich_output.jsonl.
+    :param rich_json_path: rich_output.jsonl path
+    :param chunk_lines: the most lines sorted in memory at once
+    :return: None, but rich_output.jsonl is sorted
+    '''
+    folder = os.path.dirname(os.path.abspath(rich_json_path))
+    run_paths = []
+    try:
+        with open(rich_json_path) as rich_json:
+            while True:
+                lines = list(itertools.islice(rich_json, chunk_lines))
+                if not lines: break
+                lines.sort(key=get_rich_output_file_name)
+                with tempfile.NamedTemporaryFile("w", dir=folder, suffix=".jsonl", delete=False) as run:
+                    run.writelines(lines)
+                run_paths.append(run.name)
+        runs = [open(run_path) for run_path in run_paths]
+        try:
+            with tempfile.NamedTemporaryFile("w", dir=folder, suffix=".jsonl", delete=False) as merged:
+                merged.writelines(heapq.merge(*runs, key=get_rich_output_file_name))
+            os.replace(merged.name, rich_json_path)
+        finally:
+            for run in runs:
+                run.close()
+    finally:
+        for run_path in run_paths:
+            os.remove(run_path)
+
+
+calculator = None  # the SentimentCalculator of a worker process
+packed_corpus = None  # the PackedCorpus being scored, if any
+return_results = False  # whether a worker process also returns the SOResults, for the result cache and the lemma index
+
+
+def init_worker(config_file, pack_path=None, return_worker_results=False, record_lookups=False):
+    '''
+    Load the configuration and dictionaries once in each worker process.
+    :param config_file: the configuration file for SO-CAL
+    :param pack_path: the packed corpus being scored, opened (memory-mapped) once in each worker process
+    :param return_worker_results: whether calculate_document_sentiment also returns the SOResult
+    :param record_lookups: whether the SOResults keep the dictionary keys looked up, for the lemma index
+    :return: None
+    '''
+    global calculator, packed_corpus, return_results
+    calculator = SO_Calc.SentimentCalculator(config_file)
+    if record_lookups:
+        calculator.record_lookups()
+    if pack_path:
+        packed_corpus = SO_Pack.PackedCorpus(pack_path)
+    return_results = return_worker_results
+
+
+def read_documents(input_path, input_format):
+    '''
+    Read a JSON lines or TSV corpus one document at a time, so that the corpus is never held in memory.
+    In a JSON lines corpus, each line is an object with the "id" of the document and its "text",
+    whose lines are separated by newlines. In a TSV corpus, each line is the id of the document
+    followed by the lines of its text, separated by tabs. Empty lines are skipped.
+    :param input_path: the corpus file path, or - for stdin
+    :param input_format: jsonl or tsv
+    :return: a generator of (document id, list of text lines)
+    '''
+    if input_path == "-":
+        corpus = sys.stdin
+    else:
+        corpus = open(input_path)
+    try:
+        for record in corpus:
+            record = record.rstrip("\r\n")
+            if record.strip() == "": continue
+            if input_format == "jsonl":
+                document = json.loads(record)
+                yield (str(document["id"]), document["text"].split("\n"))
+            else:
+                fields = record.split("\t")
+                yield (fields[0], fields[1:])
+    finally:
+        if corpus is not sys.stdin:
+            corpus.close()
+
+
+def list_files(input_path):
+    '''
+    List the preprocessed files to score.
+    :param input_path: input path of the preprocessed file or folder
+    :return: the list of file paths, in the order of the file names
+    '''
+    if os.path.isfile(input_path):  # 1 single file
+        return [input_path]
+    elif os.path.isdir(input_path):   # an input folder, only reads files
+        file_paths = []
+        for f_name in sorted(os.listdir(input_path)):
+            file_path = os.path.abspath(input_path) + "/" + f_name
+            if os.path.isfile(file_path) == False: continue
+            file_paths.append(file_path)
+        return file_paths
+    else:
+        return []
+
+
+def read_files(file_paths):
+    '''
+    Read preprocessed files one at a time, as documents to pack.
+    :param file_paths: list of preprocessed file paths
+    :return: a generator of (file name, open file)
+    '''
+    for file_path in file_paths:
+        with open(file_path) as infile:
+            yield (os.path.basename(file_path), infile)
+
+
+def get_document_name(document):
+    '''
+    The name a document is reported under.
+    :param document: a preprocessed file path, a (document id, list of text lines) record
+                     or the position of a document in packed_corpus
+    :return: the file name or the document id
+    '''
+    if isinstance(document, tuple):
+        return document[0]
+    elif isinstance(document, int):
+        return packed_corpus.names[document]
+    return os.path.basename(document)
+
+
+def score_document(scoring_calculator, document, basicout, richout, rich_json, save_adverbs=True):
+    '''
+    Score 1 document, whether it is a file, a record of a corpus stream or a document of packed_corpus.
+    :param scoring_calculator: the SentimentCalculator to use
+    :param document: a preprocessed file path, a (document id, list of text lines) record
+                     or the position of a document in packed_corpus
+    :param basicout: where the output.txt line is written
+    :param richout: where the richout.txt text is written
+    :param rich_json: where the rich_output.jsonl line is written
+    :param save_adverbs: whether newly learned adverbs are saved to the adverb dictionary
+    :return: the SOResult of the document
+    '''
+    if isinstance(document, tuple):
+        return scoring_calculator.score_document(document[0], document[1], basicout, richout, save_adverbs, rich_json)
+    elif isinstance(document, int):
+        return scoring_calculator.score_packed(packed_corpus, document, basicout, richout, save_adverbs, rich_json)
+    return scoring_calculator.score_file(document, basicout, richout, save_adverbs, rich_json)
+
+
+def hash_document(document):
+    '''
+    Hash a document for the result cache.
+    A file is read here, so it is given back as a record, to be scored without being read again.
+    :param document: a preprocessed file path, a (document id, list of text lines) record
+                     or the position of a document in packed_corpus
+    :return: a list of the document to score and its hash
+    '''
+    if isinstance(document, tuple):
+        return [document, SO_Cache.get_document_hash(document[1])]
+    elif isinstance(document, int):
+        return [document, SO_Cache.get_document_hash(packed_corpus.get_document_lines(document))]
+    with open(document) as infile:
+        lines = infile.readlines()
+    return [(os.path.basename(document), lines), SO_Cache.get_document_hash(lines)]
+
+
+def write_cached_result(scoring_calculator, document, result, basicout, richout, rich_json):
+    '''
+    Write a result taken from the result cache, as if the document had been scored.
+    The adverbs it learned were saved when it was scored, so they are not saved again.
+    :param scoring_calculator: the SentimentCalculator to use
+    :param document: the document
+    :param result: its cached SOResult
+    :param basicout: where the output.txt line is written
+    :param richout: where the richout.txt text is written
+    :param rich_json: where the rich_output.jsonl line is written
+    :return: None
+    '''
+    result.name = get_document_name(document)  # the same text may come under another name
+    scoring_calculator.write_result(result, basicout, richout, False, rich_json)
+
+
+def calculate_document_sentiment(document):
+    '''
+    Score 1 document in a worker process.
+    The outputs are kept in memory so that the parent process can write them in order.
+    :param document: a preprocessed file path, a (document id, list of text lines) record
+                     or the position of a document in packed_corpus
+    :return: a list of the output.txt text, the richout.txt text, the rich_output.jsonl line, the newly learned adverbs
+             and the SOResult (None unless return_results is on)
+    '''
+    basicout = io.StringIO()
+    richout = io.StringIO()
+    rich_json = io.StringIO()
+    result = score_document(calculator, document, basicout, richout, rich_json, save_adverbs=False)
+    if return_results:
+        return [basicout.getvalue(), richout.getvalue(), rich_json.getvalue(), result.new_adverbs, result]
+    return [basicout.getvalue(), richout.getvalue(), rich_json.getvalue(), result.new_adverbs, None]
+
+
+def select_changed_documents(documents, lemma_index, config_fingerprint, lexicon_entries, rescored):
+    '''
+    Keep only the documents whose SO may have changed since they were indexed: those that looked up
+    a dictionary key that has been added, removed or changed since, and those that are not in the index.
+    If the config has changed, every document is kept.
+    :param documents: the documents
+    :param lemma_index: the LemmaIndex
+    :param config_fingerprint: the fingerprint of the current config
+    :param lexicon_entries: the entries of the current dictionaries
+    :param rescored: a list, to which the name and the indexed SO (None if it was not indexed) of each kept document is added
+    :return: a generator of the kept documents
+    '''
+    indexed_lexicon = lemma_index.get_lexicon()
+    if indexed_lexicon is None or indexed_lexicon[0] != config_fingerprint:
+        print("The config has changed since the lemma index was made, scoring every document")
+        changed_documents = None
+    else:
+        changed_keys = SO_Index.get_changed_keys(indexed_lexicon[1], lexicon_entries)
+        changed_documents = lemma_index.find_documents(changed_keys)
+        print("%d dictionary entries changed, which %d indexed documents looked up" % (len(changed_keys), len(changed_documents)))
+    for document in documents:
+        name = get_document_name(document)
+        old_SO = lemma_index.get_SO(name)
+        if changed_documents is None or old_SO is None or name in changed_documents:
+            rescored.append((name, old_SO))
+            yield document
+
+
+def calculate_sentiment(documents, config_file, basicout_path, richout_path, rich_json_path, workers=1, batch_size=4096,
+                        result_cache_path=None, lemma_index=None, rescore_changed=False):
+    '''
+    Calculate the sentiment of each document.
+    The documents are preprocessed file paths, (document id, list of text lines) records
+    read from a corpus stream, or positions of documents in packed_corpus (which must be open);
+    they are read lazily, so any iterable (e.g. read_documents) can be used.
+    The configuration and dictionaries are loaded once (once per worker process if workers > 1)
+    and reused for every document. The results are appended to output.txt, richout.txt and rich_output.jsonl
+    (one JSON object per document) in the order of the documents, no matter how many workers are used.
+    Each document is written as soon as it is scored, and the workers are given at most batch_size
+    documents at a time, so memory does not grow with the number of documents.
+    Adverbs learned by one worker are not visible to the other workers until the next run.
+    With a result cache, the documents already scored with the same config and dictionaries are
+    taken from it, and only the others are scored (and added to it). Learning new adverbs changes
+    the dictionaries, so the run after one that learned adverbs scores every document again.
+    With a lemma index, the dictionary keys looked up for each document are added to it (which makes
+    scoring slower). If rescore_changed is on, only the documents whose SO may have changed since they
+    were indexed are scored (see select_changed_documents).
+    :param documents: the documents to score
+    :param config_file: the configuration file for SO-CAL
+    :param basicout_path: output.txt path
+    :param richout_path: richout.txt path
+    :param rich_json_path: rich_output.jsonl path
+    :param workers: the number of worker processes
+    :param batch_size: the most documents handed to the workers at once
+    :param result_cache_path: the result cache file path, or None not to use a result cache
+    :param lemma_index: the LemmaIndex to update, or None
+    :param rescore_changed: whether to score only the documents that may have changed
+    :return: if rescore_changed is on, a list of the name and the indexed SO of each scored document,
+             otherwise None; and write into output.txt, richout.txt and rich_output.jsonl
+    '''
+    # with several workers this also brings the compiled lexicon up to date
+    # before the workers start, so that each of them only has to read it
+    start_time = time.time()
+    sequential_calculator = SO_Calc.SentimentCalculator(config_file)
+    load_time = time.time() - start_time
+    print("Loaded configuration and dictionaries in %.2f seconds" % load_time)
+    if result_cache_path:
+        result_cache = SO_Cache.ResultCache(result_cache_path, sequential_calculator.get_config_fingerprint(),
+                                            sequential_calculator.get_lexicon_fingerprint())
+    else:
+        result_cache = None
+    rescored = None
+    if lemma_index is not None:
+        config_fingerprint = sequential_calculator.get_config_fingerprint()
+        lexicon_entries = sequential_calculator.get_lexicon_entries()  # before any adverb is learned
+        sequential_calculator.record_lookups()
+        if rescore_changed:
+            rescored = []
+            documents = select_changed_documents(documents, lemma_index, config_fingerprint, lexicon_entries, rescored)
+
+    start_time = time.time()
+    document_count = 0
+    with open(basicout_path, "a") as basicout, open(richout_path, "a") as richout, open(rich_json_path, "a") as rich_json:
+        if workers <= 1:
+            for document in documents:
+                print("Processing " + get_document_name(document) + "...")
+                if result_cache is None:
+                    result = score_document(sequential_calculator, document, basicout, richout, rich_json)
+                else:
+                    (document, document_hash) = hash_document(document)
+                    result = result_cache.get(document_hash, lemma_index is not None)
+                    if result is None:
+                        result = score_document(sequential_calculator, document, basicout, richout, rich_json)
+                        result_cache.put(document_hash, result)
+                    else:
+                        write_cached_result(sequential_calculator, document, result, basicout, richout, rich_json)
+                if lemma_index is not None:
+                    lemma_index.add_document(result.name, result.text_SO, result.lookups)
+                document_count += 1
+        else:
+            new_adverbs = {}
+            documents = iter(documents)
+            pack_path = packed_corpus.pack_path if packed_corpus is not None else None
+            initargs = (config_file, pack_path, result_cache is not None or lemma_index is not None, lemma_index is not None)
+            with multiprocessing.Pool(workers, initializer=init_worker, initargs=initargs) as pool:
+                while True:
+                    batch = list(itertools.islice(documents, batch_size))
+                    if not batch: break
+                    if result_cache is None:
+                        cached = [None] * len(batch)
+                        to_score = batch
+                    else:
+                        # look up the whole batch first, so that only the misses go to the workers
+                        hashed = [hash_document(document) for document in batch]
+                        batch = [document for (document, document_hash) in hashed]
+                        cached = [result_cache.get(document_hash, lemma_index is not None) for (document, document_hash) in hashed]
+                        to_score = [batch[i] for i in range(len(batch)) if cached[i] is None]
+                    chunksize = max(1, min(64, len(to_score) // (workers * 4)))
+                    results = pool.imap(calculate_document_sentiment, to_score, chunksize)
+                    for i in range(len(batch)):
+                        document = batch[i]
+                        print("Processing " + get_document_name(document) + "...")
+                        if cached[i] is not None:
+                            result = cached[i]
+                            write_cached_result(sequential_calculator, document, result, basicout, richout, rich_json)
+                        else:
+                            (basic_text, rich_text, rich_json_text, file_adverbs, result) = next(results)
+                            basicout.write(basic_text)
+                            richout.write(rich_text)
+                            rich_json.write(rich_json_text)
+                            new_adverbs.update(file_adverbs)
+                            if result_cache is not None:
+                                result_cache.put(hashed[i][1], result)
+                        if lemma_index is not None:
+                            lemma_index.add_document(result.name, result.text_SO, result.lookups)
+                    document_count += len(batch)
+            if new_adverbs:
+                config = SO_Calc.get_configuration_from_file(config_file)
+                SO_Calc.save_new_adverbs(config["dic_dir"] + config["adv_dict"], new_adverbs)
+    score_time = time.time() - start_time
+    if score_time > 0:
+        print("Processed %d documents in %.2f seconds (%.1f docs/sec)" % (document_count, score_time, document_count/score_time))
+    else:
+        print("Processed %d documents in %.2f seconds" % (document_count, score_time))
+    if workers <= 1:
+        stem_lookups = sequential_calculator.stem_cache_hits + sequential_calculator.stem_cache_misses
+        if stem_lookups > 0:
+            print("Stem cache: %d hits, %d misses (%.1f%% hit rate)" % (sequential_calculator.stem_cache_hits, sequential_calculator.stem_cache_misses, 100.0 * sequential_calculator.stem_cache_hits / stem_lookups))
+    if result_cache is not None:
+        result_lookups = result_cache.hits + result_cache.misses
+        if result_lookups > 0:
+            print("Result cache: %d hits, %d misses (%.1f%% hit rate)" % (result_cache.hits, result_cache.misses, 100.0 * result_cache.hits / result_lookups))
+        result_cache.close()
+    if lemma_index is not None:
+        lemma_index.set_lexicon(config_fingerprint, lexicon_entries)
+    return rescored
 
 
 def main():
+    global packed_corpus
     pos_mark = "positive"
     neg_mark = "negative"
 
     args = get_command_arguments()
     input_path = args.input
+    if args.pack:
+        if args.input_format == "files":
+            documents = read_files(list_files(input_path))
+        elif args.input_format == "packed":
+            print("The input is already packed.")
+            return
+        else:
+            documents = read_documents(input_path, args.input_format)
+        document_count = SO_Pack.pack_corpus(documents, args.pack)
+        print("Packed %d documents into %s" % (document_count, args.pack))
+        return
+    if args.rescore_changed and not args.lemma_index:
+        print("--rescore_changed needs the lemma index (--lemma_index) that the documents were scored with.")
+        return
     output_folder = args.output
     if os.path.exists(output_folder) == False:
         os.mkdir(output_folder)
     config_file = args.config
     cutoff = args.cutoff
     gold_file = args.gold
-    if gold_file == "":
+    if gold_file == "" and args.input_format == "files":
         gold_file = create_gold_file(input_path)
 
     basicout_path = os.path.abspath(output_folder) + "/output.txt"
     richout_path = os.path.abspath(output_folder) + "/richout.txt"
     file_sentiment_path = os.path.abspath(output_folder) + "/file_sentiment.csv"
     prediction_accuracy_path =  os.path.abspath(output_folder) + "/prediction_accuracy.txt"
-    richout_json = os.path.abspath(output_folder) + "/rich_output.json"
+    richout_json = os.path.abspath(output_folder) + "/rich_output.jsonl"
+    rescore_report_path = os.path.abspath(output_folder) + "/rescore_report.csv"
+    cutoff_sweep_path = os.path.abspath(output_folder) + "/cutoff_sweep.csv"
 
     open(basicout_path, "w").close()
     open(richout_path, "w").close()
+    open(richout_json, "w").close()
     open(file_sentiment_path, 'w').close()
     open(prediction_accuracy_path, 'w').close()
 
-    if os.path.isfile(input_path):  # 1 single file
-        print("Processing " + os.path.basename(input_path) + "...")
-        cmd = "python3.5 sentiment_calculator/SO_Calc.py -i \"" + input_path + "\" -bo \"" + basicout_path + "\" -ro \"" + richout_path + "\" -c \"" + config_file + "\""
-        os.system(cmd)
-    elif os.path.isdir(input_path):   # an input folder, only reads files
-        for f_name in os.listdir(input_path):
-            print("Processing " + f_name + "...")
-            file_path = os.path.abspath(input_path) + "/" + f_name
-            if os.path.isfile(file_path) == False: continue
-            cmd = "python3.5 sentiment_calculator/SO_Calc.py -i \"" + file_path + "\" -bo \"" + basicout_path + "\" -ro \"" + richout_path + "\" -c \"" + config_file + "\""
-            os.system(cmd)
+    if args.input_format == "files":
+        documents = list_files(input_path)
+    elif args.input_format == "packed":
+        packed_corpus = SO_Pack.PackedCorpus(input_path)
+        documents = range(len(packed_corpus))
+    else:
+        documents = read_documents(input_path, args.input_format)
+    lemma_index = SO_Index.LemmaIndex(args.lemma_index) if args.lemma_index else None
+    rescored = calculate_sentiment(documents, config_file, basicout_path, richout_path, richout_json, args.workers,
+                                   result_cache_path=args.result_cache, lemma_index=lemma_index,
+                                   rescore_changed=args.rescore_changed)
+    if packed_corpus is not None:
+        packed_corpus.close()
+        packed_corpus = None
+    if rescored is not None:
+        changed_count = generate_rescore_report(rescored, lemma_index, cutoff, rescore_report_path)
+        print("Scored %d documents again, %d of them changed sentiment" % (len(rescored), changed_count))
+    if lemma_index is not None:
+        lemma_index.close()
+    if args.sort_rich_output:
+        sort_rich_output(richout_json)
 
     generate_file_sentiment(basicout_path, cutoff, file_sentiment_path)
-    generate_richoutJSON(richout_path, richout_json)
 
     if gold_file == "":
         print("""
@@ -224,44 +707,11 @@ def main():
               """)
     else:
         gold_dct = read_gold_file(gold_file)
-        p_total = 0
-        n_total = 0
-        p_correct = 0
-        n_correct = 0
-
-        with open(file_sentiment_path) as fs:
-            sentiment_csv = csv.DictReader(fs)
-            for r in sentiment_csv:
-                file_name = r['File_Name']
-                predicted_sentiment = r['Sentiment']
-                if gold_dct[file_name] == pos_mark:
-                    p_total += 1
-                    if predicted_sentiment == pos_mark:
-                        p_correct += 1
-                elif gold_dct[file_name] == neg_mark:
-                    n_total += 1
-                    if predicted_sentiment == neg_mark:
-                        n_correct += 1
-
-        with open(prediction_accuracy_path, 'a') as pa:
-            pa.write("------\nResults:\n------\n")
-            if p_total > 0:
-                pa.write(str(p_total) + " Positive Reviews\n")
-                pa.write("Percent Correct: " + str(100.0*p_correct/p_total) + " %\n")
-            else:
-                pa.write("Total Predicted Positive Review is 0.\n")
-            if n_total > 0:
-                pa.write(str(n_total) + " Negative Reviews\n")
-                pa.write("Percent Correct: " + str(100.0*n_correct/n_total) + " %\n")
-            else:
-                pa.write("Total Predicted Negative Review is 0.\n")
-            total = p_total + n_total
-            correct = p_correct + n_correct
-            if total > 0:
-                pa.write(str(total) + " Total Reviews\n")
-                pa.write("Percent Correct: " + str(100.0*correct/total) + " %\n")
-            else:
-                pa.write("Total Predicted Positive & Negative Review is 0.\n")
+        write_prediction_accuracy(file_sentiment_path, gold_dct, prediction_accuracy_path, pos_mark, neg_mark)
+
+        if args.sweep_cutoffs > 0:
+            import SO_Eval  # NumPy is only needed here
+            SO_Eval.evaluate_cutoffs(file_sentiment_path, gold_dct, cutoff_sweep_path, args.sweep_cutoffs)
 
     print("Find all the output in: " + output_folder)
 
@@ -0,0 +1,44 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "sentiment_calculator"))
+import SO_Calc
+
+# Run from Source_Code with: python3 -m unittest discover -s tests
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "Resources", "config_files", "en_SO_Calc.ini")
+
+
+def get_tokens(text):
+    '''
+    :param text: a preprocessed text, e.g. "Enjoy/VB it/PRP ./."
+    :return: its list of (word, tag) tokens
+    '''
+    return [tuple(word.split("/")) for word in text.split()]
+
+
+class ImperativeTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        config = SO_Calc.get_configuration_from_file(CONFIG_PATH)
+        config["use_imperative"] = True
+        config["adv_learning"] = False
+        config["compiled_lexicon"] = ""
+        cls.calculator = SO_Calc.SentimentCalculator(config)
+
+    def test_first_word_imperative(self):
+        # the scores of the original SO_Calc.py
+        text = "Enjoy/VB this/DT wonderful/JJ book/NN ./. It/PRP is/VBZ a/DT good/JJ read/NN ./."
+        result = self.calculator.score(get_tokens(text))
+        self.assertEqual(result.text_SO, 4.0)
+
+    def test_first_word_imperative_without_final_punctuation(self):
+        text = "Enjoy/VB this/DT wonderful/JJ book/NN It/PRP is/VBZ a/DT good/JJ read/NN"
+        result = self.calculator.score(get_tokens(text), boundaries=[4, 9])
+        self.assertEqual(result.text_SO, 2.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+import json
+import zlib
+import sqlite3
+import hashlib
+import unicodedata
+
+# The annotation cache keeps the tokens and POS tags CoreNLP gave for every text
+# (a file, or a chunk of a large file) in an SQLite file, keyed by a hash of the
+# normalized text and by the annotators and the server version they were made
+# with, so that a text seen in an earlier run is not sent to the server again.
+# Only the words and tags of each sentence are kept, compressed. The cache can be
+# bounded in size: when the annotations it holds grow over the bound, the least
+# recently used ones are removed.
+
+CACHE_VERSION = 1  # increase whenever the stored annotations change
+
+
+def get_text_hash(text):
+    '''
+    Hash a text, normalized so that texts that differ only by spaces or Unicode composition have the same hash.
+    :param text: the text
+    :return: the hash of the text
+    '''
+    normalized = " ".join(unicodedata.normalize("NFC", text).split())
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+
+class AnnotationCache():
+    '''
+    A persistent, size-bounded cache of CoreNLP annotations, for one set of annotators and one server version.
+    '''
+
+    def __init__(self, cache_path, annotators, server_version, max_bytes=0, commit_every=1000):
+        '''
+        Open (or create) an annotation cache.
+        :param cache_path: the cache file path
+        :param annotators: the CoreNLP annotators
+        :param server_version: the version of the CoreNLP server
+        :param max_bytes: the most bytes of annotations to keep, 0 for no bound
+        :param commit_every: the number of changes after which they are written to disk
+        '''
+        self.connection = sqlite3.connect(cache_path)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS annotations (text_hash TEXT, setting TEXT, annotation BLOB, "
+                                "size INTEGER, used INTEGER, PRIMARY KEY (text_hash, setting))")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS annotations_used ON annotations (used)")
+        self.setting = hashlib.sha1((str(CACHE_VERSION) + "\n" + annotators + "\n" + server_version).encode("utf-8")).hexdigest()
+        (self.size, last_used) = self.connection.execute("SELECT COALESCE(SUM(size), 0), COALESCE(MAX(used), 0) FROM annotations").fetchone()
+        self.clock = last_used  # increases at every use, to find the least recently used annotations
+        self.max_bytes = max_bytes
+        self.commit_every = commit_every
+        self.uncommitted = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def tick(self):
+        '''
+        Count a change, and write the changes to disk every commit_every changes.
+        :return: the current time of the clock
+        '''
+        self.clock += 1
+        self.uncommitted += 1
+        if self.uncommitted >= self.commit_every:
+            self.connection.commit()
+            self.uncommitted = 0
+        return self.clock
+
+    def get(self, text_hash):
+        '''
+        Look up the annotation of a text.
+        :param text_hash: the hash of the text, see get_text_hash
+        :return: json formatted data with the words ('originalText') and tags ('pos') of each sentence,
+                 or None if the text has not been annotated with these annotators and server version
+        '''
+        row = self.connection.execute("SELECT annotation FROM annotations WHERE text_hash = ? AND setting = ?",
+                                      (text_hash, self.setting)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.connection.execute("UPDATE annotations SET used = ? WHERE text_hash = ? AND setting = ?",
+                                (self.tick(), text_hash, self.setting))
+        sentences = json.loads(zlib.decompress(row[0]).decode("utf-8"))
+        return {'sentences': [{'tokens': [{'originalText': word, 'pos': tag} for (word, tag) in sent]} for sent in sentences]}
+
+    def put(self, text_hash, json_input):
+        '''
+        Keep the annotation of a text, removing the least recently used annotations if the cache grows over its bound.
+        :param text_hash: the hash of the text, see get_text_hash
+        :param json_input: json formatted data generated by CoreNLP for the text
+        :return: None
+        '''
+        sentences = [[[t['originalText'], t['pos']] for t in sent['tokens']] for sent in json_input['sentences']]
+        annotation = zlib.compress(json.dumps(sentences, separators=(",", ":")).encode("utf-8"))
+        row = self.connection.execute("SELECT size FROM annotations WHERE text_hash = ? AND setting = ?",
+                                      (text_hash, self.setting)).fetchone()
+        if row is not None:
+            self.size -= row[0]
+        self.connection.execute("INSERT OR REPLACE INTO annotations VALUES (?, ?, ?, ?, ?)",
+                                (text_hash, self.setting, annotation, len(annotation), self.tick()))
+        self.size += len(annotation)
+        if self.max_bytes > 0 and self.size > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        '''
+        Remove the least recently used annotations until the cache is within its bound.
+        :return: None
+        '''
+        while self.size > self.max_bytes:
+            rows = self.connection.execute("SELECT text_hash, setting, size FROM annotations ORDER BY used LIMIT 100").fetchall()
+            if not rows:
+                break
+            for (text_hash, setting, size) in rows:
+                if self.size <= self.max_bytes:
+                    break
+                self.connection.execute("DELETE FROM annotations WHERE text_hash = ? AND setting = ?", (text_hash, setting))
+                self.size -= size
+                self.evictions += 1
+
+    def close(self):
+        '''
+        Write the changes to disk and close the cache.
+        '''
+        self.connection.commit()
+        self.connection.close()
@@ -0,0 +1,260 @@
+import json
+import time
+import threading
+import http.client
+import urllib.parse
+import concurrent.futures
+
+# A pool of annotation requests to a Stanford CoreNLP server. Each thread of the
+# pool keeps one persistent (keep-alive) HTTP connection to the server, so a
+# request costs one round trip instead of setting up new connections. At most
+# max_pending documents are read and waiting for the server at any time: the next
+# document is only taken from the input when a request has completed, so reading
+# never runs ahead of the server (backpressure). Every request has a timeout, and
+# the results are given back as soon as each of them completes.
+# Only the standard library is used, so any server that answers like CoreNLP
+# (e.g. a local stand-in for testing) can be given as the server URL.
+# Short documents can be sent several at a time, in batches of a number of tokens
+# given by a TokenBudget. The budget is adapted to how fast the server annotates,
+# so that a batch stays well under the timeout of the server. A batch whose request
+# fails can be split and sent again, so that only a document whose own request
+# fails is given back as failed.
+
+
+def count_tokens(text):
+    '''
+    A quick estimate of the number of tokens of a text, before it is tokenized.
+    :param text: the text
+    :return: the number of words between spaces
+    '''
+    return len(text.split())
+
+
+class TokenBudget():
+    '''
+    The number of tokens to send in one request, adapted to the speed of the server.
+    '''
+
+    def __init__(self, max_tokens, server_timeout, start_tokens=500):
+        '''
+        :param max_tokens: the most tokens in one request
+        :param server_timeout: the timeout of the server (its -timeout), in seconds; a request is
+                               aimed to take at most half of it
+        :param start_tokens: the number of tokens of the first requests, before the speed of the server is known
+        '''
+        self.max_tokens = max_tokens
+        self.target_seconds = server_timeout / 2.0
+        self.tokens = max(1, min(max_tokens, start_tokens))
+        self.seconds_per_token = None
+        self.lock = threading.Lock()
+
+    def update(self, tokens, seconds):
+        '''
+        Adapt the budget to a completed request. It grows at most twofold at a time.
+        :param tokens: the number of tokens of the request
+        :param seconds: how long it took
+        :return: None
+        '''
+        if tokens == 0:
+            return
+        with self.lock:
+            if self.seconds_per_token is None:
+                self.seconds_per_token = seconds / tokens
+            else:
+                self.seconds_per_token = 0.8 * self.seconds_per_token + 0.2 * seconds / tokens
+            fitting = int(self.target_seconds / max(self.seconds_per_token, 1e-9))
+            self.tokens = max(1, min(self.max_tokens, fitting, self.tokens * 2))
+
+    def shrink(self):
+        '''
+        Halve the budget after a failed request.
+        :return: None
+        '''
+        with self.lock:
+            self.tokens = max(1, self.tokens // 2)
+
+
+class CoreNLPConnection():
+    '''
+    A persistent HTTP connection to a CoreNLP server, used by one thread at a time.
+    '''
+
+    def __init__(self, server_url, timeout):
+        '''
+        :param server_url: the server URL, e.g. http://localhost:9000
+        :param timeout: the timeout of each request, in seconds
+        '''
+        url = urllib.parse.urlsplit(server_url)
+        self.host = url.hostname
+        self.port = url.port
+        self.path = url.path or "/"
+        self.secure = url.scheme == "https"
+        self.timeout = timeout
+        self.connection = None
+        self.requests = 0  # the number of requests sent over the current connection
+        self.connects = 0  # the number of connections opened
+        self.sent = 0  # the number of requests answered
+
+    def connect(self):
+        '''
+        Open a new connection to the server.
+        :return: None
+        '''
+        if self.secure:
+            self.connection = http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout)
+        else:
+            self.connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        self.requests = 0
+        self.connects += 1
+
+    def annotate(self, text, properties):
+        '''
+        Annotate a text.
+        If the server has closed a connection that was kept alive, the request is sent again over a new one.
+        :param text: the text
+        :param properties: the CoreNLP properties, e.g. {'annotators': 'tokenize,ssplit,pos', 'outputFormat': 'json'}
+        :return: the parsed JSON output
+        '''
+        url = self.path + "?" + urllib.parse.urlencode({"properties": json.dumps(properties)})
+        body = text.encode("utf-8")
+        while True:
+            if self.connection is None:
+                self.connect()
+            reused = self.requests > 0
+            try:
+                self.connection.request("POST", url, body, {"Content-Type": "text/plain; charset=utf-8"})
+                response = self.connection.getresponse()
+                data = response.read()
+            except ConnectionError:
+                self.close()
+                if reused:
+                    continue  # the server closed the idle connection, try again on a new one
+                raise
+            except Exception:
+                self.close()  # e.g. a timeout, the connection is in an unknown state
+                raise
+            self.requests += 1
+            self.sent += 1
+            if response.will_close:
+                self.close()
+            if response.status != 200:
+                raise IOError("CoreNLP server error %d: %s" % (response.status, data.decode("utf-8", "replace").strip()))
+            return json.loads(data.decode("utf-8"), strict=False)
+
+    def close(self):
+        '''
+        Close the connection; the next request opens a new one.
+        '''
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+class AnnotationPool():
+    '''
+    A bounded pool of concurrent annotation requests over persistent connections.
+    '''
+
+    def __init__(self, server_url, properties, concurrency, timeout=60.0, max_pending=None, budget=None):
+        '''
+        :param server_url: the server URL, e.g. http://localhost:9000
+        :param properties: the CoreNLP properties of every request
+        :param concurrency: the number of requests in flight at once
+        :param timeout: the timeout of each request, in seconds
+        :param max_pending: the most documents read and not yet annotated, by default twice the concurrency
+        :param budget: the TokenBudget to adapt to every request, if any
+        '''
+        self.server_url = server_url
+        self.properties = properties
+        self.timeout = timeout
+        self.max_pending = max_pending or 2 * concurrency
+        self.budget = budget
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=concurrency)
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.connections = []
+        self.splits = 0  # the number of failed documents that were split and sent again
+
+    def get_connection(self):
+        '''
+        :return: the connection of the current thread
+        '''
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = CoreNLPConnection(self.server_url, self.timeout)
+            self.local.connection = connection
+            with self.lock:
+                self.connections.append(connection)
+        return connection
+
+    def annotate(self, text):
+        '''
+        Annotate a text over the connection of the current thread.
+        :param text: the text
+        :return: the parsed JSON output
+        '''
+        if self.budget is None:
+            return self.get_connection().annotate(text, self.properties)
+        start_time = time.time()
+        try:
+            annotation = self.get_connection().annotate(text, self.properties)
+        except Exception:
+            self.budget.shrink()
+            raise
+        self.budget.update(count_tokens(text), time.time() - start_time)
+        return annotation
+
+    def annotate_all(self, documents, split=None):
+        '''
+        Annotate documents concurrently. The documents are only read as requests complete.
+        :param documents: an iterable of (key, text)
+        :param split: a function split(key, text) giving the smaller (key, text) documents to send instead of
+                      a document whose request failed, or None if it cannot be split
+        :return: a generator of (key, parsed JSON output, error) in the order the requests complete;
+                 the output is None and error is the exception if the request failed
+        '''
+        documents = iter(documents)
+        pending = {}
+        exhausted = False
+        while True:
+            while not exhausted and len(pending) < self.max_pending:
+                try:
+                    (key, text) = next(documents)
+                except StopIteration:
+                    exhausted = True
+                    break
+                pending[self.executor.submit(self.annotate, text)] = (key, text)
+            if not pending:
+                return
+            (done, not_done) = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                (key, text) = pending.pop(future)
+                error = future.exception()
+                if error is None:
+                    yield (key, future.result(), None)
+                    continue
+                parts = None if split is None else split(key, text)
+                if parts:
+                    self.splits += 1
+                    for (part_key, part_text) in parts:
+                        pending[self.executor.submit(self.annotate, part_text)] = (part_key, part_text)
+                else:
+                    yield (key, None, error)
+
+    def get_statistics(self):
+        '''
+        :return: the number of requests answered and of connections opened
+        '''
+        with self.lock:
+            sent = sum(connection.sent for connection in self.connections)
+            connects = sum(connection.connects for connection in self.connections)
+        return sent, connects
+
+    def close(self):
+        '''
+        Wait for the requests in flight and close the connections.
+        '''
+        self.executor.shutdown(wait=True)
+        with self.lock:
+            for connection in self.connections:
+                connection.close()
@@ -1,34 +1,67 @@
 import os
+import re
+import bisect
 import argparse
 from pycorenlp import StanfordCoreNLP
 import unidecode
+import corenlp_pool
+import annotation_cache
 
+SENTENCE_END = re.compile(r'[.!?]["\'\)\]]*$')  # a word or line that ends a sentence
 
 class Preprocess():
     def __init__(self, args):
         '''
         Start Stanford CoreNLP Server
-        Initialize input, output_folder, standford_annotators, log_path (optional)
-        "input" can be a file or a folder
+        Initialize input, output_folder, standford_annotators, log_path (optional),
+        the number of concurrent requests and their timeout, the batching token budget, the chunk size
+        and the annotation cache (optional)
+        "input" can be a file or a folder; with an empty output folder no files are written, and the
+        annotated sentences of each file are only given to document_handler
         :param args: Input the defined command line parameters
         :return: None
         '''
         # Start Stanford CoreNLP Server
-        self.nlp = StanfordCoreNLP('http://localhost:9000')
+        self.server_url = args.server_url
+        self.nlp = StanfordCoreNLP(self.server_url)
 
         # Initialize input, output_folder, standford_annotators, log_path (optional)
         self.input = os.path.abspath(args.input_path)
-        self.output_folder = os.path.abspath(args.output_path)
-        if not os.path.exists(self.output_folder):
-            os.makedirs(self.output_folder)
+        self.output_folder = None
+        if args.output_path:
+            self.output_folder = os.path.abspath(args.output_path)
+            if not os.path.exists(self.output_folder):
+                os.makedirs(self.output_folder)
         self.log_path = os.path.abspath(args.log_path)
         self.standford_annotators = args.annotators
+        self.concurrency = args.concurrency
+        self.timeout = args.timeout
+        self.batch_tokens = args.batch_tokens
+        self.server_timeout = args.server_timeout
+        self.chunk_tokens = args.chunk_tokens
+        self.cache = None
+        if args.cache_path:
+            self.cache = annotation_cache.AnnotationCache(args.cache_path, self.standford_annotators, args.server_version,
+                                                          int(args.cache_size * 1024 * 1024))
+        self.files_done = 0
+        # Called as document_handler(file name, file path, list of sentences of json formatted data)
+        # when a file is completely annotated
+        self.document_handler = None
         if os.path.isdir(self.input) == True: self.input_type = "dir"
         elif os.path.isfile(self.input) == True: self.input_type = "file"
 
         print("Your Input: " + self.input +", " + self.input_type)
-        print("Your Output Folder: " + self.output_folder)
+        if self.output_folder is not None:
+            print("Your Output Folder: " + self.output_folder)
         print("Your Stanford annotators: " + self.standford_annotators)
+        if self.concurrency > 1:
+            print("Concurrent requests: " + str(self.concurrency))
+        if self.batch_tokens > 0:
+            print("Batches of up to " + str(self.batch_tokens) + " tokens")
+        if self.chunk_tokens > 0:
+            print("Chunks of about " + str(self.chunk_tokens) + " tokens")
+        if self.cache is not None:
+            print("Your annotation cache: " + os.path.abspath(args.cache_path))
 
 
     def str_process(self, row_string):
@@ -45,6 +78,34 @@ class Preprocess():
         return processed_json
 
 
+    def annotate_text(self, text_string):
+        '''
+        Annotate a text with str_process, unless its annotation is in the annotation cache.
+        :param text_string: the text string
+        :return: Json format output
+        '''
+        if self.cache is None:
+            return self.str_process(text_string)
+        text_hash = annotation_cache.get_text_hash(text_string)
+        parsed_json = self.cache.get(text_hash)
+        if parsed_json is None:
+            parsed_json = self.str_process(text_string)
+            self.cache.put(text_hash, parsed_json)
+        return parsed_json
+
+
+    def write_preprocessed_data(self, json_input, preprocessed_out):
+        '''
+        Write preprocessed data, 1 sentence per line.
+        :param json_input: json formatted data generated from function str_process
+        :param preprocessed_out: the output file
+        :return: None
+        '''
+        for sent in json_input['sentences']:
+            parsed_sent = " ".join([t['originalText'] + "/" + t['pos'] for t in sent['tokens']])
+            preprocessed_out.write(unidecode.unidecode(parsed_sent) + "\n")
+
+
     def output_preprocessed_data(self, json_input, file_name):
         '''
         Output preprocessed data into a file.
@@ -52,44 +113,337 @@ class Preprocess():
         :param file_name: output file name
         :return: None
         '''
-        rows = []
-        for sent in json_input['sentences']:
-            parsed_sent = " ".join([t['originalText'] + "/" + t['pos'] for t in sent['tokens']])
-            rows.append(parsed_sent)
         output_file_path = self.output_folder + '/' + file_name
         if os.path.exists(output_file_path):
             open(output_file_path, 'w').close()
         with open(output_file_path, 'a') as preprocessed_out:
-            for r in rows:
-                preprocessed_out.write(unidecode.unidecode(r) + "\n")
+            self.write_preprocessed_data(json_input, preprocessed_out)
+
+
+    def list_input_files(self):
+        '''
+        List the input files.
+        :return: a list of (file name, file path)
+        '''
+        if self.input_type == "file":
+            return [(os.path.basename(self.input), self.input)]
+        return [(file_name, self.input + "/" + file_name) for file_name in os.listdir(self.input)]
+
+
+    def read_text_string(self, input_file_path):
+        '''
+        Read a raw text file as 1 single string, each line preceded by a space.
+        :param input_file_path: the file path
+        :return: the text string
+        '''
+        lines = []
+        with open(input_file_path, 'rb') as file_input:
+            for r in file_input:
+                lines.append(" " + r.strip().decode('utf-8', 'backslashreplace'))
+        return "".join(lines)
+
+
+    def split_line(self, line):
+        '''
+        Split a line that is longer than a chunk into its sentences, and a sentence that is
+        longer than a chunk into parts of chunk_tokens words.
+        :param line: the line
+        :return: a generator of the parts of the line
+        '''
+        words = line.split()
+        if len(words) <= self.chunk_tokens:
+            yield line
+            return
+        part = []
+        for word in words:
+            part.append(word)
+            if SENTENCE_END.search(word) or len(part) == self.chunk_tokens:
+                yield " ".join(part)
+                part = []
+        if part:
+            yield " ".join(part)
+
+
+    def read_text_chunks(self, input_file_path):
+        '''
+        Read a raw text file as strings of about chunk_tokens tokens (at most twice as many), 1 line at a time.
+        A chunk ends after an empty line (a paragraph boundary) or after a line that ends a sentence whenever
+        there is one, so that sentences are not split. The chunks are made as read_text_string makes the text
+        string, so a file that fits in 1 chunk gives the same string.
+        :param input_file_path: the file path
+        :return: a generator of text strings
+        '''
+        parts = []
+        tokens = 0
+        safe = 0  # the number of parts after which the chunk can end, and their tokens
+        safe_tokens = 0
+        with open(input_file_path, 'rb') as file_input:
+            for r in file_input:
+                for part in self.split_line(r.strip().decode('utf-8', 'backslashreplace')):
+                    part_tokens = corenlp_pool.count_tokens(part)
+                    if parts and tokens + part_tokens > self.chunk_tokens:
+                        if safe == 0:  # no sentence boundary to end at
+                            safe = len(parts)
+                            safe_tokens = tokens
+                        yield "".join([" " + p for p in parts[:safe]])
+                        parts = parts[safe:]
+                        tokens -= safe_tokens
+                        safe = 0
+                        safe_tokens = 0
+                    parts.append(part)
+                    tokens += part_tokens
+                    if part == "" or SENTENCE_END.search(part):
+                        safe = len(parts)
+                        safe_tokens = tokens
+        if parts:
+            yield "".join([" " + p for p in parts])
+
+
+    def read_chunks(self):
+        '''
+        Read the input files as text strings, in chunks if chunking is on.
+        :return: a generator of (file name, file path, chunk number, whether it is the last chunk of the file, text string)
+        '''
+        for (file_name, input_file_path) in self.list_input_files():
+            if self.chunk_tokens > 0:
+                chunks = self.read_text_chunks(input_file_path)
+            else:
+                chunks = [self.read_text_string(input_file_path)]
+            number = 0
+            previous = ""  # an empty file is 1 empty chunk
+            for text_string in chunks:
+                if number > 0:
+                    yield (file_name, input_file_path, number - 1, False, previous)
+                previous = text_string
+                number += 1
+            yield (file_name, input_file_path, max(number - 1, 0), True, previous)
+
+
+    def lookup_chunks(self, chunks, stitching, failed_files):
+        '''
+        Write the output of the chunks whose annotation is in the annotation cache, and give the others
+        with the hash of their text, to be annotated.
+        :param chunks: (file name, file path, chunk number, last, text string), see read_chunks
+        :param stitching: the files being written, see stitch_chunk
+        :param failed_files: the paths of the files that failed, whose chunks are skipped
+        :return: a generator of (file name, file path, chunk number, last, text string, text hash)
+        '''
+        for (file_name, input_file_path, number, last, text_string) in chunks:
+            if input_file_path in failed_files:
+                continue
+            if self.cache is None:
+                yield (file_name, input_file_path, number, last, text_string, None)
+                continue
+            text_hash = annotation_cache.get_text_hash(text_string)
+            parsed_json = self.cache.get(text_hash)
+            if parsed_json is None:
+                yield (file_name, input_file_path, number, last, text_string, text_hash)
+            else:
+                self.output_chunk(stitching, (file_name, input_file_path, number, last, 0, text_hash), parsed_json)
+
+
+    def batch_documents(self, chunks, budget):
+        '''
+        Put texts into batches of about budget.tokens tokens, each sent as 1 single string.
+        The texts are separated by 2 newlines, which the server is told to take as a hard sentence boundary
+        (a text string has no newlines, see read_text_string). A text larger than the budget is sent alone.
+        :param chunks: (file name, file path, chunk number, last, text string, text hash), see lookup_chunks
+        :param budget: the corenlp_pool.TokenBudget, which is read again for every batch
+        :return: a generator of (list of spans, batch string), see join_batch
+        '''
+        batch = []
+        batch_tokens = 0
+        for chunk in chunks:
+            tokens = corenlp_pool.count_tokens(chunk[4])
+            if batch and batch_tokens + tokens > budget.tokens:
+                yield self.join_batch(batch)
+                batch = []
+                batch_tokens = 0
+            batch.append(chunk)
+            batch_tokens += tokens
+        if batch:
+            yield self.join_batch(batch)
+
+
+    def join_batch(self, batch):
+        '''
+        Join the texts of a batch into 1 single string.
+        :param batch: a list of (file name, file path, chunk number, last, text string, text hash), see lookup_chunks
+        :return: a list of spans (file name, file path, chunk number, last, start offset of the text in the batch,
+                 text hash), and the batch string
+        '''
+        spans = []
+        offset = 0
+        for (file_name, input_file_path, number, last, text_string, text_hash) in batch:
+            spans.append((file_name, input_file_path, number, last, offset, text_hash))
+            # CoreNLP gives character offsets in UTF-16 code units
+            offset += len(text_string.encode('utf-16-le')) // 2 + 2
+        return spans, "\n\n".join([chunk[4] for chunk in batch])
+
+
+    def split_batch_output(self, json_input, spans):
+        '''
+        Split the output of a batch back into the output of each text, by the offsets of the sentences.
+        :param json_input: json formatted data of the batch
+        :param spans: the spans of the texts of the batch, see join_batch
+        :return: a list of json formatted data, 1 for each text
+        '''
+        if len(spans) == 1:
+            return [json_input]
+        starts = [span[4] for span in spans]
+        outputs = [{'sentences': []} for span in spans]
+        for sent in json_input['sentences']:
+            if sent['tokens']:
+                position = bisect.bisect_right(starts, sent['tokens'][0]['characterOffsetBegin']) - 1
+                outputs[max(position, 0)]['sentences'].append(sent)
+        return outputs
+
+
+    def split_batch(self, spans, batch_string):
+        '''
+        Split a batch whose request failed in 2 halves, to be sent again, so that a text is only reported
+        as failed when a request of its own fails.
+        :param spans: the spans of the texts of the batch, see join_batch
+        :param batch_string: the batch string, see join_batch
+        :return: the (list of spans, batch string) of each half, or None for a batch of 1 text
+        '''
+        if len(spans) == 1:
+            return None
+        texts = batch_string.split("\n\n")  # a text string has no newlines
+        batch = [span[:4] + (text_string, span[5]) for (span, text_string) in zip(spans, texts)]
+        half = len(batch) // 2
+        return [self.join_batch(batch[:half]), self.join_batch(batch[half:])]
+
+
+    def stitch_chunk(self, stitching, span, json_input):
+        '''
+        Write the output of a chunk once the chunks before it in its file are written; the chunks
+        of a file can complete in any order. If there is a document_handler, the sentences of the file
+        are also kept in order, and given to it when the file is complete.
+        :param stitching: the files being written, file path -> [output file, number of the next chunk to write,
+                          dictionary of chunk number -> (json formatted data, last) of the chunks waiting,
+                          list of the sentences of the chunks written]
+        :param span: the span of the chunk, see join_batch
+        :param json_input: json formatted data of the chunk
+        :return: whether the file is complete
+        '''
+        (file_name, input_file_path, number, last, start, text_hash) = span
+        if input_file_path not in stitching:
+            stitching[input_file_path] = [None, 0, {}, []]
+        state = stitching[input_file_path]
+        state[2][number] = (json_input, last)
+        while state[1] in state[2]:
+            (chunk_json, chunk_last) = state[2].pop(state[1])
+            if self.output_folder is not None:
+                if state[0] is None:
+                    state[0] = open(self.output_folder + '/' + file_name, 'w')
+                self.write_preprocessed_data(chunk_json, state[0])
+            if self.document_handler is not None:
+                state[3].extend(chunk_json['sentences'])
+            state[1] += 1
+            if chunk_last:
+                if state[0] is not None:
+                    state[0].close()
+                del stitching[input_file_path]
+                if self.document_handler is not None:
+                    self.document_handler(file_name, input_file_path, state[3])
+                return True
+        return False
+
+
+    def output_chunk(self, stitching, span, json_input):
+        '''
+        Write the output of a chunk with stitch_chunk, and report its file when it is complete.
+        :param stitching: the files being written, see stitch_chunk
+        :param span: the span of the chunk, see join_batch
+        :param json_input: json formatted data of the chunk
+        :return: None
+        '''
+        if self.stitch_chunk(stitching, span, json_input):
+            print(span[1] + " Done!")
+            self.files_done += 1
 
 
     def pos_tagging(self):
         '''
         Read an input file/folder as raw data input.
         Output the results into files witH POS Tags.
+        With a document_handler, the requests are always made by pos_tagging_concurrent, so that the next
+        ones are in flight while the handler works on a file.
         :return: None
         '''
-        if self.input_type == "file":
-            file_name = os.path.basename(self.input)
-            text_string = ""
-            with open(self.input, 'rb') as file_input:
-                for r in file_input:
-                    text_string = " ".join([text_string, r.strip().decode('utf-8', 'backslashreplace')])
-            print(self.input + " Done!")
-            parsed_json = self.str_process(text_string)
-            self.output_preprocessed_data(parsed_json, file_name)
-        elif self.input_type == "dir":
-            for file_name in os.listdir(self.input):
-                input_file_path = self.input + "/" + file_name
-                text_string = ""
-                with open(input_file_path, 'rb') as file_input:
-                    for r in file_input:
-                        text_string = " ".join([text_string, r.strip().decode('utf-8', 'backslashreplace')])
-                parsed_json = self.str_process(text_string)
-                print(input_file_path + " Done!")
-                self.output_preprocessed_data(parsed_json, file_name)
+        self.files_done = 0
+        try:
+            if self.concurrency > 1 or self.batch_tokens > 0 or self.document_handler is not None:
+                self.pos_tagging_concurrent()
+            else:
+                stitching = {}
+                for (file_name, input_file_path, number, last, text_string) in self.read_chunks():
+                    parsed_json = self.annotate_text(text_string)
+                    self.output_chunk(stitching, (file_name, input_file_path, number, last, 0, None), parsed_json)
+        finally:
+            if self.cache is not None:
+                self.cache.close()
+        if self.cache is not None:
+            lookups = self.cache.hits + self.cache.misses
+            print("Annotation cache: %d hits, %d misses (%.1f%% hit rate), %d evicted"
+                  % (self.cache.hits, self.cache.misses, 100.0 * self.cache.hits / max(1, lookups), self.cache.evictions))
+
 
+    def pos_tagging_concurrent(self):
+        '''
+        Same as pos_tagging, with several annotation requests in flight at once over persistent connections,
+        and with many files (or chunks) in each request if batching is on. A batch whose request fails is
+        split in halves and sent again, down to 1 file (or chunk).
+        The files are read as requests complete, and each output file is written as soon as its requests complete,
+        the chunks of a file in order.
+        A file whose request fails (e.g. times out) is reported, and the other files are still processed.
+        :return: None
+        '''
+        stitching = {}
+        failed_files = set()
+        chunks = self.lookup_chunks(self.read_chunks(), stitching, failed_files)
+        properties = {'annotators': self.standford_annotators, 'outputFormat': 'json'}
+        if self.batch_tokens > 0:
+            properties['ssplit.newlineIsSentenceBreak'] = 'two'
+            budget = corenlp_pool.TokenBudget(self.batch_tokens, self.server_timeout)
+            documents = self.batch_documents(chunks, budget)
+            split = self.split_batch
+        else:
+            budget = None
+            documents = (([chunk[:4] + (0, chunk[5])], chunk[4]) for chunk in chunks)
+            split = None
+        pool = corenlp_pool.AnnotationPool(self.server_url, properties, self.concurrency, self.timeout, budget=budget)
+        try:
+            for (spans, parsed_json, error) in pool.annotate_all(documents, split):
+                if error is None:
+                    outputs = self.split_batch_output(parsed_json, spans)
+                for (position, span) in enumerate(spans):
+                    input_file_path = span[1]
+                    if input_file_path in failed_files:
+                        continue
+                    if error is not None:
+                        print(input_file_path + " Failed! " + repr(error))
+                        failed_files.add(input_file_path)
+                        if input_file_path in stitching:  # remove what was written of it
+                            if stitching[input_file_path][0] is not None:
+                                stitching[input_file_path][0].close()
+                                os.remove(self.output_folder + '/' + span[0])
+                            del stitching[input_file_path]
+                        continue
+                    if self.cache is not None:
+                        self.cache.put(span[5], outputs[position])
+                    self.output_chunk(stitching, span, outputs[position])
+        finally:
+            pool.close()
+            for state in stitching.values():
+                if state[0] is not None:
+                    state[0].close()
+        (requests, connects) = pool.get_statistics()
+        print("%d files in %d requests over %d connections, %d failed"
+              % (self.files_done + len(failed_files), requests, connects, len(failed_files)))
+        if budget is not None:
+            print("Final batch token budget: %d, %d failed batches split and sent again" % (budget.tokens, pool.splits))
 
 
 def main():
@@ -107,6 +461,51 @@ def main():
                             default='',
                             help="type the path of your log file")
 
+    parser.add_argument('--server', '-s', type=str, dest='server_url', action='store',
+                            default='http://localhost:9000',
+                            help="type the URL of the Stanford CoreNLP server")
+
+    parser.add_argument('--concurrency', '-n', type=int, dest='concurrency', action='store',
+                            default=1,
+                            help="""
+                                 type the number of annotation requests to keep in flight at once;
+                                 with more than 1, persistent connections are used and files are written as they complete
+                                 """)
+
+    parser.add_argument('--timeout', '-t', type=float, dest='timeout', action='store',
+                            default=60.0,
+                            help="type the timeout of each annotation request in seconds, used with --concurrency")
+
+    parser.add_argument('--batch_tokens', '-b', type=int, dest='batch_tokens', action='store',
+                            default=0,
+                            help="""
+                                 type the most tokens to send in one request, to send many small files at once;
+                                 the batches are kept well under the server timeout (0, the default, sends 1 file per request)
+                                 """)
+
+    parser.add_argument('--server_timeout', '-st', type=float, dest='server_timeout', action='store',
+                            default=10.0,
+                            help="type the -timeout of the Stanford CoreNLP server in seconds, used with --batch_tokens")
+
+    parser.add_argument('--chunk_tokens', '-k', type=int, dest='chunk_tokens', action='store',
+                            default=0,
+                            help="""
+                                 type the number of tokens of the chunks that large files are split into,
+                                 at paragraph or sentence boundaries (0, the default, sends each file whole)
+                                 """)
+
+    parser.add_argument('--cache', '-c', type=str, dest='cache_path', action='store',
+                            default='',
+                            help="type the path of an annotation cache file, to annotate only texts not seen before")
+
+    parser.add_argument('--cache_size', '-cs', type=float, dest='cache_size', action='store',
+                            default=0,
+                            help="type the most megabytes of annotations to keep in the annotation cache (0, the default, for no bound)")
+
+    parser.add_argument('--server_version', '-v', type=str, dest='server_version', action='store',
+                            default='',
+                            help="type the version of the Stanford CoreNLP server, which the annotation cache is keyed by")
+
     parser.add_argument('--annotators', '-a', type=str, dest='annotators', action='store',
                             default= 'tokenize,ssplit,pos',
                             help="""